@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+"""
+Import time benchmark for octo.
+
+Each module is imported in a fresh interpreter started with
+``python -X importtime``, and the cumulative import time reported for it is
+recorded. The median over --runs runs is reported, along with the modules the
+import pulled in.
+
+With --max-ms, the benchmark fails (exit status 1) when the median import
+time of a module exceeds the given number of milliseconds. It always fails
+when importing a module pulls in one of the modules in HEAVY_MODULES, which
+should only be imported once a Manager is used.
+
+Usage: python benchmarks/import_time.py [--modules octo octo.cli] [--runs 5] [--max-ms 50] [--output FILE]
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root)
+import octo  # noqa: E402
+
+FORMAT_VERSION = 1
+DEFAULT_MODULES = ['octo', 'octo.exceptions', 'octo.cli']
+DEFAULT_RUNS = 5
+HEAVY_MODULES = ['octo.manager', 'yapsy', 'configparser', 'concurrent.futures']
+
+# import time: self [us] | cumulative | imported package
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+
+def import_module(module):
+	"""
+	Import module in a new interpreter
+
+	Returns a tuple of the cumulative import time in seconds and the names
+	of all modules imported along with it.
+	"""
+	env = dict(os.environ, PYTHONPATH=root)
+	process = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+	                           stderr=subprocess.PIPE, env=env, universal_newlines=True)
+	stderr = process.communicate()[1]
+	if process.returncode != 0:
+		raise RuntimeError("Importing {} failed:\n{}".format(module, stderr))
+
+	imported = []
+	cumulative = None
+	for line in stderr.splitlines():
+		match = IMPORTTIME_LINE.match(line)
+		if match is None:
+			continue
+		imported.append(match.group(4))
+		if match.group(4) == module and not match.group(3):
+			cumulative = int(match.group(2)) / 1000000.0
+	if cumulative is None:
+		# Already imported during interpreter startup
+		cumulative = 0.0
+	# Modules imported during interpreter startup are listed before site
+	if 'site' in imported:
+		imported = imported[imported.index('site') + 1:]
+	return cumulative, imported
+
+
+def benchmark(module, runs):
+	"""Return the results of importing module runs times"""
+	times = []
+	imported = []
+	for i in range(runs):
+		seconds, imported = import_module(module)
+		times.append(seconds)
+	times.sort()
+	return {
+		'module': module,
+		'runs': runs,
+		'median': times[len(times) // 2],
+		'min': times[0],
+		'modules': len(imported),
+		'heavy': sorted(name for name in HEAVY_MODULES if name in imported),
+	}
+
+
+def format_table(results):
+	"""Return results as a human-readable table"""
+	rows = [("MODULE", "RUNS", "MEDIAN (ms)", "MIN (ms)", "MODULES", "HEAVY")]
+	for result in results:
+		rows.append((result['module'], str(result['runs']), "{:.2f}".format(result['median'] * 1000),
+		             "{:.2f}".format(result['min'] * 1000), str(result['modules']),
+		             ", ".join(result['heavy']) or "-"))
+	widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+	return "\n".join("  ".join(value.rjust(width) for value, width in zip(row, widths)) for row in rows)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark how long importing octo takes")
+	parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES,
+	                    help="Modules to import (default: %(default)s)")
+	parser.add_argument('--runs', type=int, default=DEFAULT_RUNS,
+	                    help="Number of times to import each module (default: %(default)s)")
+	parser.add_argument('--max-ms', type=float, default=None,
+	                    help="Fail when the median import time of a module exceeds this")
+	parser.add_argument('--output', metavar='FILE', default=None,
+	                    help="Write results as JSON to FILE")
+	args = parser.parse_args()
+
+	results = [benchmark(module, args.runs) for module in args.modules]
+	print(format_table(results))
+	if args.output is not None:
+		report = {
+			'format': FORMAT_VERSION,
+			'octo': octo.__version__,
+			'python': platform.python_version(),
+			'results': results,
+		}
+		with open(args.output, 'w') as file:
+			json.dump(report, file, indent=2, sort_keys=True)
+			file.write("\n")
+
+	failed = False
+	for result in results:
+		if result['heavy']:
+			print("{} imports {}".format(result['module'], ", ".join(result['heavy'])))
+			failed = True
+		if args.max_ms is not None and result['median'] * 1000 > args.max_ms:
+			print("{} took {:.2f} ms to import, more than {} ms".format(
+				result['module'], result['median'] * 1000, args.max_ms))
+			failed = True
+	if failed:
+		sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+
+"""
+Scaling benchmarks for the octo Manager lifecycle and dispatch paths.
+
+For every requested size, a directory with that many synthetic plugins is
+generated, after which the time and peak (Python) memory allocation of the
+following operations is measured. Tracing allocations slows Python down
+considerably, so time and memory are measured in separate runs.
+
+  init        Manager.__init__, which includes discovering and importing plugins
+  lazy_init   Manager.__init__ with lazy=True, which only discovers plugins
+  start       Manager.start
+  get_plugins Manager.get_plugins
+  call        Manager.call on a single plugin
+  call_batch  Manager.call_batch with 100 calls on a single plugin
+  call_many   Manager.call_many reaching every plugin
+  stop        Manager.stop
+
+Results are printed as a table and may be written as JSON with --output. The
+memory still allocated after an operation (which for init is the memory
+taken up by the manager and the plugins) is reported as well, per plugin.
+The JSON format is stable (see FORMAT_VERSION) so results of different releases
+can be compared to catch regressions.
+
+Usage: python benchmarks/scaling.py [--sizes 10 100 1000 3000 10000] [--output FILE]
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import octo  # noqa: E402
+# Imported up front so the modules don't count towards the memory of init
+import octo.manager  # noqa: E402
+
+FORMAT_VERSION = 1
+DEFAULT_SIZES = [10, 100, 1000, 3000, 10000]
+
+PLUGIN_INFO = """[Core]
+Name = Plugin {index}
+Module = plugin{index}
+
+[Config]
+Enable = True
+"""
+
+PLUGIN_MODULE = """from octo.plugin import OctoPlugin
+
+
+class Plugin{index}(OctoPlugin):
+	def ping(self, value=None):
+		return value
+"""
+
+
+def generate_plugins(directory, count):
+	"""Write count synthetic plugins into directory, 100 per subdirectory"""
+	for index in range(count):
+		subdir = os.path.join(directory, "group{}".format(index // 100))
+		if not os.path.isdir(subdir):
+			os.mkdir(subdir)
+		with open(os.path.join(subdir, "plugin{}.octoplugin".format(index)), 'w') as file:
+			file.write(PLUGIN_INFO.format(index=index))
+		with open(os.path.join(subdir, "plugin{}.py".format(index)), 'w') as file:
+			file.write(PLUGIN_MODULE.format(index=index))
+
+
+def measure(prepare, ops=1):
+	"""
+	Return a dictionary with the total time, time per operation, peak memory
+	allocated and memory still allocated afterwards of calling a function ops
+	times
+
+	prepare is called (outside of the measurements) before both the timed run
+	and the traced run and returns the function to call, so operations which
+	change state such as start can be set up afresh for each run. The return
+	value of the last call in the traced run is stored under 'result'.
+	"""
+	func = prepare()
+	gc.collect()
+	started = time.perf_counter()
+	for i in range(ops):
+		func()
+	elapsed = time.perf_counter() - started
+	del func
+
+	func = prepare()
+	gc.collect()
+	tracemalloc.start()
+	for i in range(ops):
+		result = func()
+	gc.collect()
+	retained, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return {'ops': ops, 'seconds': elapsed, 'per_op': elapsed / ops, 'peak_memory': peak,
+	        'retained_memory': retained, 'result': result}
+
+
+def benchmark(size, workdir):
+	"""Benchmark all operations for a plugin directory with size plugins"""
+	plugin_dir = os.path.join(workdir, "plugins{}".format(size))
+	os.mkdir(plugin_dir)
+	generate_plugins(plugin_dir, size)
+	# Keep the total amount of dispatch work roughly constant across sizes
+	call_ops = 10000
+	call_many_ops = max(1, 10000 // size)
+
+	results = []
+
+	def record(phase, measurement):
+		measurement.pop('result')
+		measurement.update({'plugins': size, 'phase': phase})
+		results.append(measurement)
+
+	def new_manager(**kwargs):
+		return octo.Manager(plugin_dirs=[plugin_dir], **kwargs)
+
+	record('lazy_init', measure(lambda: lambda: new_manager(lazy=True)))
+	record('init', measure(lambda: new_manager))
+	# start and stop change the state of a manager, so each run gets its own
+	record('start', measure(lambda: new_manager().start))
+
+	manager = new_manager().start()
+	record('get_plugins', measure(lambda: manager.get_plugins, ops=call_ops))
+	target = "Plugin {}".format(size // 2)
+	record('call', measure(lambda: lambda: manager.call(target, 'ping', args=[1]), ops=call_ops))
+	batch = [(target, 'ping', [1])] * 100
+	record('call_batch', measure(lambda: lambda: manager.call_batch(batch), ops=call_ops // len(batch)))
+	record('call_many', measure(lambda: lambda: manager.call_many('ping', args=[1]), ops=call_many_ops))
+	manager.stop()
+	record('stop', measure(lambda: new_manager().start().stop))
+	return results
+
+
+def format_table(results):
+	"""Return results as a human-readable table"""
+	rows = [("PLUGINS", "PHASE", "OPS", "PER OP (us)", "TOTAL (ms)", "PEAK MEM (KiB)", "RETAINED/PLUGIN (B)")]
+	for result in results:
+		rows.append((str(result['plugins']), result['phase'], str(result['ops']),
+		             "{:.2f}".format(result['per_op'] * 1000000), "{:.2f}".format(result['seconds'] * 1000),
+		             "{:.1f}".format(result['peak_memory'] / 1024.0),
+		             "{:.0f}".format(result['retained_memory'] / float(result['plugins']))))
+	widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+	return "\n".join("  ".join(value.rjust(width) for value, width in zip(row, widths)) for row in rows)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark how octo scales with the number of plugins")
+	parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+	                    help="Numbers of plugins to benchmark with (default: %(default)s)")
+	parser.add_argument('--output', metavar='FILE', default=None,
+	                    help="Write results as JSON to FILE")
+	args = parser.parse_args()
+	logging.basicConfig(level=logging.ERROR)
+
+	workdir = tempfile.mkdtemp(prefix="octo-benchmark-")
+	try:
+		results = []
+		for size in args.sizes:
+			results.extend(benchmark(size, workdir))
+	finally:
+		shutil.rmtree(workdir)
+
+	print(format_table(results))
+	if args.output is not None:
+		report = {
+			'format': FORMAT_VERSION,
+			'octo': octo.__version__,
+			'python': platform.python_version(),
+			'results': results,
+		}
+		with open(args.output, 'w') as file:
+			json.dump(report, file, indent=2, sort_keys=True)
+			file.write("\n")
+
+
+if __name__ == "__main__":
+	main()
@@ -22,12 +22,19 @@
 
 """A plugin framework which allows you to write your application as a collection of (optionally interconnected) plugins."""
 
-import os
-from .manager import Manager, run, stop
+import sys
 
-version_file = os.sep.join([os.path.dirname(os.path.realpath(__file__)), 'version'])
-with open(version_file) as file:
-	version = file.read().strip()
+
+def _read_version():
+	"""Return the contents of octo/version, for source checkouts without a generated octo/_version.py"""
+	import os
+	with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'version')) as file:
+		return file.read().strip()
+
+try:
+	from ._version import version
+except ImportError:
+	version = _read_version()
 
 __author__ = "Nick Groenen"
 __version__ = version
@@ -38,3 +45,34 @@ __url__ = "http://octo.zoni.nl"
 __all__ = ['exceptions', 'manager', 'plugin']
 
 instance = None
+
+# Importing octo.manager pulls in yapsy and the rest of the machinery needed
+# to run plugins, so it's only imported once one of these is first used
+_lazy_attributes = {
+	'Manager': 'manager',
+	'run': 'manager',
+	'stop': 'manager',
+}
+
+
+def __getattr__(name):
+	"""Import submodules and the attributes in _lazy_attributes on first access"""
+	if name in _lazy_attributes:
+		import importlib
+		value = getattr(importlib.import_module('.' + _lazy_attributes[name], __name__), name)
+	elif name in __all__:
+		import importlib
+		value = importlib.import_module('.' + name, __name__)
+	else:
+		raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+	globals()[name] = value
+	return value
+
+
+def __dir__():
+	return sorted(set(globals()) | set(_lazy_attributes) | set(__all__))
+
+
+if sys.version_info < (3, 7):
+	# Module level __getattr__ isn't supported (PEP 562)
+	from .manager import Manager, run, stop
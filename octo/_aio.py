@@ -0,0 +1,90 @@
+"""
+Coroutine implementations of `octo.manager.Manager.acall`, `acall_many` and
+`aiter_call_many`, and other helpers which need async/await
+
+These live in a separate module as they use async/await syntax, which would
+otherwise make `octo.manager` unimportable on Python 2.
+"""
+
+import asyncio
+import inspect
+import logging
+import octo.exceptions
+from octo.metrics import clock
+
+
+async def await_result(awaitable):
+	"""Await awaitable, making any awaitable usable where a coroutine is needed"""
+	return await awaitable
+
+
+async def _invoke(method, args, kwargs, timeout):
+	"""Call method, awaiting the result (with a timeout) when it is awaitable"""
+	result = method(*args, **kwargs)
+	if inspect.isawaitable(result):
+		if timeout is None:
+			result = await result
+		else:
+			result = await asyncio.wait_for(result, timeout)
+	return result
+
+
+async def _invoke_measured(metrics, plugin_name, func, method, args, kwargs, timeout):
+	"""Like _invoke, recording the call in metrics unless it is None"""
+	if metrics is None:
+		return await _invoke(method, args, kwargs, timeout)
+	started = clock()
+	try:
+		result = await _invoke(method, args, kwargs, timeout)
+	except Exception:
+		metrics.record(plugin_name, func, clock() - started, error=True)
+		raise
+	metrics.record(plugin_name, func, clock() - started)
+	return result
+
+
+async def acall(manager, plugin_name, func, args, kwargs, timeout):
+	plugin = manager._get_active_plugin(plugin_name)
+	method = getattr(plugin.plugin_object, func)
+	try:
+		return await _invoke_measured(manager._metrics, plugin_name, func, method, args, kwargs, timeout)
+	except asyncio.TimeoutError:
+		raise octo.exceptions.PluginTimeoutError(
+			"Call to '{}' on '{}' did not complete in time".format(func, plugin_name))
+
+
+async def _call_one(manager, name, func, method, args, kwargs, timeout):
+	"""Call method on behalf of acall_many, returning exceptions as the result"""
+	try:
+		logging.debug("Calling {} on plugin '{}'".format(func, name))
+		return await _invoke_measured(manager._metrics, name, func, method, args, kwargs, timeout)
+	except asyncio.TimeoutError:
+		logging.warning("Timeout while calling '{}' on '{}'".format(func, name))
+		return octo.exceptions.PluginTimeoutError(
+			"Call to '{}' on '{}' did not complete in time".format(func, name))
+	except Exception as e:
+		logging.exception("Exception while calling '{}' on '{}'".format(func, name))
+		return e
+
+
+async def acall_many(manager, func, args, kwargs, timeout):
+	implementers = manager._get_implementers(func)
+	results = await asyncio.gather(*[_call_one(manager, name, func, method, args, kwargs, timeout)
+	                                 for name, method in implementers])
+	return dict(zip([name for name, method in implementers], results))
+
+
+async def aiter_call_many(manager, func, args, kwargs, timeout):
+	implementers = manager._get_implementers(func)
+	tasks = dict((asyncio.ensure_future(_call_one(manager, name, func, method, args, kwargs, timeout)), name)
+	             for name, method in implementers)
+	pending = set(tasks)
+	try:
+		while pending:
+			done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+			for task in done:
+				yield tasks[task], task.result()
+	finally:
+		# Reached early when the consumer stops iterating
+		for task in pending:
+			task.cancel()
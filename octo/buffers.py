@@ -0,0 +1,197 @@
+"""
+Shared buffers for passing large payloads between plugins without copying.
+
+A plugin publishes a named buffer in the `BufferRegistry` of the manager,
+and other plugins acquire a memoryview of it. Buffers are backed by
+`multiprocessing.shared_memory` where available, so process-isolated
+plugins (see `octo.isolation`) can attach to them by their
+`SharedBuffer.shared_name` as well. Otherwise an anonymous mmap is used.
+
+Buffers are reference counted per plugin. When the owning plugin removes a
+buffer or is deactivated, its name is freed right away, but the memory is
+only released once every plugin which acquired it has released it (or has
+been deactivated). Memory which is still exported at that point, by a slice
+of a view for example, is kept until a later attempt to free it succeeds.
+"""
+
+import mmap
+import threading
+import octo.exceptions
+try:
+	from multiprocessing import shared_memory
+except ImportError:
+	shared_memory = None  # Python < 3.8
+
+
+class SharedBuffer(object):
+	"""A block of shared memory and the memoryviews handed out for it"""
+
+	def __init__(self, name, owner, size):
+		self.name = name
+		self.owner = owner
+		self.size = size
+		if shared_memory is not None:
+			self._memory = shared_memory.SharedMemory(create=True, size=size)
+			self._base = self._memory.buf
+			self.shared_name = self._memory.name
+		else:
+			self._memory = mmap.mmap(-1, size)
+			self._base = memoryview(self._memory)
+			self.shared_name = None
+		# plugin name -> list of memoryviews acquired by that plugin
+		self.views = {}
+
+	def view(self, plugin_name, writable=False):
+		"""Return a new memoryview of the buffer, referenced by plugin_name"""
+		view = self._base[:self.size]
+		if not writable and hasattr(view, 'toreadonly'):
+			# Views can't be made read-only before Python 3.8
+			view = view.toreadonly()
+		self.views.setdefault(plugin_name, []).append(view)
+		return view
+
+	def release(self, plugin_name):
+		"""
+		Release all memoryviews acquired by plugin_name
+
+		Views which are still exported (to a ctypes array, for example) can't
+		be released yet, so they stay referenced by plugin_name.
+		"""
+		exported = []
+		for view in self.views.pop(plugin_name, ()):
+			try:
+				view.release()
+			except BufferError:
+				exported.append(view)
+		if exported:
+			self.views[plugin_name] = exported
+
+	def free(self):
+		"""
+		Release all memoryviews and the underlying memory
+
+		Returns False when the memory is still exported, either by a view
+		which couldn't be released or by a slice of one, in which case it is
+		left allocated and freeing it may be retried later.
+		"""
+		for plugin_name in list(self.views):
+			self.release(plugin_name)
+		if self.views:
+			return False
+		try:
+			self._base.release()
+			self._memory.close()
+		except BufferError:
+			return False
+		if shared_memory is not None:
+			self._memory.unlink()
+		return True
+
+
+class BufferRegistry(object):
+	"""Registry of named `SharedBuffer` objects"""
+
+	def __init__(self):
+		self._buffers = {}
+		# Removed buffers which are still referenced by some plugin
+		self._orphans = []
+		self._lock = threading.Lock()
+
+	def create(self, owner, name, size):
+		"""
+		Create a buffer of size bytes named name, owned by plugin owner
+
+		Returns a writable memoryview of the buffer for the owner to fill.
+		Raises `octo.exceptions.BufferExistsError` when a buffer with the
+		same name exists.
+		"""
+		with self._lock:
+			if name in self._buffers:
+				raise octo.exceptions.BufferExistsError("A buffer named '{}' already exists".format(name))
+			buffer = SharedBuffer(name, owner, size)
+			self._buffers[name] = buffer
+			return buffer.view(owner, writable=True)
+
+	def publish(self, owner, name, data):
+		"""Create a buffer named name holding a copy of data, owned by plugin owner"""
+		data = memoryview(data).cast('B')
+		view = self.create(owner, name, len(data))
+		view[:] = data
+		return view
+
+	def acquire(self, plugin_name, name, writable=False):
+		"""
+		Return a memoryview of the buffer named name, referenced by plugin_name
+
+		The view is read-only unless writable is True. Raises
+		`octo.exceptions.NoSuchBufferError` when there is no such buffer.
+		"""
+		with self._lock:
+			return self._get(name).view(plugin_name, writable)
+
+	def get(self, name):
+		"""Return the `SharedBuffer` named name"""
+		with self._lock:
+			return self._get(name)
+
+	def _get(self, name):
+		try:
+			return self._buffers[name]
+		except KeyError:
+			raise octo.exceptions.NoSuchBufferError("There is no buffer named '{}'".format(name))
+
+	def release(self, plugin_name, name):
+		"""Release all references of plugin_name to the buffer named name"""
+		with self._lock:
+			for buffer in [self._buffers.get(name)] + [b for b in self._orphans if b.name == name]:
+				if buffer is not None:
+					buffer.release(plugin_name)
+			self._free_orphans()
+
+	def remove(self, owner, name):
+		"""
+		Remove the buffer named name, which must be owned by plugin owner
+
+		The memory is freed once no other plugin references the buffer.
+		"""
+		with self._lock:
+			buffer = self._get(name)
+			if buffer.owner != owner:
+				raise octo.exceptions.NoSuchBufferError(
+					"The buffer named '{}' isn't owned by '{}'".format(name, owner))
+			self._remove(buffer)
+			self._free_orphans()
+
+	def _remove(self, buffer):
+		del self._buffers[buffer.name]
+		buffer.release(buffer.owner)
+		self._orphans.append(buffer)
+
+	def _free_orphans(self):
+		for buffer in [b for b in self._orphans if not b.views]:
+			if buffer.free():
+				self._orphans.remove(buffer)
+
+	def release_plugin(self, plugin_name):
+		"""Release all references of plugin_name and remove the buffers it owns"""
+		with self._lock:
+			for buffer in list(self._buffers.values()) + self._orphans:
+				buffer.release(plugin_name)
+			for buffer in [b for b in self._buffers.values() if b.owner == plugin_name]:
+				self._remove(buffer)
+			self._free_orphans()
+
+	def names(self):
+		"""Return the names of all buffers"""
+		return sorted(self._buffers)
+
+	def close(self):
+		"""
+		Free all buffers, invalidating any memoryviews handed out
+
+		Buffers whose memory is still exported are kept as orphans.
+		"""
+		with self._lock:
+			buffers = list(self._buffers.values()) + self._orphans
+			self._buffers.clear()
+			self._orphans = [buffer for buffer in buffers if not buffer.free()]
@@ -0,0 +1,128 @@
+"""
+Memoization of plugin method results.
+
+Methods decorated with `octo.plugin.cached` are wrapped in a `MethodCache`
+by the manager when their plugin is activated. The cache is dropped again
+when the plugin is deactivated (which includes reloading it).
+"""
+
+import threading
+from collections import OrderedDict
+from octo.metrics import clock
+
+
+# Separates positional from keyword arguments in keys. A unique object, so
+# no positional argument can be mistaken for it.
+_kwd_mark = (object(),)
+
+
+def default_key(*args, **kwargs):
+	"""Return a cache key for the given arguments"""
+	if kwargs:
+		return args + _kwd_mark + tuple(sorted(kwargs.items()))
+	return args
+
+
+class _InFlightCall(object):
+	"""The outcome of a call which other callers with the same key wait for"""
+
+	__slots__ = ('done', 'result', 'error')
+
+	def __init__(self):
+		self.done = threading.Event()
+		self.result = None
+		self.error = None
+
+
+class MethodCache(object):
+	"""
+	A bounded cache of the results of method, which it can be called in place of
+
+	At most ``maxsize`` results (None for no limit) are kept, evicting the
+	least recently used one first. Results older than ``ttl`` seconds (None
+	for no expiry) are not used. ``key`` turns the arguments of a call into
+	a hashable cache key; calls whose key isn't hashable aren't cached.
+
+	While a call is running, identical calls from other threads wait for its
+	result instead of calling method again. Exceptions are not cached.
+	"""
+
+	def __init__(self, method, maxsize=128, ttl=None, key=None):
+		self.method = method
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self.key = key or default_key
+		self.hits = 0
+		self.misses = 0
+		self.collapsed = 0
+		self.evictions = 0
+		# key -> (expiry time or None, result), least recently used first
+		self._entries = OrderedDict()
+		self._in_flight = {}
+		self._lock = threading.Lock()
+
+	def __call__(self, *args, **kwargs):
+		try:
+			key = self.key(*args, **kwargs)
+			hash(key)
+		except TypeError:
+			self.misses += 1
+			return self.method(*args, **kwargs)
+
+		with self._lock:
+			entry = self._entries.pop(key, None)
+			if entry is not None and (entry[0] is None or entry[0] > clock()):
+				self._entries[key] = entry
+				self.hits += 1
+				return entry[1]
+			call = self._in_flight.get(key)
+			leader = call is None
+			if leader:
+				call = self._in_flight[key] = _InFlightCall()
+				self.misses += 1
+			else:
+				self.collapsed += 1
+
+		if not leader:
+			call.done.wait()
+			if call.error is not None:
+				raise call.error
+			return call.result
+
+		try:
+			call.result = self.method(*args, **kwargs)
+		except BaseException as e:
+			# Including KeyboardInterrupt and the like, so waiting callers
+			# never mistake a failed call for a result of None
+			call.error = e
+			raise
+		finally:
+			with self._lock:
+				del self._in_flight[key]
+				if call.error is None:
+					self._store(key, call.result)
+			call.done.set()
+		return call.result
+
+	def _store(self, key, result):
+		expiry = None if self.ttl is None else clock() + self.ttl
+		self._entries[key] = (expiry, result)
+		if self.maxsize is not None:
+			while len(self._entries) > self.maxsize:
+				self._entries.popitem(last=False)
+				self.evictions += 1
+
+	def clear(self):
+		"""Drop all cached results"""
+		with self._lock:
+			self._entries.clear()
+
+	def stats(self):
+		"""Return the counters and current size of this cache as a dictionary"""
+		return {
+			'hits': self.hits,
+			'misses': self.misses,
+			'collapsed': self.collapsed,
+			'evictions': self.evictions,
+			'size': len(self._entries),
+		}
@@ -15,6 +15,70 @@ def main():
 	                    help="Log level to use. Valid values are NONE, "
 	                         "DEBUG, INFO, WARNING, ERROR and CRITICAL",
 	                    default="INFO")
+	parser.add_argument('--event-loop',
+	                    help="Run an asyncio event loop in the main thread "
+	                         "instead of just waiting for signals",
+	                    action='store_true',
+	                    default=False)
+	parser.add_argument('--discovery-cache',
+	                    metavar='FILE',
+	                    help="Cache plugin discovery results in FILE to speed up "
+	                         "subsequent starts",
+	                    default=None)
+	parser.add_argument('--rebuild-discovery-cache',
+	                    help="Ignore the contents of the discovery cache and "
+	                         "rebuild it from a full scan",
+	                    action='store_true',
+	                    default=False)
+	parser.add_argument('--lazy',
+	                    help="Only import plugin modules when plugins are activated",
+	                    action='store_true',
+	                    default=False)
+	parser.add_argument('--profile-startup',
+	                    help="Log how long discovery, import, binding and "
+	                         "activation took for each plugin",
+	                    action='store_true',
+	                    default=False)
+	parser.add_argument('--profile-file',
+	                    metavar='FILE',
+	                    help="Write the startup profile as JSON to FILE "
+	                         "(implies --profile-startup)",
+	                    default=None)
+	parser.add_argument('--metrics',
+	                    help="Keep call metrics, which are logged upon receiving SIGUSR1",
+	                    action='store_true',
+	                    default=False)
+	parser.add_argument('--watch',
+	                    help="Watch plugin directories and reload plugins "
+	                         "whose files change",
+	                    action='store_true',
+	                    default=False)
+	parser.add_argument('--shutdown-timeout',
+	                    metavar='SECONDS',
+	                    help="Abandon plugins which haven't been deactivated "
+	                         "SECONDS after shutdown began",
+	                    type=float,
+	                    default=None)
+	parser.add_argument('--plugin-shutdown-timeout',
+	                    metavar='SECONDS',
+	                    help="Abandon a plugin whose deactivation takes longer "
+	                         "than SECONDS",
+	                    type=float,
+	                    default=None)
+	parser.add_argument('--workers',
+	                    metavar='N',
+	                    help="Run plugins in N forked worker processes, which "
+	                         "are restarted when they die. SIGHUP restarts them "
+	                         "one at a time",
+	                    type=int,
+	                    default=None)
+	parser.add_argument('--listen',
+	                    metavar='ADDRESS',
+	                    help="Bind a listening socket to ADDRESS (HOST:PORT or the "
+	                         "path of a Unix socket) for plugins to accept "
+	                         "connections on. May be given more than once",
+	                    action='append',
+	                    default=[])
 	parser.add_argument('plugin_dirs',
 	                    metavar='plugin-directory',
 	                    help="Directory from which to load plugins",
@@ -25,4 +89,18 @@ def main():
 	if log_level != "NONE":
 		logging.basicConfig(level=getattr(logging, log_level))
 
-	octo.run(plugin_dirs=args.plugin_dirs, block=True)
\ No newline at end of file
+	options = dict(cache_file=args.discovery_cache, rebuild_cache=args.rebuild_discovery_cache,
+	               lazy=args.lazy, profile_startup=args.profile_startup, profile_file=args.profile_file,
+	               metrics=args.metrics, shutdown_timeout=args.shutdown_timeout,
+	               plugin_shutdown_timeout=args.plugin_shutdown_timeout)
+	if args.workers is not None:
+		# Only imported when needed, as it imports octo.manager
+		import octo.prefork
+		octo.prefork.Supervisor(plugin_dirs=args.plugin_dirs, workers=args.workers, listen=args.listen,
+		                        event_loop=args.event_loop, watch=args.watch, **options).run()
+	else:
+		if args.listen:
+			import octo.prefork
+			options['sockets'] = dict((address, octo.prefork.bind_socket(address)) for address in args.listen)
+		octo.run(plugin_dirs=args.plugin_dirs, block=True, event_loop=args.event_loop, watch=args.watch,
+		         **options)
\ No newline at end of file
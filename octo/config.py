@@ -0,0 +1,184 @@
+"""
+Typed, pre-validated plugin configuration.
+
+A plugin may declare a schema for its configuration by setting
+``config_schema`` on its `octo.plugin.OctoPlugin` subclass to a dictionary
+of attribute names and `Option` objects::
+
+	class Webserver(OctoPlugin):
+		config_schema = {
+			'port': Option(int, default=8080),
+			'hosts': Option(list, key='Hosts'),
+		}
+
+When the plugin is loaded, the manager reads these options from its info
+file once, converts them to the given types and stores the result as a
+frozen `ConfigSnapshot` in ``self.plugin_settings``, so reading a setting
+is plain attribute access (``self.plugin_settings.port``). Missing or
+malformed values raise `octo.exceptions.InvalidConfigError`, so bad
+configuration is reported when loading the plugin rather than when the
+value is first used. Every snapshot also has an ``enable`` attribute for
+``Config.Enable``.
+"""
+
+import octo.exceptions
+try:
+	import configparser
+except ImportError:
+	import ConfigParser as configparser  # Python 2
+
+# Default of options which must be present in the info file
+REQUIRED = object()
+
+BOOLEAN_STATES = {'1': True, 'yes': True, 'true': True, 'on': True,
+                  '0': False, 'no': False, 'false': False, 'off': False}
+
+
+def parse_bool(value):
+	"""Parse a boolean the way `ConfigParser.getboolean` does"""
+	try:
+		return BOOLEAN_STATES[value.strip().lower()]
+	except KeyError:
+		raise ValueError("Not a boolean: {!r}".format(value))
+
+
+def parse_list(value):
+	"""Parse a comma-separated list of strings"""
+	return [item.strip() for item in value.split(',') if item.strip()]
+
+
+class Option(object):
+	"""
+	A single typed item of a plugin's configuration
+
+	``type`` converts the string from the info file: one of str, int, float,
+	bool and list (comma-separated), or any callable which raises ValueError
+	or TypeError for invalid values. The item is read from ``key`` under
+	``section``; key defaults to the attribute name the option is declared
+	under. Options without a ``default`` are required. With ``choices``, the
+	converted value must be one of them.
+	"""
+
+	__slots__ = ('type', 'default', 'section', 'key', 'choices')
+
+	def __init__(self, type=str, default=REQUIRED, section='Config', key=None, choices=None):
+		self.type = type
+		self.default = default
+		self.section = section
+		self.key = key
+		self.choices = choices
+
+	def convert(self, value):
+		"""Return value, a string from the info file, converted to the type of this option"""
+		if self.type is bool:
+			value = parse_bool(value)
+		elif self.type is list:
+			value = parse_list(value)
+		elif self.type is str:
+			value = value.strip()
+		else:
+			value = self.type(value.strip())
+		if self.choices is not None and value not in self.choices:
+			raise ValueError("{!r} is not one of {}".format(value, ", ".join(repr(c) for c in self.choices)))
+		return value
+
+
+# Included in the schema of every plugin
+BASE_SCHEMA = {
+	'enable': Option(bool, default=False, key='Enable'),
+}
+
+
+class ConfigSnapshot(object):
+	"""
+	Base class of compiled plugin configurations
+
+	Instances are immutable. Subclasses are created by `snapshot_class`, with
+	a slot for every option of a schema.
+	"""
+
+	__slots__ = ()
+
+	def __init__(self, values):
+		for name, value in values.items():
+			object.__setattr__(self, name, value)
+
+	def __setattr__(self, name, value):
+		raise AttributeError("Plugin configuration is read-only")
+
+	def __delattr__(self, name):
+		raise AttributeError("Plugin configuration is read-only")
+
+	def _asdict(self):
+		"""Return the configuration as a dictionary"""
+		return dict((name, getattr(self, name)) for name in self.__slots__)
+
+	def __eq__(self, other):
+		return type(self) is type(other) and self._asdict() == other._asdict()
+
+	def __ne__(self, other):
+		return not self == other
+
+	__hash__ = None
+
+	def __reduce__(self):
+		# Subclasses are created at runtime, so pickle can't find them by name
+		return (_restore_snapshot, (self._asdict(),))
+
+	def __repr__(self):
+		return "{}({})".format(type(self).__name__, ", ".join(
+			"{}={!r}".format(name, getattr(self, name)) for name in self.__slots__))
+
+
+# Sorted attribute names -> ConfigSnapshot subclass with those slots
+_snapshot_classes = {}
+
+
+def snapshot_class(names):
+	"""Return the `ConfigSnapshot` subclass with a slot for each of names"""
+	names = tuple(sorted(names))
+	cls = _snapshot_classes.get(names)
+	if cls is None:
+		cls = _snapshot_classes[names] = type('PluginConfig', (ConfigSnapshot,), {'__slots__': names})
+	return cls
+
+
+def _restore_snapshot(values):
+	"""Unpickle a `ConfigSnapshot` with the given values"""
+	return snapshot_class(values)(values)
+
+
+def get_schema(plugin_class):
+	"""Return the complete config schema of plugin_class, including `BASE_SCHEMA`"""
+	schema = dict(BASE_SCHEMA)
+	schema.update(getattr(plugin_class, 'config_schema', None) or {})
+	return schema
+
+
+def compile_config(schema, parser, plugin_name=None):
+	"""
+	Read the options of schema from parser and return them as a `ConfigSnapshot`
+
+	Raises `octo.exceptions.InvalidConfigError` listing every option which
+	is missing or invalid.
+	"""
+	values = {}
+	errors = []
+	for name, option in sorted(schema.items()):
+		key = option.key or name
+		try:
+			raw = parser.get(option.section, key)
+		except (configparser.NoSectionError, configparser.NoOptionError):
+			if option.default is REQUIRED:
+				errors.append("{}.{} is required".format(option.section, key))
+			else:
+				values[name] = option.default
+			continue
+		try:
+			values[name] = option.convert(raw)
+		except (ValueError, TypeError) as e:
+			errors.append("{}.{} is invalid: {}".format(option.section, key, e))
+	if errors:
+		raise octo.exceptions.InvalidConfigError("Invalid configuration for plugin '{}': {}".format(
+			plugin_name, "; ".join(errors)))
+	return snapshot_class(values)(values)
@@ -0,0 +1,194 @@
+"""
+Plugin discovery with a persistent on-disk cache.
+
+`CachingPluginFileLocator` is a drop-in replacement for yapsy's
+PluginFileLocator which remembers the directory tree it walked and the parsed
+contents of each plugin info file. On subsequent runs, directories whose
+mtime is unchanged are not listed again, and info files whose mtime and size
+are unchanged are not parsed again.
+"""
+
+import os
+import json
+import logging
+from yapsy.PluginFileLocator import PluginFileLocator
+from yapsy.PluginInfo import PluginInfo
+from yapsy.compat import ConfigParser
+from octo.records import PluginRecord, CompactConfig
+
+CACHE_FORMAT_VERSION = 1
+
+
+def _serialize_config(config_parser):
+	"""Return the contents of a ConfigParser as a {section: {option: value}} dict"""
+	return dict((section, dict(config_parser.items(section, raw=True)))
+	            for section in config_parser.sections())
+
+
+def _deserialize_config(sections):
+	"""Return a ConfigParser filled with the output of _serialize_config"""
+	config_parser = ConfigParser()
+	for section in sorted(sections):
+		config_parser.add_section(section)
+		for option, value in sections[section].items():
+			config_parser.set(section, option, value)
+	return config_parser
+
+
+class CachingPluginFileLocator(PluginFileLocator):
+	"""
+	A PluginFileLocator which caches discovery results in ``cache_file``
+
+	When ``rebuild`` is True, an existing cache file is ignored and replaced
+	with the results of a full scan.
+	"""
+
+	def __init__(self, cache_file, analyzers=None, rebuild=False):
+		PluginFileLocator.__init__(self, analyzers=analyzers)
+		self.cache_file = cache_file
+		self.rebuild = rebuild
+
+	def load_cache(self):
+		"""Return the cached directory and info file entries as a tuple of two dicts"""
+		if self.rebuild or not os.path.exists(self.cache_file):
+			return {}, {}
+		try:
+			with open(self.cache_file) as file:
+				cache = json.load(file)
+		except (IOError, OSError, ValueError) as e:
+			logging.warning("Ignoring unreadable plugin discovery cache {}: {}".format(self.cache_file, e))
+			return {}, {}
+		if cache.get('version') != CACHE_FORMAT_VERSION:
+			return {}, {}
+		return cache['directories'], cache['infofiles']
+
+	def save_cache(self, directories, infofiles):
+		"""Atomically write the given directory and info file entries to the cache file"""
+		cache = {'version': CACHE_FORMAT_VERSION, 'directories': directories, 'infofiles': infofiles}
+		tmp_file = "{}.{}.tmp".format(self.cache_file, os.getpid())
+		try:
+			with open(tmp_file, 'w') as file:
+				json.dump(cache, file, sort_keys=True)
+			os.rename(tmp_file, self.cache_file)
+		except (IOError, OSError) as e:
+			logging.warning("Unable to write plugin discovery cache {}: {}".format(self.cache_file, e))
+
+	def locatePlugins(self):
+		"""
+		Walk through the plugins' places and look for plugins, using the cache
+		for unchanged directories and info files.
+
+		Return the candidates and number of plugins found.
+		"""
+		old_directories, old_infofiles = self.load_cache()
+		directories = {}
+		infofiles = {}
+		candidates = []
+		discovered = {}
+		for directory in map(os.path.abspath, self.plugins_places):
+			if not os.path.isdir(directory):
+				logging.debug("Skipping plugin directory {} (not a directory)".format(directory))
+				continue
+			self._scan_directory(directory, old_directories, old_infofiles,
+			                     directories, infofiles, candidates, discovered)
+		self.save_cache(directories, infofiles)
+		return candidates, len(candidates)
+
+	def _scan_directory(self, directory, old_directories, old_infofiles,
+	                    directories, infofiles, candidates, discovered):
+		"""Collect candidates from directory, only listing it when it changed"""
+		if directory in directories:
+			# Already visited, for example through a symlink
+			return
+		mtime = os.stat(directory).st_mtime
+		entry = old_directories.get(directory)
+		if entry is None or entry['mtime'] != mtime:
+			logging.debug("Scanning plugin directory {}".format(directory))
+			subdirs = []
+			files = []
+			for filename in sorted(os.listdir(directory)):
+				if os.path.isdir(os.path.join(directory, filename)):
+					if self.recursive:
+						subdirs.append(filename)
+				elif self._get_analyzer(filename) is not None:
+					files.append(filename)
+			entry = {'mtime': mtime, 'subdirs': subdirs, 'infofiles': files}
+		directories[directory] = entry
+
+		for filename in entry['infofiles']:
+			self._locate_infofile(directory, filename, old_infofiles, infofiles, candidates, discovered)
+		for subdir in entry['subdirs']:
+			path = os.path.join(directory, subdir)
+			if os.path.isdir(path):
+				self._scan_directory(path, old_directories, old_infofiles,
+				                     directories, infofiles, candidates, discovered)
+
+	def _get_analyzer(self, filename):
+		"""Return the first analyzer which considers filename a plugin info file"""
+		for analyzer in self._analyzers:
+			if analyzer.isValidPlugin(filename):
+				return analyzer
+		return None
+
+	def _locate_infofile(self, directory, filename, old_infofiles, infofiles, candidates, discovered):
+		"""Add the plugin described by an info file to candidates, parsing it only when it changed"""
+		infofile = os.path.join(directory, filename)
+		if infofile in discovered:
+			return
+		try:
+			stat = os.stat(infofile)
+		except OSError:
+			return
+		key = [stat.st_mtime, stat.st_size]
+		entry = old_infofiles.get(infofile)
+		if entry is not None and entry['stat'] == key:
+			if entry['name'] is None:
+				plugin_info = None
+			else:
+				plugin_info = self._plugin_info_from_entry(filename, entry)
+		else:
+			logging.debug("Parsing plugin info file {}".format(infofile))
+			analyzer = self._get_analyzer(filename)
+			if analyzer is None:
+				return
+			plugin_info = self._getInfoForPluginFromAnalyzer(analyzer, directory, filename)
+			if plugin_info is None:
+				entry = {'stat': key, 'name': None}
+			else:
+				entry = {'stat': key, 'name': plugin_info.name, 'path': plugin_info.path,
+				         'details': _serialize_config(plugin_info.details)}
+		infofiles[infofile] = entry
+		if plugin_info is None:
+			return
+
+		if os.path.isdir(plugin_info.path):
+			candidate_filepath = os.path.join(plugin_info.path, "__init__")
+			for module_file in os.listdir(plugin_info.path):
+				if module_file.endswith(".py"):
+					self._discovered_plugins[os.path.join(plugin_info.path, module_file)] = candidate_filepath
+					discovered[os.path.join(plugin_info.path, module_file)] = candidate_filepath
+		elif (plugin_info.path.endswith(".py") and os.path.isfile(plugin_info.path)) or os.path.isfile(plugin_info.path + ".py"):
+			candidate_filepath = plugin_info.path
+			if candidate_filepath.endswith(".py"):
+				candidate_filepath = candidate_filepath[:-3]
+			self._discovered_plugins[plugin_info.path + ".py"] = candidate_filepath
+			discovered[plugin_info.path + ".py"] = candidate_filepath
+		else:
+			logging.error("Plugin candidate rejected: cannot find the file or directory "
+			              "module for '{}'".format(infofile))
+			return
+		candidates.append((infofile, candidate_filepath, plugin_info))
+		discovered[infofile] = candidate_filepath
+		self._discovered_plugins[infofile] = candidate_filepath
+
+	def _plugin_info_from_entry(self, filename, entry):
+		"""Rebuild a PluginInfo object from a cached info file entry"""
+		analyzer = self._get_analyzer(filename)
+		plugin_info_cls = self._plugin_info_cls_map.get(analyzer.name, self._default_plugin_info_cls)
+		if plugin_info_cls is PluginInfo:
+			# Don't build a ConfigParser which the manager would only discard
+			return PluginRecord(entry['name'], entry['path'], CompactConfig(
+				(section, sorted(items.items())) for section, items in sorted(entry['details'].items())))
+		plugin_info = plugin_info_cls(entry['name'], entry['path'])
+		plugin_info.details = _deserialize_config(entry['details'])
+		return plugin_info
@@ -0,0 +1,126 @@
+"""
+Publish/subscribe event bus for communication between plugins.
+
+Subscriptions are indexed by topic, so publishing an event only involves the
+plugins which subscribed to its topic, regardless of how many plugins are
+loaded in total.
+"""
+
+import logging
+import threading
+try:
+	import queue
+except ImportError:
+	import Queue as queue  # Python 2
+
+
+class EventBus(object):
+	"""
+	A topic-indexed registry of event handlers
+
+	Each plugin may register one handler per topic. Handler lists are
+	replaced rather than modified when subscriptions change, so publishing
+	never needs to take a lock.
+	"""
+
+	def __init__(self):
+		# topic -> tuple of (plugin name, handler) pairs
+		self._topics = {}
+		# plugin name -> set of topics, to quickly drop a plugin's subscriptions
+		self._plugin_topics = {}
+		self._lock = threading.Lock()
+		self._queue = None
+		self._worker = None
+
+	def subscribe(self, plugin_name, topic, handler):
+		"""
+		Subscribe handler to topic on behalf of plugin_name
+
+		An existing subscription of the same plugin to the same topic is
+		replaced.
+		"""
+		with self._lock:
+			subscribers = [s for s in self._topics.get(topic, ()) if s[0] != plugin_name]
+			subscribers.append((plugin_name, handler))
+			self._topics[topic] = tuple(subscribers)
+			self._plugin_topics.setdefault(plugin_name, set()).add(topic)
+
+	def unsubscribe(self, plugin_name, topic=None):
+		"""
+		Remove the subscription of plugin_name to topic
+
+		When topic is None, all subscriptions of plugin_name are removed.
+		"""
+		with self._lock:
+			if topic is None:
+				topics = self._plugin_topics.pop(plugin_name, set())
+			else:
+				topics = set([topic])
+				self._plugin_topics.get(plugin_name, set()).discard(topic)
+			for topic in topics:
+				subscribers = tuple(s for s in self._topics.get(topic, ()) if s[0] != plugin_name)
+				if subscribers:
+					self._topics[topic] = subscribers
+				else:
+					self._topics.pop(topic, None)
+
+	def subscribers(self, topic):
+		"""Return the names of the plugins subscribed to topic"""
+		return [plugin_name for plugin_name, handler in self._topics.get(topic, ())]
+
+	def publish(self, topic, args=[], kwargs={}):
+		"""
+		Deliver an event to all subscribers of topic on the calling thread
+
+		Returns a dictionary of {'plugin name': <handler result>}. When a
+		handler raises an exception, the exception object is returned as that
+		plugin's result.
+		"""
+		results = {}
+		for plugin_name, handler in self._topics.get(topic, ()):
+			try:
+				results[plugin_name] = handler(*args, **kwargs)
+			except Exception as e:
+				logging.exception("Exception while delivering '{}' to '{}'".format(topic, plugin_name))
+				results[plugin_name] = e
+		return results
+
+	def publish_queued(self, topic, args=[], kwargs={}):
+		"""
+		Queue an event for delivery to all subscribers of topic
+
+		Events are delivered in order on a background thread, which is started
+		on first use. Results are discarded, exceptions are logged.
+		"""
+		with self._lock:
+			if self._worker is None:
+				self._queue = queue.Queue()
+				self._worker = threading.Thread(target=self._deliver_queued, name="octo-events")
+				self._worker.daemon = True
+				self._worker.start()
+		self._queue.put((topic, args, kwargs))
+
+	def _deliver_queued(self):
+		"""Deliver queued events until a None sentinel is received"""
+		while True:
+			event = self._queue.get()
+			try:
+				if event is None:
+					return
+				self.publish(*event)
+			finally:
+				self._queue.task_done()
+
+	def flush(self):
+		"""Block until all queued events have been delivered"""
+		if self._queue is not None:
+			self._queue.join()
+
+	def close(self):
+		"""Deliver outstanding queued events and stop the delivery thread"""
+		with self._lock:
+			worker = self._worker
+			self._worker = None
+		if worker is not None:
+			self._queue.put(None)
+			worker.join()
@@ -14,4 +14,49 @@ class AlreadyStartedError(OctoException):
 
 class NoSuchPluginError(OctoException):
 	"""Raised when an action is to be performed on a plugin that cannot be found"""
-	pass
\ No newline at end of file
+	pass
+
+
+class PluginTimeoutError(OctoException):
+	"""Returned in place of a result when a plugin call does not complete in time"""
+	pass
+
+
+class DependencyError(OctoException):
+	"""Raised when plugin requirements are missing or form a cycle"""
+	pass
+
+
+class PluginLoadError(OctoException):
+	"""Raised when the module of a lazily loaded plugin cannot be imported"""
+	pass
+
+
+class InvalidConfigError(OctoException):
+	"""Raised when the configuration of a plugin doesn't match its config schema"""
+	pass
+
+
+class WorkerCrashedError(OctoException):
+	"""Raised when the worker process of a process-isolated plugin dies during a call"""
+	pass
+
+
+class NoSuchBufferError(OctoException):
+	"""Raised when a shared buffer cannot be found"""
+	pass
+
+
+class BufferExistsError(OctoException):
+	"""Raised when creating a shared buffer under a name which is already in use"""
+	pass
+
+
+class NoSuchMailboxError(OctoException):
+	"""Raised when sending messages to a plugin which doesn't implement on_messages"""
+	pass
+
+
+class MailboxFullError(OctoException):
+	"""Raised when a blocking send can't queue a message before its timeout expires"""
+	pass
@@ -0,0 +1,227 @@
+"""
+Process isolation for plugins.
+
+A plugin whose info file contains ``Isolation = process`` in its ``Core``
+section runs in a worker process of its own, so CPU-heavy plugins don't
+compete for the GIL of the octo process. The manager replaces the plugin's
+object with a `ProcessPluginProxy`, which forwards method calls to the
+worker over a pipe. Calls and results are serialized with the highest
+available pickle protocol, so arguments, return values and exceptions must
+be picklable.
+
+Workers are started when the plugin is activated and stopped when it is
+deactivated. Note that `octo.instance` is not available within a worker.
+"""
+
+import logging
+import multiprocessing
+import os
+import pickle
+import signal
+import sys
+import threading
+import octo.exceptions
+from octo.config import compile_config, get_schema
+from octo.discovery import _serialize_config, _deserialize_config
+from yapsy.PluginInfo import PluginInfo
+from yapsy.PluginManager import PluginManager
+
+# Spawn fresh interpreters rather than forking a process which may be
+# running other threads
+try:
+	_context = multiprocessing.get_context('spawn')
+except AttributeError:
+	_context = multiprocessing  # Python 2
+
+# Seconds to wait for a worker to exit after asking it to, before killing it
+STOP_TIMEOUT = 5
+
+
+def _send(connection, message):
+	connection.send_bytes(pickle.dumps(message, pickle.HIGHEST_PROTOCOL))
+
+
+def _receive(connection):
+	return pickle.loads(connection.recv_bytes())
+
+
+def _worker_main(connection, plugin_name, module_name, filepath, class_name, config):
+	"""
+	Entry point of a worker process
+
+	Imports and instantiates the plugin, reports its public methods and then
+	serves (method name, args, kwargs) requests until a None request is
+	received or the pipe is closed. Each request is answered with a
+	(success, result or exception) tuple.
+	"""
+	# Interrupts are handled by the octo process, which stops the worker
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	try:
+		# Import under the same module name as in the octo process, so
+		# instances of classes defined by the plugin can be unpickled there
+		module = PluginManager._importModule(module_name, filepath)
+		plugin_object = getattr(module, class_name)()
+		plugin = PluginInfo(plugin_name, filepath)
+		plugin.details = _deserialize_config(config)
+		plugin.plugin_object = plugin_object
+		plugin_object.plugin_object = plugin
+		plugin_object.plugin_config = plugin.details
+		plugin_object.plugin_settings = compile_config(get_schema(type(plugin_object)), plugin.details, plugin_name)
+		methods = [name for name in dir(plugin_object)
+		           if not name.startswith('_') and callable(getattr(plugin_object, name, None))]
+	except Exception as e:
+		_send(connection, (False, octo.exceptions.PluginLoadError(
+			"Unable to load plugin '{}' in worker: {!r}".format(plugin_name, e))))
+		return
+	_send(connection, (True, methods))
+
+	while True:
+		try:
+			request = _receive(connection)
+		except EOFError:
+			return
+		if request is None:
+			return
+		func, args, kwargs = request
+		try:
+			response = (True, getattr(plugin_object, func)(*args, **kwargs))
+		except Exception as e:
+			response = (False, e)
+		try:
+			_send(connection, response)
+		except Exception as e:
+			# The result or exception couldn't be pickled
+			_send(connection, (False, octo.exceptions.OctoException(
+				"Unable to return result of '{}' from worker: {!r}".format(func, e))))
+
+
+class ProcessPluginProxy(object):
+	"""
+	Stands in for the object of a plugin running in a worker process
+
+	Public methods of the plugin are available as methods of the proxy once
+	it has been activated. When the worker dies, the call in progress raises
+	`octo.exceptions.WorkerCrashedError` and the worker is restarted and
+	activated again. Should that fail, restarting is retried on the next
+	call.
+	"""
+
+	def __init__(self, plugin_name, plugin_class, config):
+		self.plugin_name = plugin_name
+		self.plugin_class = plugin_class
+		self.is_activated = False
+		self._config = _serialize_config(config)
+		self._methods = frozenset()
+		self._process = None
+		self._connection = None
+		# A worker serves one request at a time
+		self._lock = threading.Lock()
+
+	def __getattr__(self, name):
+		# Only called for attributes which aren't found the normal way
+		if name.startswith('_') or name not in self._methods:
+			raise AttributeError(name)
+
+		def method(*args, **kwargs):
+			return self.call(name, args, kwargs)
+		method.__name__ = name
+		self.__dict__[name] = method
+		return method
+
+	def activate(self):
+		"""Start the worker and activate the plugin within it"""
+		with self._lock:
+			self._start_worker()
+			self._request('activate', (), {})
+			self.is_activated = True
+
+	def deactivate(self):
+		"""Deactivate the plugin within the worker and stop the worker"""
+		with self._lock:
+			self.is_activated = False
+			try:
+				if self._connection is not None:
+					self._request('deactivate', (), {})
+			finally:
+				self._stop_worker()
+
+	def call(self, func, args, kwargs):
+		"""Call func on the plugin in the worker process and return its result"""
+		with self._lock:
+			if self._connection is None:
+				self._restart_worker()
+			return self._request(func, args, kwargs)
+
+	def is_alive(self):
+		"""Return whether the worker process is running"""
+		return self._process is not None and self._process.is_alive()
+
+	def _start_worker(self):
+		module = sys.modules[self.plugin_class.__module__]
+		filepath = module.__file__
+		if os.path.basename(filepath).startswith('__init__.'):
+			filepath = os.path.dirname(filepath)
+		else:
+			filepath = os.path.splitext(filepath)[0]
+		connection, child_connection = _context.Pipe()
+		process = _context.Process(target=_worker_main, name="octo-worker: {}".format(self.plugin_name),
+		                           args=(child_connection, self.plugin_name, module.__name__, filepath,
+		                                 self.plugin_class.__name__, self._config))
+		process.daemon = True
+		process.start()
+		child_connection.close()
+		try:
+			success, value = _receive(connection)
+		except EOFError:
+			success, value = False, octo.exceptions.PluginLoadError(
+				"Worker of plugin '{}' exited during startup".format(self.plugin_name))
+		if not success:
+			connection.close()
+			process.join()
+			raise value
+		logging.debug("Started worker {} for plugin '{}'".format(process.pid, self.plugin_name))
+		self._methods = frozenset(value)
+		self._process = process
+		self._connection = connection
+
+	def _stop_worker(self):
+		if self._connection is not None:
+			try:
+				_send(self._connection, None)
+			except (EOFError, OSError):
+				pass
+			self._connection.close()
+			self._connection = None
+		if self._process is not None:
+			self._process.join(STOP_TIMEOUT)
+			if self._process.is_alive():
+				logging.warning("Worker of plugin '{}' did not exit, terminating it".format(self.plugin_name))
+				self._process.terminate()
+				self._process.join()
+			self._process = None
+
+	def _restart_worker(self):
+		logging.warning("Restarting worker of plugin '{}'".format(self.plugin_name))
+		self._stop_worker()
+		self._start_worker()
+		if self.is_activated:
+			self._request('activate', (), {}, restart=False)
+
+	def _request(self, func, args, kwargs, restart=True):
+		try:
+			_send(self._connection, (func, args, kwargs))
+			success, value = _receive(self._connection)
+		except (EOFError, OSError):
+			logging.error("Worker of plugin '{}' died while calling '{}'".format(self.plugin_name, func))
+			self._stop_worker()
+			if restart:
+				try:
+					self._restart_worker()
+				except Exception:
+					# Tried again on the next call
+					logging.exception("Unable to restart worker of plugin '{}'".format(self.plugin_name))
+			raise octo.exceptions.WorkerCrashedError(
+				"Worker of plugin '{}' died while calling '{}'".format(self.plugin_name, func))
+		if not success:
+			raise value
+		return value
@@ -0,0 +1,221 @@
+"""
+Bounded per-plugin mailboxes with batched delivery.
+
+Plugins which implement `octo.plugin.OctoPlugin.on_messages` get a
+`Mailbox` while they are active. Other plugins send messages to it through
+`octo.manager.Manager.send` or `octo.manager.Manager.send_many`, which
+return as soon as the messages are queued. A worker thread of the mailbox
+drains the queue and hands the messages to the plugin in batches: a batch
+is delivered once ``batch_size`` messages are waiting, or once the oldest
+waiting message has waited ``max_latency`` seconds.
+
+A mailbox holds at most ``maxsize`` messages. When it is full, the
+``policy`` decides what happens to a new message: 'block' makes the sender
+wait for room, 'drop' discards the new message and 'shed' discards the
+oldest waiting message to make room for it.
+"""
+
+import logging
+import threading
+from collections import deque
+import octo.exceptions
+from octo.metrics import clock
+
+POLICIES = ('block', 'drop', 'shed')
+
+
+class Mailbox(object):
+	"""
+	A bounded queue of messages for a single plugin, delivered to handler
+	in batches on a worker thread
+
+	The worker thread is started when the first message is sent, and stopped
+	by `close`. Messages are delivered in the order they were sent.
+	"""
+
+	def __init__(self, plugin_name, handler, maxsize=1000, policy='block', batch_size=100, max_latency=0.01):
+		if maxsize < 1:
+			raise ValueError("The mailbox size must be at least 1")
+		if batch_size < 1:
+			raise ValueError("The batch size must be at least 1")
+		if max_latency < 0:
+			raise ValueError("The maximum latency can't be negative")
+		if policy not in POLICIES:
+			raise ValueError("Unknown mailbox policy '{}', must be one of {}".format(policy, ", ".join(POLICIES)))
+		self.plugin_name = plugin_name
+		self.handler = handler
+		self.maxsize = maxsize
+		self.policy = policy
+		self.batch_size = batch_size
+		self.max_latency = max_latency
+		self.received = 0
+		self.delivered = 0
+		self.dropped = 0
+		self.shed = 0
+		self.blocked = 0
+		self.batches = 0
+		self.errors = 0
+		# (clock time the message was sent, message) tuples
+		self._queue = deque()
+		self._lock = threading.Lock()
+		self._not_empty = threading.Condition(self._lock)
+		self._not_full = threading.Condition(self._lock)
+		self._idle = threading.Condition(self._lock)
+		self._delivering = False
+		self._closed = False
+		self._thread = None
+
+	def __repr__(self):
+		return "<Mailbox of plugin {!r}>".format(self.plugin_name)
+
+	def put(self, message, timeout=None):
+		"""
+		Queue message for delivery
+
+		Returns False when the message was discarded because the mailbox is
+		full (with the 'drop' policy) or closed, True otherwise. With the
+		'block' policy, raises `octo.exceptions.MailboxFullError` when there
+		is still no room after ``timeout`` seconds.
+		"""
+		return self.put_many((message,), timeout) == 1
+
+	def put_many(self, messages, timeout=None):
+		"""
+		Queue messages for delivery, taking the lock only once
+
+		Returns the number of messages which were queued. With the 'block'
+		policy, ``timeout`` limits how long to wait for room for all of them;
+		when it expires `octo.exceptions.MailboxFullError` is raised and the
+		messages before the one which didn't fit stay queued.
+		"""
+		end = None if timeout is None else clock() + timeout
+		accepted = 0
+		with self._lock:
+			if self._thread is None and not self._closed:
+				self._thread = threading.Thread(target=self._deliver, name="octo-mailbox")
+				self._thread.daemon = True
+				self._thread.start()
+			now = clock()
+			for message in messages:
+				if len(self._queue) >= self.maxsize and not self._closed:
+					if self.policy == 'drop':
+						self.dropped += 1
+						continue
+					elif self.policy == 'shed':
+						self._queue.popleft()
+						self.shed += 1
+					else:
+						self.blocked += 1
+						# Let the worker deliver what was queued so far
+						self._not_empty.notify()
+						while len(self._queue) >= self.maxsize and not self._closed:
+							remaining = None if end is None else end - clock()
+							if remaining is not None and remaining <= 0:
+								self.received += accepted
+								raise octo.exceptions.MailboxFullError(
+									"The mailbox of plugin '{}' is full".format(self.plugin_name))
+							self._not_full.wait(remaining)
+						now = clock()
+				if self._closed:
+					self.dropped += 1
+					continue
+				self._queue.append((now, message))
+				accepted += 1
+			if accepted:
+				self.received += accepted
+				self._not_empty.notify()
+		return accepted
+
+	def _deliver(self):
+		"""Body of the worker thread"""
+		while True:
+			with self._lock:
+				while True:
+					if self._queue:
+						if self._closed or len(self._queue) >= self.batch_size:
+							break
+						wait = self._queue[0][0] + self.max_latency - clock()
+						if wait <= 0:
+							break
+					elif self._closed:
+						self._idle.notify_all()
+						return
+					else:
+						wait = None
+					self._not_empty.wait(wait)
+				queue = self._queue
+				batch = [queue.popleft()[1] for i in range(min(self.batch_size, len(queue)))]
+				self._delivering = True
+				self._not_full.notify(len(batch))
+			try:
+				self.handler(batch)
+				failed = False
+			except Exception:
+				logging.exception("Exception while delivering messages to plugin {}".format(self.plugin_name))
+				failed = True
+			with self._lock:
+				self.delivered += len(batch)
+				self.batches += 1
+				if failed:
+					self.errors += 1
+				self._delivering = False
+				if not self._queue:
+					self._idle.notify_all()
+
+	def depth(self):
+		"""Return the number of messages waiting for delivery"""
+		return len(self._queue)
+
+	def flush(self, timeout=None):
+		"""
+		Block until all queued messages have been delivered, for at most
+		timeout seconds
+
+		Returns True when the mailbox is empty.
+		"""
+		end = None if timeout is None else clock() + timeout
+		with self._lock:
+			while self._queue or self._delivering:
+				if self._thread is None:
+					break
+				remaining = None if end is None else end - clock()
+				if remaining is not None and remaining <= 0:
+					return False
+				self._idle.wait(remaining)
+			return not self._queue
+
+	def stats(self):
+		"""Return the depth and counters of this mailbox as a dictionary"""
+		with self._lock:
+			return {
+				'depth': len(self._queue),
+				'maxsize': self.maxsize,
+				'policy': self.policy,
+				'received': self.received,
+				'delivered': self.delivered,
+				'dropped': self.dropped,
+				'shed': self.shed,
+				'blocked': self.blocked,
+				'batches': self.batches,
+				'errors': self.errors,
+			}
+
+	def close(self, drain=True):
+		"""
+		Stop accepting messages and stop the worker thread
+
+		When drain is True, messages which are still queued are delivered
+		first and this blocks until they have been (unless called from the
+		worker thread itself). Otherwise they are discarded and counted as
+		dropped. Senders blocked on a full mailbox return right away.
+		"""
+		with self._lock:
+			self._closed = True
+			if not drain:
+				self.dropped += len(self._queue)
+				self._queue.clear()
+			thread = self._thread
+			self._not_empty.notify_all()
+			self._not_full.notify_all()
+		if drain and thread is not None and thread is not threading.current_thread():
+			thread.join()
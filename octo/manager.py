@@ -1,20 +1,60 @@
 import octo
 import octo.exceptions
+import octo.plugin
 import signal
 import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from yapsy.PluginManager import PluginManager
+from yapsy.PluginInfo import PluginInfo
+from yapsy.PluginFileLocator import PluginFileAnalyzerWithInfoFile
+from octo.discovery import CachingPluginFileLocator
+from octo.profiling import StartupProfile, null_context, cpu_time
+from octo.metrics import Metrics, clock
+from octo.events import EventBus
+from octo.watch import PluginWatcher
+from octo.isolation import ProcessPluginProxy
+from octo.buffers import BufferRegistry
+from octo.cache import MethodCache
+from octo.scheduler import Scheduler
+from octo.mailbox import Mailbox
+from octo.config import BASE_SCHEMA, compile_config, get_schema
+from octo.records import PluginRecord, get_config
 try:
 	import configparser
 except ImportError:
 	import ConfigParser as configparser  # Python 2
+try:
+	import asyncio
+except ImportError:
+	asyncio = None  # Python 2
+try:
+	from types import MappingProxyType
+except ImportError:
+	MappingProxyType = dict  # Python 2, falls back to returning a copy
 
 def exit_handler(signal, frame):
-	"""Called by `run` upon receiving SIGINT"""
+	"""Called by `run` upon receiving SIGINT or SIGTERM"""
 	logging.info("Interrupt received, shutting down")
 	octo.manager.stop()
 
 
-def run(plugin_dirs=[], block=False):
+def stats_handler(signal, frame):
+	"""Called by `run` upon receiving SIGUSR1, logs call metrics"""
+	if octo.instance is None:
+		return
+	metrics = octo.instance.get_metrics()
+	if metrics is None:
+		logging.info("Call metrics are not enabled")
+	else:
+		logging.info("Call metrics:\n{}".format(metrics.format_table()))
+
+
+def run(plugin_dirs=[], block=False, event_loop=False, watch=False, **kwargs):
 	"""
 	Runs the ``octo`` application.
 
@@ -22,18 +62,58 @@ def run(plugin_dirs=[], block=False):
 	available as `octo.instance` so that plugins may import and interact with
 	it.
 
-	If block=True, this function will block until a SIGINT is received, either
-	by the user hitting Ctrl+C or another process sending a SIGINT signal. If
-	block=False then applications must ensure to call stop() appropriately
-	themselves.
+	If block=True, this function will block until a SIGINT or SIGTERM is
+	received, either by the user hitting Ctrl+C or another process sending a
+	signal. If block=False then applications must ensure to call stop()
+	appropriately themselves.
+
+	When blocking, receiving SIGUSR1 logs the manager's call metrics (see
+	`Manager.get_stats`).
+
+	If event_loop=True, a new asyncio event loop is installed as the current
+	loop before plugins are activated, so coroutine lifecycle hooks and
+	plugin coroutines all share it. Combined with block=True, this loop is
+	run until SIGINT or SIGTERM is received, instead of sleeping in
+	signal.pause().
+
+	If watch=True, plugin directories are watched for changes once plugins
+	have been activated, and changed plugins are reloaded (see
+	`Manager.watch`).
+
+	Any additional keyword arguments are passed on to `Manager`.
 	"""
 	if octo.instance is not None:
 		raise octo.exceptions.AlreadyStartedError("main() can only be called once")
-	octo.instance = Manager(plugin_dirs=plugin_dirs)
-	octo.instance.start()
+	if event_loop:
+		loop = asyncio.new_event_loop()
+		asyncio.set_event_loop(loop)
+		octo.plugin.set_hook_loop(loop)
+	octo.instance = Manager(plugin_dirs=plugin_dirs, **kwargs)
+	if event_loop:
+		# Activate on this thread so coroutine hooks all run on the new loop
+		octo.instance.start(parallel=False)
+	else:
+		octo.instance.start()
+	if watch:
+		octo.instance.watch()
 	if block:
-		signal.signal(signal.SIGINT, exit_handler)
-		signal.pause()
+		if event_loop:
+			if hasattr(signal, 'SIGUSR1'):
+				loop.add_signal_handler(signal.SIGUSR1, stats_handler, signal.SIGUSR1, None)
+			loop.add_signal_handler(signal.SIGTERM, loop.stop)
+			loop.add_signal_handler(signal.SIGINT, loop.stop)
+			loop.run_forever()
+			# Deactivate once the loop has stopped so coroutine hooks can
+			# still be run to completion on it.
+			exit_handler(signal.SIGINT, None)
+			loop.close()
+			octo.plugin.set_hook_loop(None)
+		else:
+			if hasattr(signal, 'SIGUSR1'):
+				signal.signal(signal.SIGUSR1, stats_handler)
+			signal.signal(signal.SIGTERM, exit_handler)
+			signal.signal(signal.SIGINT, exit_handler)
+			signal.pause()
 
 
 def stop():
@@ -48,6 +128,37 @@ def stop():
 	octo.instance = None
 
 
+def _timed_call(started, plugin_name, method, args, kwargs):
+	"""
+	Call method, recording the moment it starts executing in ``started``
+
+	Used by `Manager.call_many` in concurrent mode so per-plugin timeouts
+	can be measured from the moment a worker picks the call up.
+	"""
+	started[plugin_name] = time.time()
+	return method(*args, **kwargs)
+
+
+class _Snapshot(object):
+	"""
+	An immutable snapshot of the active plugins
+
+	The manager publishes a new snapshot whenever a plugin is activated or
+	deactivated, so readers can use the one they picked up without locking.
+	"""
+
+	__slots__ = ('plugins', 'view', 'dispatch')
+
+	def __init__(self, plugins):
+		# Never modified once the snapshot has been created
+		self.plugins = plugins
+		self.view = MappingProxyType(plugins)
+		# Lazily built mapping of function name to a list of (plugin name,
+		# bound method) tuples for the plugins implementing it. Readers which
+		# race to fill in the same entry compute the same value.
+		self.dispatch = {}
+
+
 class Manager(object):
 	"""
 	This is the main ``octo`` application class.
@@ -55,105 +166,1575 @@ class Manager(object):
 	Normally, you would call `octo.main` instead of creating an instance of this
 	class directly, as `octo.main` will make it available globally as `octo.instance`
 	so plugins may interact with it.
+
+	``max_workers`` sets the size of the thread pool used by `call_many` in
+	concurrent mode. Alternatively, an existing `concurrent.futures.Executor`
+	may be passed as ``executor``, for example a ProcessPoolExecutor for
+	CPU-bound handlers (their methods and arguments must then be picklable).
+	An executor passed in this way is not shut down by the manager.
+
+	When ``cache_file`` is given, plugin discovery results are cached in that
+	file (see `octo.discovery.CachingPluginFileLocator`) so unchanged plugin
+	directories don't need to be walked and parsed again on the next start.
+	``rebuild_cache`` discards any existing cache contents.
+
+	When ``lazy`` is True, plugin modules are not imported up front. Only the
+	metadata from the .octoplugin files is kept, and a plugin's module is
+	imported when the plugin is first activated. Until then, its
+	``plugin_object`` is None.
+
+	When ``profile_startup`` is True, wall clock and CPU time spent on
+	discovery, importing, binding and activating each plugin are recorded
+	in a `octo.profiling.StartupProfile`, available through
+	`get_startup_profile`. `start` logs it as a table once done, and also
+	writes it as JSON to ``profile_file`` if given.
+
+	When ``metrics`` is True, call counts, error counts and latency
+	histograms are kept for every plugin method called through `call`,
+	`call_many`, `acall` and `acall_many`. See `get_stats`.
+
+	``shutdown_timeout`` and ``plugin_shutdown_timeout`` are the default
+	timeouts used by `stop`.
+
+	Periodic tasks of plugins (see `schedule`) run on a pool of at most
+	``scheduler_workers`` threads.
+
+	Plugins implementing ``on_messages`` get a mailbox (see `send`) with
+	the options in ``mailbox_options``, overridden by the
+	``mailbox_options`` of the plugin class.
+
+	Plugins configured with ``Isolation = process`` under ``Core`` run in a
+	worker process of their own, see `octo.isolation`.
+
+	``sockets`` is a dictionary of addresses and listening sockets bound
+	before plugins are loaded, which plugins can retrieve through
+	`get_sockets`. `octo.prefork` uses it to share sockets between worker
+	processes.
+
+	Plugins may be reloaded while the manager is running, either explicitly
+	through `reload_plugin` or automatically when their files change, see
+	`watch`.
 	"""
 
-	def __init__(self, plugin_dirs=[]):
+	# Only instantiate subclasses of OctoPlugin. Otherwise yapsy may pick the
+	# imported OctoPlugin class itself instead of the plugin's own class.
+	categories_filter = {'Default': octo.plugin.OctoPlugin}
+
+	def __init__(self, plugin_dirs=[], max_workers=None, executor=None, cache_file=None, rebuild_cache=False,
+	             lazy=False, profile_startup=False, profile_file=None, metrics=False, shutdown_timeout=None,
+	             plugin_shutdown_timeout=None, scheduler_workers=4, mailbox_options=None, sockets=None):
 		logging.info("Initializing with plugin directories: {!r}".format(plugin_dirs))
-		self.plugin_manager = PluginManager(directories_list=plugin_dirs, plugin_info_ext='octoplugin')
-		self.plugin_manager.collectPlugins()
+		self._shutdown_timeout = shutdown_timeout
+		self._plugin_shutdown_timeout = plugin_shutdown_timeout
+		self._shutdown_report = None
+		self._plugin_dirs = list(plugin_dirs)
+		self._metrics = Metrics() if metrics else None
+		self._profile = StartupProfile() if profile_startup or profile_file is not None else None
+		self._profile_file = profile_file
+		self._max_workers = max_workers
+		self._executor = executor
+		self._owns_executor = False
+		if cache_file is None:
+			self.plugin_manager = PluginManager(directories_list=plugin_dirs, plugin_info_ext='octoplugin',
+			                                    categories_filter=self.categories_filter)
+		else:
+			locator = CachingPluginFileLocator(cache_file,
+			                                   analyzers=[PluginFileAnalyzerWithInfoFile('info_ext', 'octoplugin')],
+			                                   rebuild=rebuild_cache)
+			self.plugin_manager = PluginManager(directories_list=plugin_dirs, plugin_locator=locator,
+			                                    categories_filter=self.categories_filter)
 
-		for plugin in self.get_plugins(include_inactive=True).values():
+		# Name-indexed registries of all collected plugins and a snapshot of
+		# the currently active ones, so lookups never have to go through
+		# yapsy. Both are copied on write: changes are made to a copy which
+		# then replaces the original, under _write_lock. Readers never lock.
+		self._plugins = {}
+		self._snapshot = _Snapshot({})
+		self._write_lock = threading.Lock()
+		# plugin name -> RLock held for the whole activation or deactivation
+		# of that plugin, so concurrent callers can't interleave its steps
+		self._lifecycle_locks = {}
+		# Names of plugins whose activation is in progress, which may already
+		# register tasks from their on_activation
+		self._activating = set()
+		# plugin name -> plugin activated, or None for a plugin deactivated,
+		# by a wave of `start` or `stop` but not published yet. Each wave
+		# publishes all its changes with a single snapshot.
+		self._pending = {}
+		self._events = EventBus()
+		self._buffers = BufferRegistry()
+		self._scheduler = Scheduler(max_workers=scheduler_workers)
+		# plugin name -> Mailbox of active plugins implementing on_messages
+		self._mailboxes = {}
+		self._mailbox_options = dict(mailbox_options or {})
+		self._sockets = dict(sockets or {})
+		# Number of the worker process (see octo.prefork) given to start
+		self._worker = None
+		# plugin name -> {method name: MethodCache} for methods decorated
+		# with octo.plugin.cached, installed on the plugin object while active
+		self._caches = {}
+		# Candidates of plugins whose module hasn't been imported yet (lazy
+		# mode only), and the time it took to import each loaded plugin.
+		self._unloaded = {}
+		self._import_times = {}
+		self._import_started = {}
+		self._load_lock = threading.Lock()
+		# Info file path -> (module path, plugin name) of every discovered
+		# plugin, used to map changed files to the plugins to reload. The
+		# name is None when the plugin failed to load.
+		self._sources = {}
+		self._watcher = None
+		self._watch_thread = None
+		self._watch_stop = threading.Event()
+
+		with self._measure('discovery'):
+			self.plugin_manager.locatePlugins()
+		plugins = {}
+		active = {}
+		candidates = []
+		for infofile, filepath, plugin in self.plugin_manager.getPluginCandidates():
+			if type(plugin) is PluginInfo:
+				plugin = PluginRecord.from_plugin_info(plugin)
+			candidates.append((infofile, filepath, plugin))
+			self._sources[infofile] = (filepath, plugin.name)
+			if lazy:
+				plugins[plugin.name] = plugin
+				self._unloaded[plugin.name] = candidates[-1]
+		# Drop yapsy's references to the original PluginInfo objects
+		self.plugin_manager._candidates = [] if lazy else candidates
+		if not lazy:
+			self.plugin_manager.loadPlugins(callback=self._on_import_start, callback_after=self._on_import_done)
+			for plugin in self.plugin_manager.getAllPlugins():
+				plugins[plugin.name] = plugin
+				if getattr(plugin, 'is_activated', False):
+					active[plugin.name] = plugin
+				self._bind_plugin(plugin)
+		self._plugins = plugins
+		self._snapshot = _Snapshot(active)
+
+	def _measure(self, phase, plugin_name=None):
+		"""Return a context manager which records the time spent in phase when profiling"""
+		if self._profile is None:
+			return null_context
+		return self._profile.measure(phase, plugin_name)
+
+	def get_startup_profile(self):
+		"""
+		Return the `octo.profiling.StartupProfile` of this manager
+
+		Returns None unless the manager was created with profile_startup=True.
+		"""
+		return self._profile
+
+	def _bind_plugin(self, plugin):
+		"""Make the plugin info and config available on the plugin object"""
+		with self._measure('bind', plugin.name):
+			plugin.settings = self._compile_config(plugin)
+			self._isolate_plugin(plugin)
 			# Bind the plugin object so the plugin can refer to it via self
 			plugin.plugin_object.plugin_object = plugin
-			# And bind it's configparser object separately as well for a cleaner API
-			plugin.plugin_object.plugin_config = plugin.details
+			# And bind it's configparser object separately as well for a cleaner API.
+			# OctoPlugin objects build it from their plugin_object on first use.
+			if not isinstance(plugin.plugin_object, octo.plugin.OctoPlugin):
+				plugin.plugin_object.plugin_config = plugin.details
+			plugin.plugin_object.plugin_settings = plugin.settings
+
+	def _compile_config(self, plugin):
+		"""
+		Validate the config of a loaded plugin against its schema and return
+		it as an `octo.config.ConfigSnapshot`
+		"""
+		plugin_class = type(plugin.plugin_object)
+		if isinstance(plugin.plugin_object, ProcessPluginProxy):
+			plugin_class = plugin.plugin_object.plugin_class
+		return compile_config(get_schema(plugin_class), get_config(plugin), plugin.name)
+
+	def _isolate_plugin(self, plugin):
+		"""
+		Replace the object of a plugin configured with Isolation = process
+		under Core by a `octo.isolation.ProcessPluginProxy`
+		"""
+		try:
+			isolation = get_config(plugin).get('Core', 'Isolation').strip().lower()
+		except (configparser.NoSectionError, configparser.NoOptionError):
+			return
+		if isolation == 'none':
+			return
+		if isolation != 'process':
+			raise octo.exceptions.PluginLoadError(
+				"Plugin '{}' has unknown isolation '{}'".format(plugin.name, isolation))
+		plugin.plugin_object = ProcessPluginProxy(plugin.name, type(plugin.plugin_object), get_config(plugin))
+
+	def _on_import_start(self, plugin):
+		"""Called by yapsy before importing a plugin's module"""
+		self._import_started[plugin.name] = (time.time(), cpu_time())
+
+	def _on_import_done(self, plugin):
+		"""Called by yapsy after importing and instantiating a plugin"""
+		started = self._import_started.pop(plugin.name, None)
+		if started is not None:
+			wall = time.time() - started[0]
+			self._import_times[plugin.name] = wall
+			if self._profile is not None:
+				self._profile.record('import', plugin.name, wall, cpu_time() - started[1])
+
+	def _load_plugin(self, plugin_name):
+		"""Import the module of a plugin discovered in lazy mode, unless already done"""
+		if plugin_name not in self._unloaded:
+			return
+		with self._load_lock:
+			candidate = self._unloaded.pop(plugin_name, None)
+			if candidate is None:
+				return
+			logging.debug("Loading plugin {}".format(plugin_name))
+			# yapsy loads all plugins from its list of candidates, so hand it
+			# only the candidate for this plugin.
+			self.plugin_manager._candidates = [candidate]
+			self.plugin_manager.loadPlugins(callback=self._on_import_start, callback_after=self._on_import_done)
+		plugin = self._plugins[plugin_name]
+		if plugin.plugin_object is None:
+			raise octo.exceptions.PluginLoadError("Plugin '{}' could not be loaded".format(plugin_name))
+		self._bind_plugin(plugin)
+
+	def reload_plugin(self, plugin_name):
+		"""
+		Re-read the info file and reimport the module of the given plugin
+
+		The plugin is deactivated first and, if it was active, activated
+		again once reloaded. Returns the name of the reloaded plugin, which
+		differs from plugin_name when the info file renamed the plugin, or
+		None when the plugin could no longer be loaded.
+		"""
+		for infofile, (filepath, name) in list(self._sources.items()):
+			if name == plugin_name:
+				return self._reload_infofile(infofile)
+		raise octo.exceptions.NoSuchPluginError("The specified plugin doesn't exist")
+
+	def reload_changed(self):
+		"""
+		Reload the plugins whose files were created, modified or deleted
+		since the previous call
+
+		Plugins with a new info file are loaded, and activated when enabled.
+		Plugins whose info file was deleted are deactivated and dropped. The
+		first call only records the current state of the plugin directories.
+
+		Returns a list of the names of the plugins which were (re)loaded.
+		"""
+		if self._watcher is None:
+			self._watcher = PluginWatcher(self._plugin_dirs)
+			return []
+		affected = set()
+		for path in self._watcher.changes():
+			if path.endswith('.octoplugin'):
+				affected.add(path)
+				continue
+			for infofile, (filepath, name) in list(self._sources.items()):
+				if os.path.basename(filepath) == '__init__':
+					if path.startswith(os.path.dirname(filepath) + os.sep):
+						affected.add(infofile)
+				elif path == filepath + '.py':
+					affected.add(infofile)
+		reloaded = []
+		for infofile in sorted(affected):
+			logging.info("Reloading plugin from {}".format(infofile))
+			name = self._reload_infofile(infofile)
+			if name is not None:
+				reloaded.append(name)
+		return reloaded
+
+	def watch(self, interval=1.0):
+		"""
+		Start watching the plugin directories for changes
+
+		The directories are polled every ``interval`` seconds on a background
+		thread, calling `reload_changed` whenever something changed. Watching
+		stops when the manager is stopped.
+		"""
+		if self._watch_thread is not None:
+			return
+		self.reload_changed()
+		self._watch_stop.clear()
+		self._watch_thread = threading.Thread(target=self._watch, args=(interval,), name="octo-watch")
+		self._watch_thread.daemon = True
+		self._watch_thread.start()
+
+	def _watch(self, interval):
+		"""Body of the watch thread"""
+		while not self._watch_stop.wait(interval):
+			try:
+				self.reload_changed()
+			except Exception:
+				logging.exception("Exception while reloading changed plugins")
+
+	def _reload_infofile(self, infofile):
+		"""
+		Load the plugin described by infofile, replacing the plugin previously
+		loaded from it, if any
+
+		The new version is imported before the old one is deactivated. When
+		it fails to load, the old version is left in place. Returns the name
+		of the newly loaded plugin or None.
+		"""
+		filepath, old_name = self._sources.get(infofile, (None, None))
+		if not os.path.exists(infofile):
+			if old_name is not None:
+				self._unload_plugin(old_name, infofile)
+				self._import_times.pop(old_name, None)
+			self._sources.pop(infofile, None)
+			return None
+		plugin = self._load_infofile(infofile, old_name)
+		if plugin is None:
+			return None
+		was_active = None
+		if old_name is not None:
+			was_active = old_name in self._snapshot.plugins
+			self._unload_plugin(old_name, None)
+			if old_name != plugin.name:
+				self._import_times.pop(old_name, None)
+		self._bind_plugin(plugin)
+		self._update_plugins(add=plugin)
+		# New plugins are activated according to their config, reloaded
+		# ones only when they were active before
+		if was_active or (was_active is None and self._is_enabled(plugin) and
+		                  (self._worker is None or self._runs_in_worker(plugin, self._worker))):
+			self.activate_plugin(plugin.name)
+		return plugin.name
+
+	def _unload_plugin(self, plugin_name, infofile):
+		"""
+		Deactivate a plugin and remove it from the manager and yapsy
+
+		When infofile is given, yapsy also forgets that a plugin was loaded
+		from it.
+		"""
+		if plugin_name in self._snapshot.plugins:
+			self.deactivate_plugin(plugin_name)
+		plugin = self._update_plugins(remove=plugin_name)
+		self._unloaded.pop(plugin_name, None)
+		for category in list(plugin.categories):
+			self.plugin_manager.removePluginFromCategory(plugin, category)
+			infofiles = self.plugin_manager._category_file_mapping.get(category, [])
+			if infofile in infofiles:
+				infofiles.remove(infofile)
+		if plugin.plugin_object is not None:
+			plugin_class = type(plugin.plugin_object)
+			if isinstance(plugin.plugin_object, ProcessPluginProxy):
+				plugin_class = plugin.plugin_object.plugin_class
+			# Forget the old module so it can be garbage collected
+			sys.modules.pop(plugin_class.__module__, None)
+
+	def _load_infofile(self, infofile, old_name):
+		"""
+		Analyze infofile and import the plugin it describes, without
+		registering it with the manager
+
+		old_name is the name of the plugin currently loaded from infofile, if
+		any. Returns the plugin, or None when it could not be loaded.
+		"""
+		directory, filename = os.path.split(infofile)
+		try:
+			plugin = self.plugin_manager.getPluginLocator().gatherCorePluginInfo(directory, filename)[0]
+		except Exception:
+			logging.exception("Unable to read plugin info file {}".format(infofile))
+			return None
+		if plugin is None:
+			return None
+		if type(plugin) is PluginInfo:
+			plugin = PluginRecord.from_plugin_info(plugin)
+		if os.path.isdir(plugin.path):
+			filepath = os.path.join(plugin.path, '__init__')
+		elif plugin.path.endswith('.py'):
+			filepath = plugin.path[:-3]
+		else:
+			filepath = plugin.path
+		if plugin.name != old_name and plugin.name in self._plugins:
+			logging.error("Not loading {}: a plugin named '{}' already exists".format(infofile, plugin.name))
+			return None
+		self._sources[infofile] = (filepath, old_name)
+
+		# yapsy skips info files it has already loaded a plugin from
+		file_mappings = [infofiles for infofiles in self.plugin_manager._category_file_mapping.values()
+		                 if infofile in infofiles]
+		for infofiles in file_mappings:
+			infofiles.remove(infofile)
+		with self._load_lock:
+			self.plugin_manager._candidates = [(infofile, filepath, plugin)]
+			self.plugin_manager.loadPlugins(callback=self._on_import_start, callback_after=self._on_import_done)
+		if plugin.plugin_object is None:
+			logging.error("Plugin '{}' could not be loaded from {}".format(plugin.name, infofile))
+			for infofiles in file_mappings:
+				infofiles.append(infofile)
+			return None
+		try:
+			self._compile_config(plugin)
+		except octo.exceptions.InvalidConfigError:
+			logging.exception("Not loading {}".format(infofile))
+			for category in list(plugin.categories):
+				self.plugin_manager.removePluginFromCategory(plugin, category)
+				infofiles = self.plugin_manager._category_file_mapping.get(category, [])
+				if infofile in infofiles:
+					infofiles.remove(infofile)
+			for infofiles in file_mappings:
+				infofiles.append(infofile)
+			self._sources[infofile] = (filepath, old_name)
+			return None
+		self._sources[infofile] = (filepath, plugin.name)
+		return plugin
+
+	def get_import_times(self):
+		"""
+		Return a dictionary of plugin names and the time (in seconds) it took
+		to import and instantiate them
+
+		Plugins which haven't been imported (yet) are not included.
+		"""
+		return MappingProxyType(self._import_times)
 
 	def get_plugins(self, include_inactive=False):
 		"""
 		Return a dictionary of loaded plugins
 
 		Keys will consist of plugin names, with their values being the plugin
-		instances (yapsy.PluginInfo.PluginInfo objects).
+		instances (yapsy.PluginInfo.PluginInfo objects, normally the compact
+		`octo.records.PluginRecord` subclass).
 
 		When ``include_inactive`` is True, all collected plugins will be
 		returned, otherwise only the activated plugins will be returned.
+
+		The returned mapping is a read-only, immutable snapshot: it doesn't
+		reflect plugins activated, deactivated or reloaded later on.
 		"""
 		if include_inactive:
-			plugins = self.plugin_manager.getAllPlugins()
-		else:
-			plugins = [plugin for plugin in self.plugin_manager.getAllPlugins()
-			           if hasattr(plugin, 'is_activated') and plugin.is_activated]
-		return dict(zip([plugin.name for plugin in plugins], plugins))
+			return MappingProxyType(self._plugins)
+		return self._snapshot.view
+
+	def _update_active(self, add=None, remove=None):
+		"""
+		Publish a new snapshot of the active plugins, with plugin add added
+		and/or the plugin named remove removed
+
+		Returns the removed plugin, or None if it wasn't active.
+		"""
+		with self._write_lock:
+			plugins = dict(self._snapshot.plugins)
+			if add is not None:
+				plugins[add.name] = add
+				self._pending.pop(add.name, None)
+			removed = None
+			if remove is not None:
+				removed = plugins.pop(remove, None)
+				self._pending.pop(remove, None)
+			self._snapshot = _Snapshot(plugins)
+		return removed
+
+	def _publish_pending(self):
+		"""
+		Publish a single new snapshot with the changes waiting in _pending
+
+		Returns the names of the plugins removed.
+		"""
+		with self._write_lock:
+			if not self._pending:
+				return []
+			plugins = dict(self._snapshot.plugins)
+			removed = []
+			for name, plugin in self._pending.items():
+				if plugin is not None:
+					plugins[name] = plugin
+				elif plugins.pop(name, None) is not None:
+					removed.append(name)
+			# Publish before clearing, so _is_active never misses a change
+			self._snapshot = _Snapshot(plugins)
+			self._pending = {}
+		return removed
+
+	def _is_active(self, plugin_name):
+		"""Return whether a plugin is active, including changes not published yet"""
+		pending = self._pending
+		if plugin_name in pending:
+			return pending[plugin_name] is not None
+		return plugin_name in self._snapshot.plugins
+
+	def _update_plugins(self, add=None, remove=None):
+		"""
+		Replace the registry of all plugins with a copy which has plugin add
+		added and/or the plugin named remove removed
+
+		Returns the removed plugin.
+		"""
+		with self._write_lock:
+			plugins = dict(self._plugins)
+			if add is not None:
+				plugins[add.name] = add
+			removed = None if remove is None else plugins.pop(remove, None)
+			self._plugins = plugins
+		return removed
 
 	def activate_plugin(self, plugin_name):
 		"""
 		Activate the given plugin
 
-		plugin_name should be the name of the plugin to be activated.
+		plugin_name should be the name of the plugin to be activated. Plugins
+		which are already active are left alone.
 		"""
-		self.plugin_manager.activatePluginByName(plugin_name)
+		self._activate_plugin(plugin_name, publish=True)
+
+	def _activate_plugin(self, plugin_name, publish):
+		"""Body of `activate_plugin`, leaving the plugin in _pending unless publish is True"""
+		with self._lifecycle_lock(plugin_name):
+			if self._is_active(plugin_name):
+				return
+			self._load_plugin(plugin_name)
+			activated = False
+			self._activating.add(plugin_name)
+			try:
+				# Call the plugin directly instead of through yapsy's
+				# activatePluginByName, which looks it up by a linear scan
+				plugin = self._plugins.get(plugin_name)
+				plugin_object = None if plugin is None else plugin.plugin_object
+				if plugin_object is not None:
+					with self._measure('activate', plugin_name):
+						plugin_object.activate()
+				activated = plugin_object is not None and plugin_object.is_activated
+				if activated:
+					self._install_caches(plugin)
+					if publish:
+						self._update_active(add=plugin)
+					else:
+						with self._write_lock:
+							self._pending[plugin_name] = plugin
+					self._subscribe_decorated(plugin)
+					self._schedule_periodic(plugin)
+					self._open_mailbox(plugin)
+			finally:
+				self._activating.discard(plugin_name)
+				if not activated:
+					self._drop_registrations(plugin_name)
 
 	def deactivate_plugin(self, plugin_name):
 		"""
 		Deactivate the given plugin
 
 		plugin_name should be the name of the plugin to be deactivated.
+		Plugins which aren't active are left alone.
+		"""
+		self._deactivate_plugin(plugin_name, publish=True)
+
+	def _deactivate_plugin(self, plugin_name, publish):
+		"""
+		Body of `deactivate_plugin`, leaving the plugin in _pending unless
+		publish is True
+
+		The caller then has to call `_release_plugin` once it published it.
+		"""
+		with self._lifecycle_lock(plugin_name):
+			if not self._is_active(plugin_name):
+				return
+			plugin = self._pending.get(plugin_name) or self._snapshot.plugins[plugin_name]
+			# Stop periodic tasks and deliver outstanding messages before the
+			# plugin deactivates itself
+			self._scheduler.cancel_plugin(plugin_name)
+			self._close_mailbox(plugin_name)
+			plugin.plugin_object.deactivate()
+			if publish:
+				self._forget_active(plugin_name)
+			else:
+				with self._write_lock:
+					self._pending[plugin_name] = None
+
+	def _drop_registrations(self, plugin_name):
+		"""Undo what a plugin registered from an on_activation which didn't succeed"""
+		self._scheduler.cancel_plugin(plugin_name)
+		self._events.unsubscribe(plugin_name)
+		self._buffers.release_plugin(plugin_name)
+
+	def _get_registering_plugin(self, plugin_name):
+		"""
+		Return the plugin with the given name if it is active or being
+		activated, or raise NoSuchPluginError
+		"""
+		if plugin_name in self._activating:
+			return self._plugins[plugin_name]
+		# Activated by a wave of start which hasn't been published yet
+		plugin = self._pending.get(plugin_name)
+		if plugin is not None:
+			return plugin
+		return self._get_active_plugin(plugin_name)
+
+	def _lifecycle_lock(self, plugin_name):
+		"""Return the lock serializing activation and deactivation of a plugin"""
+		lock = self._lifecycle_locks.get(plugin_name)
+		if lock is None:
+			with self._write_lock:
+				lock = self._lifecycle_locks.setdefault(plugin_name, threading.RLock())
+		return lock
+
+	def _forget_active(self, plugin_name):
+		"""
+		Drop a plugin from the active plugins along with its subscriptions,
+		scheduled tasks, mailbox, buffers and caches
+
+		Doesn't take the lifecycle lock of the plugin, as `stop` calls this
+		for plugins whose hung deactivation still holds it.
+		"""
+		# Stop routing calls to the plugin before releasing what they may use
+		self._update_active(remove=plugin_name)
+		self._release_plugin(plugin_name)
+
+	def _release_plugin(self, plugin_name):
+		"""Drop the subscriptions, tasks, mailbox, buffers and caches of a plugin no longer active"""
+		self._events.unsubscribe(plugin_name)
+		self._scheduler.cancel_plugin(plugin_name)
+		self._close_mailbox(plugin_name, drain=False)
+		self._buffers.release_plugin(plugin_name)
+		self._remove_caches(plugin_name)
+
+	def _install_caches(self, plugin):
+		"""Wrap the methods of plugin decorated with octo.plugin.cached in a MethodCache"""
+		plugin_object = plugin.plugin_object
+		if isinstance(plugin_object, ProcessPluginProxy):
+			plugin_class = plugin_object.plugin_class
+		else:
+			plugin_class = type(plugin_object)
+		caches = {}
+		for name, options in octo.plugin.get_cached_methods(plugin_class):
+			caches[name] = MethodCache(getattr(plugin_object, name), **options)
+			# Shadows the method on this instance, so every caller hits the cache
+			setattr(plugin_object, name, caches[name])
+		if caches:
+			self._caches[plugin.name] = caches
+
+	def _remove_caches(self, plugin_name):
+		"""Drop the caches of a plugin, restoring its original methods"""
+		caches = self._caches.pop(plugin_name, {})
+		plugin = self._plugins.get(plugin_name)
+		for name, cache in caches.items():
+			cache.clear()
+			if plugin is not None and plugin.plugin_object.__dict__.get(name) is cache:
+				delattr(plugin.plugin_object, name)
+
+	def clear_cache(self, plugin_name, func=None):
+		"""
+		Drop the memoized results of func on the given plugin, or of all its
+		methods when func is None
+		"""
+		for name, cache in self._caches.get(plugin_name, {}).items():
+			if func is None or name == func:
+				cache.clear()
+
+	def get_cache_stats(self):
+		"""
+		Return hit, miss, collapsed call and eviction counts and the number of
+		cached results for every memoized method of the active plugins, as a
+		{plugin: {method: stats dictionary}} dictionary
+		"""
+		return dict((plugin_name, dict((name, cache.stats()) for name, cache in caches.items()))
+		            for plugin_name, caches in list(self._caches.items()))
+
+	def subscribe(self, plugin_name, topic, handler):
+		"""
+		Subscribe handler to events published on topic, on behalf of the given plugin
+
+		The subscription is removed automatically when the plugin is
+		deactivated. Plugins may subscribe from their ``on_activation`` as
+		well. Plugin methods may also be subscribed declaratively using the
+		`octo.plugin.subscribe` decorator.
+		"""
+		self._get_registering_plugin(plugin_name)
+		self._events.subscribe(plugin_name, topic, handler)
+
+	def unsubscribe(self, plugin_name, topic=None):
+		"""
+		Remove the subscription of the given plugin to topic
+
+		When topic is None, all of the plugin's subscriptions are removed.
+		"""
+		self._events.unsubscribe(plugin_name, topic)
+
+	def get_subscribers(self, topic):
+		"""Return the names of the plugins subscribed to topic"""
+		return self._events.subscribers(topic)
+
+	def publish(self, topic, args=[], kwargs={}, queued=False):
+		"""
+		Publish an event on topic to all subscribed plugins
+
+		By default, handlers are called on the calling thread and a dictionary
+		of {'plugin name': <handler result>} is returned, like `call_many`
+		does. When ``queued`` is True, the event is queued for delivery on a
+		background thread instead and None is returned.
+		"""
+		if queued:
+			self._events.publish_queued(topic, args, kwargs)
+			return None
+		return self._events.publish(topic, args, kwargs)
+
+	def create_buffer(self, plugin_name, name, size):
+		"""
+		Create a shared buffer of size bytes named name, owned by the given plugin
+
+		Returns a writable memoryview for the plugin to fill. Other plugins
+		can then get a view of the same memory through `acquire_buffer`,
+		without copying. The buffer is removed when the owning plugin is
+		deactivated, or when the plugin created it from an ``on_activation``
+		which failed. See `octo.buffers`.
+		"""
+		self._get_registering_plugin(plugin_name)
+		return self._buffers.create(plugin_name, name, size)
+
+	def publish_buffer(self, plugin_name, name, data):
+		"""Like `create_buffer`, filling the buffer with a copy of data"""
+		self._get_registering_plugin(plugin_name)
+		return self._buffers.publish(plugin_name, name, data)
+
+	def acquire_buffer(self, plugin_name, name, writable=False):
 		"""
-		self.plugin_manager.deactivatePluginByName(plugin_name)
+		Return a memoryview of the shared buffer named name on behalf of the given plugin
+
+		The buffer's memory stays valid until the plugin calls
+		`release_buffer` or is deactivated, even when the owner removes it in
+		the meantime.
+		"""
+		self._get_registering_plugin(plugin_name)
+		return self._buffers.acquire(plugin_name, name, writable)
+
+	def release_buffer(self, plugin_name, name):
+		"""Release the views of the shared buffer named name held by the given plugin"""
+		self._buffers.release(plugin_name, name)
+
+	def remove_buffer(self, plugin_name, name):
+		"""Remove the shared buffer named name, owned by the given plugin"""
+		self._buffers.remove(plugin_name, name)
+
+	def get_buffers(self):
+		"""Return the names of all shared buffers"""
+		return self._buffers.names()
+
+	def schedule(self, plugin_name, func, args=[], kwargs={}, interval=None, cron=None, jitter=0,
+	             overrun='skip', delay=None, name=None):
+		"""
+		Run func (a callable) periodically on behalf of the given, active plugin
+
+		Exactly one of ``interval`` (in seconds) or ``cron`` (a cron
+		expression, see `octo.scheduler`) must be given. The task runs on the
+		shared worker pool of the manager until it is cancelled or the plugin
+		is deactivated. See `octo.scheduler.Scheduler.add` for the other
+		options. Returns the `octo.scheduler.ScheduledTask`.
+
+		Plugins may schedule tasks from their ``on_activation``; the tasks are
+		cancelled again when the activation fails.
+		"""
+		self._get_registering_plugin(plugin_name)
+		return self._scheduler.add(plugin_name, func, args, kwargs, interval=interval, cron=cron, jitter=jitter,
+		                           overrun=overrun, delay=delay, name=name)
+
+	def _subscribe_decorated(self, plugin):
+		"""Subscribe the methods of plugin decorated with octo.plugin.subscribe"""
+		plugin_object = plugin.plugin_object
+		if isinstance(plugin_object, ProcessPluginProxy):
+			plugin_class = plugin_object.plugin_class
+		else:
+			plugin_class = type(plugin_object)
+		for topic, handler in octo.plugin.get_subscriptions(plugin_object, plugin_class):
+			self._events.subscribe(plugin.name, topic, handler)
+
+	def _schedule_periodic(self, plugin):
+		"""Schedule the methods of plugin decorated with octo.plugin.periodic"""
+		plugin_object = plugin.plugin_object
+		if isinstance(plugin_object, ProcessPluginProxy):
+			plugin_class = plugin_object.plugin_class
+		else:
+			plugin_class = type(plugin_object)
+		for name, options in octo.plugin.get_periodic_methods(plugin_class):
+			self._scheduler.add(plugin.name, getattr(plugin_object, name), name=name, **options)
+
+	def cancel_tasks(self, plugin_name):
+		"""Cancel all periodic tasks of the given plugin"""
+		self._scheduler.cancel_plugin(plugin_name)
+
+	def get_tasks(self, plugin_name=None):
+		"""
+		Return a list of the scheduled `octo.scheduler.ScheduledTask` objects,
+		of the given plugin or of all plugins
+		"""
+		return self._scheduler.tasks(plugin_name)
+
+	def send(self, plugin_name, message, timeout=None):
+		"""
+		Send message to the mailbox of the given plugin
+
+		The message is queued and delivered to the plugin's ``on_messages``
+		on a worker thread, in a batch with other messages, see
+		`octo.mailbox`. Returns False when the message was discarded
+		because the mailbox is full (depending on its policy), True
+		otherwise. When the mailbox is full and its policy is 'block', this
+		waits for room, for at most ``timeout`` seconds before raising
+		MailboxFullError.
+
+		Raises NoSuchMailboxError when the plugin doesn't implement
+		``on_messages``.
+		"""
+		return self._get_mailbox(plugin_name).put(message, timeout)
+
+	def send_many(self, plugin_name, messages, timeout=None):
+		"""
+		Like `send`, for a sequence of messages
+
+		Returns the number of messages which were queued.
+		"""
+		return self._get_mailbox(plugin_name).put_many(messages, timeout)
+
+	def flush_mailbox(self, plugin_name, timeout=None):
+		"""
+		Block until the messages sent to the given plugin have been
+		delivered, for at most timeout seconds
+
+		Returns True when its mailbox is empty.
+		"""
+		return self._get_mailbox(plugin_name).flush(timeout)
+
+	def get_mailbox_stats(self):
+		"""
+		Return the queue depth and the received, delivered, dropped and shed
+		message counts of every mailbox, as a {plugin: stats dictionary}
+		dictionary
+		"""
+		return dict((plugin_name, mailbox.stats()) for plugin_name, mailbox in list(self._mailboxes.items()))
+
+	def _get_mailbox(self, plugin_name):
+		"""Return the mailbox of the given plugin or raise NoSuchPluginError or NoSuchMailboxError"""
+		mailbox = self._mailboxes.get(plugin_name)
+		if mailbox is None:
+			self._get_active_plugin(plugin_name)
+			raise octo.exceptions.NoSuchMailboxError("Plugin '{}' doesn't receive messages".format(plugin_name))
+		return mailbox
+
+	def _open_mailbox(self, plugin):
+		"""Create a mailbox for plugin if it implements on_messages"""
+		plugin_object = plugin.plugin_object
+		if isinstance(plugin_object, ProcessPluginProxy):
+			plugin_class = plugin_object.plugin_class
+		else:
+			plugin_class = type(plugin_object)
+		if not octo.plugin.handles_messages(plugin_class):
+			return
+		options = dict(self._mailbox_options)
+		options.update(getattr(plugin_class, 'mailbox_options', None) or {})
+		handler = plugin_object.on_messages
+		if self._metrics is not None:
+			handler = self._measured(plugin.name, 'on_messages', handler)
+		# Don't leave the worker thread of a previous mailbox behind
+		self._close_mailbox(plugin.name)
+		self._mailboxes[plugin.name] = Mailbox(plugin.name, handler, **options)
+
+	def _measured(self, plugin_name, func, method):
+		"""Return a wrapper of method which records its calls in the metrics"""
+		metrics = self._metrics
+
+		def wrapper(*args, **kwargs):
+			started = clock()
+			try:
+				result = method(*args, **kwargs)
+			except Exception:
+				metrics.record(plugin_name, func, clock() - started, error=True)
+				raise
+			metrics.record(plugin_name, func, clock() - started)
+			return result
+		return wrapper
+
+	def _close_mailbox(self, plugin_name, drain=True):
+		"""Close the mailbox of a plugin, delivering outstanding messages when drain is True"""
+		mailbox = self._mailboxes.pop(plugin_name, None)
+		if mailbox is not None:
+			mailbox.close(drain)
 
 	def call(self, plugin_name, func, args=[], kwargs={}):
 		"""
 		Call the given function on the given plugin object (specifed by plugin name)
 		"""
-		for plugin in self.get_plugins().values():
-			if plugin.name == plugin_name:
-				return getattr(plugin.plugin_object, func)(*args, **kwargs)
-		raise octo.exceptions.NoSuchPluginError("The specified plugin isn't active or doesn't exist")
+		plugin = self._get_active_plugin(plugin_name)
+		if self._metrics is None:
+			return getattr(plugin.plugin_object, func)(*args, **kwargs)
+		method = getattr(plugin.plugin_object, func)
+		started = clock()
+		try:
+			result = method(*args, **kwargs)
+		except Exception:
+			self._metrics.record(plugin_name, func, clock() - started, error=True)
+			raise
+		self._metrics.record(plugin_name, func, clock() - started)
+		return result
+
+	def call_batch(self, calls, batched=False):
+		"""
+		Make many calls in one go and return their results as a list
+
+		``calls`` is a sequence of (plugin name, function name, args, kwargs)
+		tuples, where args and kwargs may be omitted. Results are returned in
+		the same order. When a call raises an exception (including
+		`octo.exceptions.NoSuchPluginError` for plugins which aren't active),
+		the exception object is returned as its result.
+
+		Targets are resolved once per distinct (plugin, function) pair, and
+		calls run strictly in the order given. When ``batched`` is True, calls
+		are grouped by that pair instead, and a plugin which has a method named
+		``<function>_batch`` gets the whole group in one call: a list of
+		(args, kwargs) tuples, for which it must return a list of results
+		(which may contain exception objects) in the same order. Each call of
+		the group gets an `octo.exceptions.OctoException` when it returns
+		anything else. Other plugins get one call per item. Grouping means calls to different plugins may
+		run in a different order than given.
+		"""
+		if batched:
+			return self._call_batch_grouped(calls)
+		return self._call_batch_ordered(calls)
+
+	def _resolve(self, plugin_name, func):
+		"""Return the bound method func of the given plugin, or the exception raised looking it up"""
+		try:
+			return getattr(self._get_active_plugin(plugin_name).plugin_object, func)
+		except Exception as e:
+			return e
+
+	def _call_batch_ordered(self, calls):
+		"""Implementation of `call_batch` with batched=False"""
+		metrics = self._metrics
+		results = []
+		methods = {}
+		for call in calls:
+			plugin_name, func = call[0], call[1]
+			try:
+				method = methods[plugin_name, func]
+			except KeyError:
+				method = methods[plugin_name, func] = self._resolve(plugin_name, func)
+			if isinstance(method, Exception):
+				results.append(method)
+				continue
+			length = len(call)
+			args = call[2] if length > 2 else ()
+			kwargs = call[3] if length > 3 else {}
+			if metrics is not None:
+				results.append(self._invoke(plugin_name, func, method, args, kwargs))
+				continue
+			try:
+				results.append(method(*args, **kwargs))
+			except Exception as e:
+				logging.exception("Exception while calling '{}' on '{}'".format(func, plugin_name))
+				results.append(e)
+		return results
+
+	def _call_batch_grouped(self, calls):
+		"""Implementation of `call_batch` with batched=True"""
+		active = self._snapshot.plugins
+		# (plugin name, function name) -> list of (index, args, kwargs)
+		groups = {}
+		for index, call in enumerate(calls):
+			length = len(call)
+			item = (index, call[2] if length > 2 else (), call[3] if length > 3 else {})
+			try:
+				groups[call[0], call[1]].append(item)
+			except KeyError:
+				groups[call[0], call[1]] = [item]
+
+		results = [None] * len(calls)
+		for (plugin_name, func), items in groups.items():
+			plugin = active.get(plugin_name)
+			handler = None if plugin is None else getattr(plugin.plugin_object, func + '_batch', None)
+			if handler is None:
+				method = self._resolve(plugin_name, func)
+				if isinstance(method, Exception):
+					for index, args, kwargs in items:
+						results[index] = method
+				elif self._metrics is None:
+					for index, args, kwargs in items:
+						try:
+							results[index] = method(*args, **kwargs)
+						except Exception as e:
+							logging.exception("Exception while calling '{}' on '{}'".format(func, plugin_name))
+							results[index] = e
+				else:
+					for index, args, kwargs in items:
+						results[index] = self._invoke(plugin_name, func, method, args, kwargs)
+				continue
+
+			batch_results = self._invoke(plugin_name, func + '_batch', handler,
+			                             ([(args, kwargs) for index, args, kwargs in items],), {})
+			if isinstance(batch_results, Exception):
+				batch_results = [batch_results] * len(items)
+			else:
+				# Handlers may return any iterable, or (mistakenly) None
+				try:
+					batch_results = list(batch_results)
+					error = None
+					if len(batch_results) != len(items):
+						error = octo.exceptions.OctoException("'{}_batch' of '{}' returned {} results for {} calls".format(
+							func, plugin_name, len(batch_results), len(items)))
+				except Exception as e:
+					logging.exception("Exception while collecting results of '{}_batch' on '{}'".format(func, plugin_name))
+					error = octo.exceptions.OctoException("'{}_batch' of '{}' didn't return a sequence of results: {}".format(
+						func, plugin_name, e))
+				if error is not None:
+					batch_results = [error] * len(items)
+			for item, result in zip(items, batch_results):
+				results[item[0]] = result
+		return results
+
+	def _invoke(self, plugin_name, func, method, args, kwargs):
+		"""Call method for call_batch, returning exceptions instead of raising them"""
+		if self._metrics is not None:
+			started = clock()
+		try:
+			result = method(*args, **kwargs)
+		except Exception as e:
+			if self._metrics is not None:
+				self._metrics.record(plugin_name, func, clock() - started, error=True)
+			logging.exception("Exception while calling '{}' on '{}'".format(func, plugin_name))
+			return e
+		if self._metrics is not None:
+			self._metrics.record(plugin_name, func, clock() - started)
+		return result
+
+	def get_metrics(self):
+		"""
+		Return the `octo.metrics.Metrics` of this manager
+
+		Returns None unless the manager was created with metrics=True.
+		"""
+		return self._metrics
+
+	def get_stats(self):
+		"""
+		Return call metrics as a dictionary of {plugin name: {method: stats}}
+
+		Stats are dictionaries with call and error counts, total, mean and
+		maximum latency, estimated percentiles and the non-empty histogram
+		buckets. Returns None unless the manager was created with metrics=True.
+		"""
+		if self._metrics is None:
+			return None
+		return self._metrics.as_dict()
+
+	def acall(self, plugin_name, func, args=[], kwargs={}, timeout=None):
+		"""
+		Coroutine version of `call`
+
+		When the called function returns an awaitable, it is awaited. If it
+		takes longer than ``timeout`` seconds, it is cancelled and
+		`octo.exceptions.PluginTimeoutError` is raised.
+		"""
+		import octo._aio
+		return octo._aio.acall(self, plugin_name, func, args, kwargs, timeout)
+
+	def acall_many(self, func, args=[], kwargs={}, timeout=None):
+		"""
+		Coroutine version of `call_many`
 
-	def call_many(self, func, args=[], kwargs={}):
+		Awaitable results are awaited concurrently, similar to asyncio.gather.
+		Exceptions are returned as results like with `call_many`, and calls
+		taking longer than ``timeout`` seconds are cancelled and get an
+		instance of `octo.exceptions.PluginTimeoutError` as their result.
+		"""
+		import octo._aio
+		return octo._aio.acall_many(self, func, args, kwargs, timeout)
+
+	def aiter_call_many(self, func, args=[], kwargs={}, timeout=None):
+		"""
+		Asynchronous iterator version of `acall_many`
+
+		Yields (plugin name, result) tuples as soon as each plugin's call
+		completes. Calls which are still running are cancelled when iteration
+		stops early.
+		"""
+		import octo._aio
+		return octo._aio.aiter_call_many(self, func, args, kwargs, timeout)
+
+	def call_many(self, func, args=[], kwargs={}, concurrent=False, timeout=None, deadline=None):
 		"""
 		Call the given function on all active plugins and return results as a dictionary
 
 		The returned dictionary will have the form of {'plugin name': <function_result>}
+		When a call raises an exception, the exception object is returned as
+		that plugin's result.
+
+		When ``concurrent`` is True, the calls are run on the manager's executor
+		instead of one after another on the calling thread. ``timeout`` then
+		limits how long (in seconds) each individual call may run, and
+		``deadline`` limits how long the broadcast as a whole may take.
+		Plugins which do not finish in time get an instance of
+		`octo.exceptions.PluginTimeoutError` as their result. Note that calls
+		which are already running cannot be interrupted; they are merely no
+		longer waited for.
 		"""
-		results = {}
-		for plugin in self.get_plugins().values():
+		return dict(self.iter_call_many(func, args, kwargs, concurrent, timeout, deadline))
+
+	def iter_call_many(self, func, args=[], kwargs={}, concurrent=False, timeout=None, deadline=None):
+		"""
+		Generator version of `call_many`
+
+		Yields (plugin name, result) tuples as soon as each plugin's call
+		completes, so callers can start processing early results while slower
+		plugins are still running. Arguments and results are the same as with
+		`call_many`. In concurrent mode, calls which haven't started yet are
+		cancelled when the generator is closed before it is exhausted.
+		"""
+		implementers = self._get_implementers(func)
+		if concurrent:
+			return self._iter_call_many_concurrent(func, implementers, args, kwargs, timeout, deadline)
+		return self._iter_call_many_sequential(func, implementers, args, kwargs)
+
+	def _iter_call_many_sequential(self, func, implementers, args, kwargs):
+		"""Sequential implementation of `iter_call_many`"""
+		metrics = self._metrics
+		for name, method in implementers:
+			if metrics is not None:
+				started = clock()
 			try:
-				logging.debug("Calling {} on plugin '{}'".format(func, plugin.name))
-				results[plugin.name] = getattr(plugin.plugin_object, func)(*args, **kwargs)
-			except AttributeError as e:
-				logging.debug("'{}' has no attribute {}".format(plugin.name, func))
+				logging.debug("Calling {} on plugin '{}'".format(func, name))
+				result = method(*args, **kwargs)
 			except Exception as e:
-				logging.exception("Exception while calling '{}' on '{}'".format(func, plugin.name))
-				results[plugin.name] = e
-		return results
+				if metrics is not None:
+					metrics.record(name, func, clock() - started, error=True)
+				logging.exception("Exception while calling '{}' on '{}'".format(func, name))
+				result = e
+			else:
+				if metrics is not None:
+					metrics.record(name, func, clock() - started)
+			yield name, result
 
-	def start(self):
+	def _get_active_plugin(self, plugin_name):
+		"""Return the active plugin with the given name or raise NoSuchPluginError"""
+		try:
+			return self._snapshot.plugins[plugin_name]
+		except KeyError:
+			raise octo.exceptions.NoSuchPluginError("The specified plugin isn't active or doesn't exist")
+
+	def _get_implementers(self, func):
+		"""
+		Return a list of (plugin name, bound method) tuples for all active
+		plugins which have an attribute named ``func``.
+
+		Results are cached in the dispatch table of the current snapshot of
+		active plugins.
+		"""
+		snapshot = self._snapshot
+		try:
+			return snapshot.dispatch[func]
+		except KeyError:
+			pass
+		implementers = []
+		for plugin in snapshot.plugins.values():
+			method = getattr(plugin.plugin_object, func, None)
+			if method is None:
+				logging.debug("'{}' has no attribute {}".format(plugin.name, func))
+			else:
+				implementers.append((plugin.name, method))
+		snapshot.dispatch[func] = implementers
+		return implementers
+
+	def _get_executor(self):
+		"""Return the executor for concurrent calls, creating it if needed"""
+		if self._executor is None:
+			self._executor = ThreadPoolExecutor(max_workers=self._max_workers)
+			self._owns_executor = True
+		return self._executor
+
+	def _iter_call_many_concurrent(self, func, implementers, args, kwargs, timeout, deadline):
+		"""Concurrent implementation of `iter_call_many`"""
+		executor = self._get_executor()
+		started = {}
+		submitted = time.time()
+		futures = {}
+		for name, method in implementers:
+			logging.debug("Submitting {} on plugin '{}'".format(func, name))
+			futures[executor.submit(_timed_call, started, name, method, args, kwargs)] = name
+
+		end = None if deadline is None else submitted + deadline
+		pending = set(futures)
+		try:
+			for item in self._collect_results(func, futures, pending, started, submitted, timeout, end):
+				yield item
+		finally:
+			# Reached early when the consumer stops iterating
+			for future in pending:
+				future.cancel()
+
+	def _collect_results(self, func, futures, pending, started, submitted, timeout, end):
+		"""
+		Yield (plugin name, result) tuples of futures as they complete
+
+		Completed and expired futures are removed from ``pending``.
+		"""
+		while pending:
+			now = time.time()
+			expired = set()
+			wait_for = None
+			for future in pending:
+				if future.done():
+					continue
+				expiry = end
+				if timeout is not None:
+					# Calls which haven't been picked up by a worker yet are
+					# measured from submission so a saturated pool can't stall
+					# the broadcast indefinitely.
+					plugin_expiry = started.get(futures[future], submitted) + timeout
+					expiry = plugin_expiry if expiry is None else min(expiry, plugin_expiry)
+				if expiry is None:
+					continue
+				if expiry <= now:
+					expired.add(future)
+				elif wait_for is None or expiry - now < wait_for:
+					wait_for = expiry - now
+
+			pending -= expired
+			for future in expired:
+				future.cancel()
+				name = futures[future]
+				if self._metrics is not None:
+					self._metrics.record(name, func, now - started.get(name, submitted), error=True)
+				logging.warning("Timeout while calling '{}' on '{}'".format(func, name))
+				yield name, octo.exceptions.PluginTimeoutError(
+					"Call to '{}' on '{}' did not complete in time".format(func, name))
+			if not pending:
+				break
+
+			done = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)[0]
+			pending -= done
+			for future in done:
+				name = futures[future]
+				try:
+					result = future.result()
+				except Exception as e:
+					logging.exception("Exception while calling '{}' on '{}'".format(func, name))
+					result = e
+				if self._metrics is not None:
+					self._metrics.record(name, func, time.time() - started.get(name, submitted),
+					                     error=isinstance(result, Exception))
+				yield name, result
+
+	def start(self, parallel=True, worker=None):
 		"""Start and activate collected plugins
 
 		A plugin will be activated when it has a config item 'Enable'
-		under the section 'Config' with a value of True"""
+		under the section 'Config' with a value of True
+
+		``worker`` is the number of the worker process this manager runs in
+		(see `octo.prefork`). Plugins may then be limited to some workers by
+		listing their numbers (comma-separated) in a config item 'Workers'
+		under the section 'Core'; they aren't activated in other workers.
+
+		Plugins may list the names of other plugins they depend on in a
+		comma-separated config item 'Requires' under the section 'Core'.
+		Plugins are activated in waves, each wave containing the plugins whose
+		requirements were activated in earlier waves. When ``parallel`` is
+		True, the plugins within a wave are activated concurrently on a pool
+		of threads of their own.
+
+		Raises `octo.exceptions.DependencyError` before activating anything when
+		a requirement is missing or not enabled, or requirements form a cycle."""
 		logging.debug("Activating plugins")
-		for plugin in self.get_plugins(include_inactive=True).values():
-			try:
-				should_activate = plugin.details.getboolean('Config', 'Enable')
-			except configparser.NoSectionError:
-				should_activate = False
-			if should_activate:
-				logging.debug("Activating plugin {}".format(plugin.name))
-				self.activate_plugin(plugin.name)
-			else:
+		self._worker = worker
+		enabled = []
+		for plugin in self._plugins.values():
+			if not self._is_enabled(plugin):
 				logging.debug("Plugin {} not activated because config item Enable "
 							  "is not True".format(plugin.name))
+			elif worker is not None and not self._runs_in_worker(plugin, worker):
+				logging.debug("Plugin {} not activated because it doesn't run in "
+				              "worker {}".format(plugin.name, worker))
+			else:
+				enabled.append(plugin.name)
+
+		# Activation needs the manager itself, so it can't go through a
+		# (possibly process based) executor passed by the application
+		activator = None
+		try:
+			for wave in self._activation_waves(enabled):
+				try:
+					if parallel and len(wave) > 1:
+						if activator is None:
+							activator = ThreadPoolExecutor(max_workers=self._max_workers or 32)
+						futures = []
+						for name in wave:
+							logging.debug("Activating plugin {}".format(name))
+							futures.append(activator.submit(self._activate_plugin, name, False))
+						wait(futures)
+						for future in futures:
+							# Re-raises any exception raised during activation
+							future.result()
+					else:
+						for name in wave:
+							logging.debug("Activating plugin {}".format(name))
+							self._activate_plugin(name, False)
+				finally:
+					# A single snapshot for the whole wave, rather than a copy
+					# of all active plugins per plugin
+					self._publish_pending()
+		finally:
+			if activator is not None:
+				activator.shutdown()
 		logging.debug("Plugin activation done")
+		if self._profile is not None:
+			logging.info("Startup profile:\n{}".format(self._profile.format_table()))
+			if self._profile_file is not None:
+				self._profile.write_json(self._profile_file)
 		return self
 
-	def stop(self):
-		"""Stop and deactivate loaded plugins"""
+	def _is_enabled(self, plugin):
+		"""Return whether the Config.Enable item of plugin is True"""
+		settings = getattr(plugin, 'settings', None)
+		if settings is not None:
+			return settings.enable
+		# Not loaded yet (lazy mode), so only compile the Enable item
+		return compile_config({'enable': BASE_SCHEMA['enable']}, get_config(plugin), plugin.name).enable
+
+	def _runs_in_worker(self, plugin, worker):
+		"""Return whether worker is listed under Core.Workers for plugin, or nothing is"""
+		try:
+			workers = get_config(plugin).get('Core', 'Workers')
+		except (configparser.NoSectionError, configparser.NoOptionError):
+			return True
+		try:
+			return worker in [int(number) for number in workers.split(',') if number.strip()]
+		except ValueError:
+			raise octo.exceptions.InvalidConfigError(
+				"Invalid configuration for plugin '{}': Core.Workers is invalid: {!r}".format(plugin.name, workers))
+
+	def get_worker(self):
+		"""Return the number of the worker process given to `start`, or None"""
+		return self._worker
+
+	def get_sockets(self):
+		"""Return a {address: socket} dictionary of the listening sockets given to the manager"""
+		return dict(self._sockets)
+
+	def _get_requirements(self, plugin):
+		"""Return the names of the plugins listed under Core.Requires for plugin"""
+		try:
+			requires = get_config(plugin).get('Core', 'Requires')
+		except (configparser.NoSectionError, configparser.NoOptionError):
+			return []
+		return [name.strip() for name in requires.split(',') if name.strip()]
+
+	def _activation_waves(self, plugin_names):
+		"""
+		Group the given plugins into waves in topological order of their requirements
+
+		Returns a list of lists of plugin names. Plugins in a wave only require
+		plugins from earlier waves or plugins which are already active.
+		"""
+		active = self._snapshot.plugins
+		available = set(plugin_names).union(active)
+		remaining = {}
+		for name in plugin_names:
+			requires = set(self._get_requirements(self._plugins[name]))
+			missing = requires - available
+			if missing:
+				raise octo.exceptions.DependencyError(
+					"Plugin '{}' requires {} which cannot be found or is not enabled".format(
+						name, ", ".join(repr(m) for m in sorted(missing))))
+			remaining[name] = requires - set(active)
+
+		waves = []
+		done = set()
+		while remaining:
+			wave = sorted(name for name, requires in remaining.items() if requires <= done)
+			if not wave:
+				raise octo.exceptions.DependencyError(
+					"Dependency cycle between plugins {}".format(
+						", ".join(repr(name) for name in sorted(remaining))))
+			for name in wave:
+				del remaining[name]
+			done.update(wave)
+			waves.append(wave)
+		return waves
+
+	def stop(self, timeout=None, plugin_timeout=None, parallel=True):
+		"""
+		Stop and deactivate loaded plugins
+
+		Plugins are deactivated in waves, in reverse order of their
+		requirements: a plugin is only deactivated once all plugins requiring
+		it have been. When ``parallel`` is True, the plugins within a wave are
+		deactivated concurrently.
+
+		``plugin_timeout`` limits how long (in seconds) a single plugin's
+		deactivation may take, and ``timeout`` how long the shutdown as a
+		whole may take. They default to the ``plugin_shutdown_timeout`` and
+		``shutdown_timeout`` the manager was created with. Plugins which
+		don't finish in time, or aren't reached in time, are abandoned: they
+		are dropped from the active plugins without waiting for their
+		deactivation to complete. Exceptions raised while deactivating a
+		plugin are logged, and don't stop the shutdown.
+
+		See `get_shutdown_report` for the plugins which were abandoned or
+		failed to deactivate.
+
+		When a loop was set through `octo.plugin.set_hook_loop` (as `run`
+		does with event_loop=True) and it isn't running, it is run while
+		plugins are deactivated, so their coroutine hooks run on it. When
+		`stop` is called from that loop itself, plugins are deactivated one
+		at a time on the calling thread instead, without ``plugin_timeout``,
+		and their coroutine hooks are scheduled as tasks on the loop.
+		"""
+		loop = octo.plugin.get_hook_loop()
+		if loop is not None and not loop.is_closed():
+			if not loop.is_running():
+				return loop.run_until_complete(
+					loop.run_in_executor(None, self._stop, timeout, plugin_timeout, parallel))
+			if octo.plugin.get_running_loop() is loop:
+				# Hooks deactivated on other threads would wait for this
+				# thread's loop, which is blocked on them
+				return self._stop(timeout, plugin_timeout, parallel, inline=True)
+		return self._stop(timeout, plugin_timeout, parallel)
+
+	def _stop(self, timeout, plugin_timeout, parallel, inline=False):
+		"""Body of `stop`, deactivating every plugin on this thread when inline is True"""
+		if timeout is None:
+			timeout = self._shutdown_timeout
+		if plugin_timeout is None:
+			plugin_timeout = self._plugin_shutdown_timeout
+		end = None if timeout is None else time.time() + timeout
+		self._shutdown_report = {'abandoned': [], 'errors': {}}
+
 		logging.debug("Deactivating plugins")
-		for plugin in self.get_plugins().values():
-			logging.debug("Deactivating plugin {}".format(plugin.name))
-			self.deactivate_plugin(plugin.name)
+		if self._watch_thread is not None:
+			self._watch_stop.set()
+			self._watch_thread.join()
+			self._watch_thread = None
+		# Deliver queued events while their subscribers are still active
+		self._events.close()
+		for wave in self._deactivation_waves(list(self._snapshot.plugins)):
+			if end is not None and time.time() >= end:
+				abandoned = wave
+			elif inline or (plugin_timeout is None and end is None and not (parallel and len(wave) > 1)):
+				abandoned = []
+				for name in wave:
+					self._deactivate_for_shutdown(name)
+			else:
+				abandoned = self._deactivate_wave(wave, parallel, plugin_timeout, end)
+			# A single snapshot for the whole wave, as in start
+			for name in self._publish_pending():
+				self._release_plugin(name)
+			for name in abandoned:
+				logging.warning("Abandoning deactivation of plugin {}".format(name))
+				self._forget_active(name)
+			self._shutdown_report['abandoned'].extend(abandoned)
+		if self._shutdown_report['abandoned']:
+			logging.warning("Plugins abandoned during shutdown: {}".format(
+				", ".join(sorted(self._shutdown_report['abandoned']))))
+		self._scheduler.close()
+		self._buffers.close()
+		if self._owns_executor:
+			self._executor.shutdown(wait=False)
+			self._executor = None
+			self._owns_executor = False
 		logging.debug("Plugin deactivation done")
 		return self
 
+	def get_shutdown_report(self):
+		"""
+		Return a report of the last `stop`
+
+		The report is a dictionary with the names of the plugins which were
+		abandoned under 'abandoned' and a {plugin name: exception} dictionary
+		of plugins which failed to deactivate under 'errors'. Returns None when
+		the manager hasn't been stopped.
+		"""
+		return self._shutdown_report
+
+	def _deactivate_for_shutdown(self, plugin_name):
+		"""Deactivate a plugin, logging and reporting exceptions instead of raising them"""
+		logging.debug("Deactivating plugin {}".format(plugin_name))
+		try:
+			self._deactivate_plugin(plugin_name, publish=False)
+		except Exception as e:
+			logging.exception("Exception while deactivating plugin {}".format(plugin_name))
+			self._shutdown_report['errors'][plugin_name] = e
+			with self._lifecycle_lock(plugin_name):
+				self._forget_active(plugin_name)
+
+	def _deactivation_waves(self, plugin_names):
+		"""
+		Group the given active plugins into waves in reverse order of their requirements
+
+		Returns a list of lists of plugin names. Plugins in a wave are not
+		required by any plugin in the same or a later wave.
+		"""
+		active = self._snapshot.plugins
+		remaining = set(plugin_names)
+		required_by = dict((name, set()) for name in remaining)
+		for name in remaining:
+			for requirement in self._get_requirements(active[name]):
+				if requirement in required_by:
+					required_by[requirement].add(name)
+		waves = []
+		while remaining:
+			wave = sorted(name for name in remaining if not required_by[name] & remaining)
+			if not wave:
+				# Only possible when requirements changed after activation
+				wave = sorted(remaining)
+			remaining.difference_update(wave)
+			waves.append(wave)
+		return waves
+
+	def _deactivate_wave(self, wave, parallel, plugin_timeout, end):
+		"""
+		Deactivate the plugins of a wave on daemon threads, so hung plugins
+		can't keep the process from exiting
+
+		Returns the names of the plugins which didn't finish in time.
+		"""
+		pending = deque(wave)
+		started = {}
+		finished = set()
+		condition = threading.Condition()
+
+		def worker():
+			while True:
+				with condition:
+					if not pending:
+						return
+					name = pending.popleft()
+					started[name] = time.time()
+				self._deactivate_for_shutdown(name)
+				with condition:
+					finished.add(name)
+					condition.notify()
+
+		def start_worker():
+			thread = threading.Thread(target=worker, name="octo-shutdown")
+			thread.daemon = True
+			thread.start()
+
+		workers = min(len(wave), self._max_workers or 32) if parallel else 1
+		for i in range(workers):
+			start_worker()
+
+		abandoned = []
+		with condition:
+			while len(finished) + len(abandoned) < len(wave):
+				now = time.time()
+				wait_for = None
+				for name in wave:
+					if name in finished or name in abandoned:
+						continue
+					expiry = end
+					if plugin_timeout is not None and name in started:
+						plugin_expiry = started[name] + plugin_timeout
+						expiry = plugin_expiry if expiry is None else min(expiry, plugin_expiry)
+					if expiry is None:
+						continue
+					if expiry <= now:
+						abandoned.append(name)
+						if name in pending:
+							pending.remove(name)
+						elif pending:
+							# Its worker is stuck, so start another one for
+							# the plugins still waiting
+							start_worker()
+					elif wait_for is None or expiry - now < wait_for:
+						wait_for = expiry - now
+				if len(finished) + len(abandoned) < len(wave):
+					condition.wait(wait_for)
+		return abandoned
@@ -0,0 +1,136 @@
+"""
+Low-overhead call metrics.
+
+`Metrics` keeps call counts, error counts and a fixed-bucket latency histogram
+per (plugin, method) pair. Buckets are allocated once per pair, so recording a
+call doesn't allocate anything. Each thread records into its own set of
+counters, which are only merged when stats are read, so recording doesn't need
+to take a lock either.
+"""
+
+import threading
+from bisect import bisect_left
+try:
+	from time import perf_counter as clock
+except ImportError:
+	from time import time as clock  # Python 2
+
+# Upper bounds (in seconds) of the histogram buckets: 1us, 2us, 4us, ... ~67s.
+# Calls slower than the last bound are counted in an extra overflow bucket.
+BUCKET_BOUNDS = tuple(0.000001 * 2 ** i for i in range(27))
+
+
+class CallStats(object):
+	"""Counters and latency histogram for a single (plugin, method) pair"""
+
+	__slots__ = ('calls', 'errors', 'total_time', 'max_time', 'buckets')
+
+	def __init__(self):
+		self.calls = 0
+		self.errors = 0
+		self.total_time = 0.0
+		self.max_time = 0.0
+		self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+
+	def percentile(self, fraction):
+		"""
+		Return an estimate of the given percentile (0.0 - 1.0) of latencies
+
+		The estimate is the upper bound of the bucket the percentile falls in.
+		"""
+		if self.calls == 0:
+			return None
+		threshold = fraction * self.calls
+		seen = 0
+		for index, count in enumerate(self.buckets):
+			seen += count
+			if seen >= threshold and count:
+				if index < len(BUCKET_BOUNDS):
+					return BUCKET_BOUNDS[index]
+				return self.max_time
+		return self.max_time
+
+	def merge(self, other):
+		"""Add the counters of another CallStats object to this one"""
+		self.calls += other.calls
+		self.errors += other.errors
+		self.total_time += other.total_time
+		self.max_time = max(self.max_time, other.max_time)
+		self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+	def as_dict(self):
+		"""Return these stats as a JSON-serializable dictionary"""
+		return {
+			'calls': self.calls,
+			'errors': self.errors,
+			'total_time': self.total_time,
+			'mean_time': self.total_time / self.calls if self.calls else None,
+			'max_time': self.max_time,
+			'p50': self.percentile(0.5),
+			'p90': self.percentile(0.9),
+			'p99': self.percentile(0.99),
+			'buckets': [[bound, count] for bound, count in zip(BUCKET_BOUNDS + (None,), self.buckets) if count],
+		}
+
+
+class Metrics(object):
+	"""Registry of `CallStats` by plugin name and method name"""
+
+	def __init__(self):
+		self._local = threading.local()
+		self._shards = []
+		self._shards_lock = threading.Lock()
+
+	def _get_call_stats(self, plugin_name, func):
+		"""Return the current thread's CallStats for the given pair, creating it if needed"""
+		try:
+			shard = self._local.stats
+		except AttributeError:
+			shard = self._local.stats = {}
+			with self._shards_lock:
+				self._shards.append(shard)
+		return shard.setdefault(plugin_name, {}).setdefault(func, CallStats())
+
+	def record(self, plugin_name, func, elapsed, error=False):
+		"""Record a call of func on plugin_name which took elapsed seconds"""
+		try:
+			stats = self._local.stats[plugin_name][func]
+		except (AttributeError, KeyError):
+			stats = self._get_call_stats(plugin_name, func)
+		stats.calls += 1
+		if error:
+			stats.errors += 1
+		stats.total_time += elapsed
+		if elapsed > stats.max_time:
+			stats.max_time = elapsed
+		stats.buckets[bisect_left(BUCKET_BOUNDS, elapsed)] += 1
+
+	def merged(self):
+		"""Return the stats of all threads merged as a {plugin: {method: CallStats}} dictionary"""
+		with self._shards_lock:
+			shards = list(self._shards)
+		merged = {}
+		for shard in shards:
+			for plugin_name, methods in list(shard.items()):
+				for func, stats in list(methods.items()):
+					merged.setdefault(plugin_name, {}).setdefault(func, CallStats()).merge(stats)
+		return merged
+
+	def as_dict(self):
+		"""Return all stats as a {plugin: {method: stats dictionary}} dictionary"""
+		return dict((plugin_name, dict((func, stats.as_dict()) for func, stats in methods.items()))
+		            for plugin_name, methods in self.merged().items())
+
+	def format_table(self):
+		"""Return all stats as a human-readable table"""
+		rows = [("PLUGIN", "METHOD", "CALLS", "ERRORS", "MEAN (ms)", "P50 (ms)", "P99 (ms)", "MAX (ms)")]
+		stats = self.as_dict()
+		for plugin_name in sorted(stats):
+			for func in sorted(stats[plugin_name]):
+				s = stats[plugin_name][func]
+				rows.append((plugin_name, func, str(s['calls']), str(s['errors'])) +
+				            tuple("{:.3f}".format(s[key] * 1000) for key in ('mean_time', 'p50', 'p99', 'max_time')))
+		widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+		return "\n".join("  ".join([row[0].ljust(widths[0]), row[1].ljust(widths[1])] +
+		                           [value.rjust(width) for value, width in zip(row[2:], widths[2:])])
+		                 for row in rows)
@@ -1,12 +1,220 @@
+import inspect
 from yapsy.IPlugin import IPlugin
+try:
+	import asyncio
+except ImportError:
+	asyncio = None  # Python 2
+
+
+def get_event_loop():
+	"""
+	Return the asyncio event loop of the current thread
+
+	A new loop is created and set as the current loop when none is set yet or
+	the current one has been closed.
+	"""
+	try:
+		loop = asyncio.get_event_loop_policy().get_event_loop()
+	except RuntimeError:
+		loop = None
+	if loop is None or loop.is_closed():
+		loop = asyncio.new_event_loop()
+		asyncio.set_event_loop(loop)
+	return loop
+
+
+def get_running_loop():
+	"""Return the asyncio event loop running in the current thread, or None"""
+	if asyncio is None:
+		return None
+	try:
+		return asyncio.get_running_loop()
+	except RuntimeError:
+		return None
+
+
+# Loop set through `set_hook_loop`
+_hook_loop = None
+
+
+def set_hook_loop(loop):
+	"""
+	Run coroutine lifecycle hooks on loop, also when they're called from
+	another thread
+
+	`octo.manager.run` sets this to the application's loop when running with
+	event_loop=True, so hooks of plugins deactivated on shutdown threads run
+	on the same loop their plugins were activated on. Pass None to unset.
+	"""
+	global _hook_loop
+	_hook_loop = loop
+
+
+def get_hook_loop():
+	"""Return the loop set through `set_hook_loop`, or None"""
+	return _hook_loop
+
+
+def _complete_hook(result):
+	"""
+	Drive an awaitable returned by a lifecycle hook to completion
+
+	Lifecycle hooks may be coroutines. When called from outside a running
+	event loop, they are run to completion on the loop set through
+	`set_hook_loop`, waiting for it when it is running on another thread, or
+	else on the current thread's loop. From within a running loop blocking
+	isn't possible, so the coroutine is scheduled as a task on that loop
+	instead.
+	"""
+	if asyncio is None or not inspect.isawaitable(result):
+		return
+	running = get_running_loop()
+	if running is not None:
+		running.create_task(result)
+		return
+	loop = _hook_loop
+	if loop is None or loop.is_closed():
+		loop = get_event_loop()
+	if loop.is_running():
+		import octo._aio
+		asyncio.run_coroutine_threadsafe(octo._aio.await_result(result), loop).result()
+	else:
+		loop.run_until_complete(result)
+
+
+def subscribe(*topics):
+	"""
+	Decorator which subscribes a plugin method to the given event topics
+
+	The method is subscribed when the plugin is activated and unsubscribed
+	when it is deactivated. See `octo.manager.Manager.publish`.
+	"""
+	def decorator(func):
+		func.octo_topics = getattr(func, 'octo_topics', ()) + topics
+		return func
+	return decorator
+
+
+def get_subscriptions(plugin_object, plugin_class=None):
+	"""
+	Return a list of (topic, bound method) tuples for the methods of
+	plugin_object decorated with `subscribe`
+
+	The decorated methods are looked up on plugin_class, which defaults to
+	the class of plugin_object. Pass it for objects standing in for a plugin,
+	such as `octo.isolation.ProcessPluginProxy`, whose methods forward to it.
+	"""
+	if plugin_class is None:
+		plugin_class = type(plugin_object)
+	subscriptions = []
+	for name in dir(plugin_class):
+		topics = getattr(getattr(plugin_class, name, None), 'octo_topics', None)
+		if isinstance(topics, tuple):
+			method = getattr(plugin_object, name)
+			subscriptions.extend((topic, method) for topic in topics)
+	return subscriptions
+
+
+def cached(maxsize=128, ttl=None, key=None):
+	"""
+	Decorator which lets the manager memoize the results of a plugin method
+
+	At most ``maxsize`` results are kept (None for no limit), for at most
+	``ttl`` seconds (None for no expiry). ``key`` may be given to compute
+	the cache key from the method's arguments. See `octo.cache.MethodCache`.
+	The cache is dropped when the plugin is deactivated or reloaded.
+	"""
+	def decorator(func):
+		func.octo_cache = {'maxsize': maxsize, 'ttl': ttl, 'key': key}
+		return func
+	return decorator
+
+
+def get_cached_methods(plugin_class):
+	"""
+	Return a list of (method name, cache options) tuples for the methods of
+	plugin_class decorated with `cached`
+	"""
+	methods = []
+	for name in dir(plugin_class):
+		options = getattr(getattr(plugin_class, name, None), 'octo_cache', None)
+		if isinstance(options, dict):
+			methods.append((name, options))
+	return methods
+
+
+def periodic(interval=None, cron=None, jitter=0, overrun='skip', delay=None):
+	"""
+	Decorator which lets the manager run a plugin method periodically
+
+	The method is called without arguments every ``interval`` seconds or
+	at the times matched by the ``cron`` expression, from when the plugin
+	is activated until it is deactivated. See `octo.scheduler.Scheduler.add`
+	for the other options.
+	"""
+	def decorator(func):
+		func.octo_schedule = {'interval': interval, 'cron': cron, 'jitter': jitter,
+		                      'overrun': overrun, 'delay': delay}
+		return func
+	return decorator
+
+
+def get_periodic_methods(plugin_class):
+	"""
+	Return a list of (method name, schedule options) tuples for the methods
+	of plugin_class decorated with `periodic`
+	"""
+	methods = []
+	for name in dir(plugin_class):
+		options = getattr(getattr(plugin_class, name, None), 'octo_schedule', None)
+		if isinstance(options, dict):
+			methods.append((name, options))
+	return methods
+
+
+def handles_messages(plugin_class):
+	"""Return whether plugin_class implements `OctoPlugin.on_messages`"""
+	handler = getattr(plugin_class, 'on_messages', None)
+	if handler is None:
+		return False
+	# Unbound methods wrap the function on Python 2
+	default = OctoPlugin.on_messages
+	return getattr(handler, '__func__', handler) is not getattr(default, '__func__', default)
 
 
 class OctoPlugin(IPlugin):
+	# Optional dictionary of attribute names and `octo.config.Option` objects
+	# describing the plugin's configuration, which is compiled into
+	# self.plugin_settings when the plugin is loaded
+	config_schema = None
+
+	# Optional dictionary of options for the mailbox of plugins implementing
+	# on_messages, see `octo.mailbox.Mailbox`
+	mailbox_options = None
+
 	def __init__(self):
 		self.plugin_object = None
 		self.plugin_config = None
+		self.plugin_settings = None
 		super(OctoPlugin, self).__init__()
 
+	@property
+	def plugin_config(self):
+		"""
+		The ConfigParser with the contents of the plugin's info file
+
+		Unless set explicitly, this is the ``details`` of plugin_object,
+		which is only built when first used.
+		"""
+		config = getattr(self, '_plugin_config', None)
+		if config is None and getattr(self, 'plugin_object', None) is not None:
+			config = self._plugin_config = self.plugin_object.details
+		return config
+
+	@plugin_config.setter
+	def plugin_config(self, config):
+		self._plugin_config = config
+
 	def activate(self):
 		"""
 		Run plugin initialization code.
@@ -15,7 +223,7 @@ class OctoPlugin(IPlugin):
 		method instead.
 		"""
 		super(OctoPlugin, self).activate()
-		self.on_activation()
+		_complete_hook(self.on_activation())
 
 	def deactivate(self):
 		"""
@@ -24,14 +232,15 @@ class OctoPlugin(IPlugin):
 		Do not override this method in plugins. Instead, override the on_deactivation
 		method instead.
 		"""
-		self.on_deactivation()
+		_complete_hook(self.on_deactivation())
 		super(OctoPlugin, self).deactivate()
 
 	def on_activation(self):
 		"""
 		Override this method to run code on plugin activation.
 
-		This method may be safely overridden without calling Super.
+		This method may be safely overridden without calling Super. It may
+		also be defined as a coroutine (async def).
 		"""
 		pass
 
@@ -39,6 +248,18 @@ class OctoPlugin(IPlugin):
 		"""
 		Override this method to run code on plugin deactivation.
 
-		This method may be safely overridden without calling Super.
+		This method may be safely overridden without calling Super. It may
+		also be defined as a coroutine (async def).
+		"""
+		pass
+
+	def on_messages(self, batch):
+		"""
+		Override this method to receive messages sent to this plugin.
+
+		Plugins which override it get a mailbox while they are active, and
+		this method is called with a list of messages sent through
+		`octo.manager.Manager.send`, in the order they were sent. It's
+		called from a single thread per plugin, so batches never overlap.
 		"""
 		pass
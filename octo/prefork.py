@@ -0,0 +1,433 @@
+"""
+Prefork multi-process mode.
+
+A `Supervisor` discovers plugins once, then forks a number of worker
+processes which each activate them (see `octo.manager.Manager.start`).
+Unless the manager is lazy, plugin modules are imported before forking, so
+workers share their memory until they modify it. With ``lazy=True`` every
+worker imports them itself instead, so restarted workers pick up changes to
+plugin code.
+
+Listening sockets are bound by the supervisor before forking and are
+available to the plugins in every worker through
+`octo.manager.Manager.get_sockets`, so incoming connections are spread over
+the workers by the kernel. Plugins can be limited to some of the workers
+with the ``Workers`` item under ``Core`` in their info file, for example
+``Workers = 0`` for a plugin which must only run once.
+
+Workers which die are restarted after a delay which doubles with every
+crash in a row, from ``backoff`` up to ``max_backoff`` seconds. A worker
+which ran for at least `STABLE_AFTER` seconds starts a new row.
+
+The supervisor stops the workers and exits upon SIGINT or SIGTERM. SIGHUP
+makes it restart the workers one at a time: a replacement worker is started
+first, and the worker it replaces is only stopped once the replacement has
+activated its plugins. SIGUSR1 is passed on to the workers, which log their
+call metrics.
+
+Requires ``os.fork``, so this isn't available on Windows.
+"""
+
+import errno
+import logging
+import os
+import select
+import signal
+import socket
+import stat
+import threading
+import time
+import octo
+import octo.manager
+import octo.plugin
+try:
+	import asyncio
+except ImportError:
+	asyncio = None  # Python 2
+
+# Workers which ran at least this many seconds before dying are restarted
+# without further delay than the initial backoff
+STABLE_AFTER = 10.0
+
+# Seconds a worker is given to stop on top of the manager's shutdown
+# timeout, before it's killed
+KILL_GRACE = 5.0
+
+# Seconds between checks for exited workers and pending restarts
+POLL_INTERVAL = 0.1
+
+# Signals which are blocked while forking, so a worker can't receive them
+# before it is ready to handle them
+WORKER_SIGNALS = set([signal.SIGTERM] + ([signal.SIGUSR1] if hasattr(signal, 'SIGUSR1') else []))
+
+
+def bind_socket(address, backlog=128):
+	"""
+	Return a listening socket bound to address
+
+	address is either ``HOST:PORT`` (IPv6 hosts may be enclosed in square
+	brackets, and an empty host means all interfaces) or the path of a Unix
+	socket, which must contain a slash. A stale Unix socket left at that
+	path is replaced.
+	"""
+	if '/' in address:
+		try:
+			if stat.S_ISSOCK(os.stat(address).st_mode):
+				os.unlink(address)
+		except OSError:
+			pass
+		sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		sock.bind(address)
+	else:
+		host, separator, port = address.rpartition(':')
+		if not separator or not port.isdigit():
+			raise ValueError("Invalid address '{}', expected HOST:PORT or a path".format(address))
+		family, type, proto, canonname, sockaddr = socket.getaddrinfo(
+			host.strip('[]') or None, int(port), socket.AF_UNSPEC, socket.SOCK_STREAM, 0, socket.AI_PASSIVE)[0]
+		sock = socket.socket(family, type, proto)
+		sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		sock.bind(sockaddr)
+	sock.listen(backlog)
+	return sock
+
+
+def describe_status(status):
+	"""Return a description of a process exit status as returned by os.waitpid"""
+	if os.WIFSIGNALED(status):
+		return "signal {}".format(os.WTERMSIG(status))
+	return "status {}".format(os.WEXITSTATUS(status))
+
+
+class Worker(object):
+	"""A forked worker process, as seen by the supervisor"""
+
+	def __init__(self, number, pid, ready_fd):
+		self.number = number
+		self.pid = pid
+		self.started = time.time()
+		self.ready = False
+		# Read end of a pipe the worker writes to once its plugins are active
+		self.ready_fd = ready_fd
+
+	def __repr__(self):
+		return "<Worker {} (pid {})>".format(self.number, self.pid)
+
+	def poll_ready(self, timeout):
+		"""
+		Wait at most timeout seconds for the worker to report it's ready
+
+		Returns True once it has, False when it hasn't yet and None when it
+		exited without doing so.
+		"""
+		if self.ready:
+			return True
+		if self.ready_fd is None:
+			return None
+		try:
+			readable = select.select([self.ready_fd], [], [], timeout)[0]
+		except (OSError, select.error) as e:
+			if e.args[0] == errno.EINTR:
+				return False
+			raise
+		if not readable:
+			return False
+		self.ready = os.read(self.ready_fd, 1) == b'1'
+		self.close()
+		return True if self.ready else None
+
+	def close(self):
+		"""Close the supervisor's end of the ready pipe"""
+		if self.ready_fd is not None:
+			os.close(self.ready_fd)
+			self.ready_fd = None
+
+
+class Supervisor(object):
+	"""
+	Runs plugins in ``workers`` forked worker processes
+
+	``listen`` is a list of addresses to bind listening sockets to before
+	forking (see `bind_socket`). ``event_loop`` and ``watch`` have the same
+	meaning for every worker as they have for `octo.manager.run`.
+	``ready_timeout`` is how many seconds a replacement worker gets to
+	activate its plugins during `rolling_restart`, or None to wait as long
+	as it takes. Any other keyword arguments are passed on to
+	`octo.manager.Manager`.
+	"""
+
+	def __init__(self, plugin_dirs=[], workers=2, listen=(), event_loop=False, watch=False, backoff=1.0,
+	             max_backoff=60.0, ready_timeout=60.0, **kwargs):
+		if workers < 1:
+			raise ValueError("At least one worker is needed")
+		self.plugin_dirs = list(plugin_dirs)
+		self.workers = workers
+		self.listen = list(listen)
+		self.event_loop = event_loop
+		self.watch = watch
+		self.backoff = backoff
+		self.max_backoff = max_backoff
+		self.ready_timeout = ready_timeout
+		self.manager = None
+		self._kwargs = kwargs
+		shutdown_timeout = kwargs.get('shutdown_timeout')
+		self._kill_after = None if shutdown_timeout is None else shutdown_timeout + KILL_GRACE
+		# worker number -> running Worker
+		self._workers = {}
+		# worker number -> crashes in a row
+		self._crashes = {}
+		# worker number -> time.time() at which to restart the crashed worker
+		self._restarts = {}
+		# pids of workers being stopped, and the exit status of those which have
+		self._stopping_pids = set()
+		self._exited = {}
+		self._stopping = False
+		self._restart_requested = False
+		self._alive_fds = None
+
+	def run(self):
+		"""
+		Load plugins and run the workers until SIGINT or SIGTERM is received
+
+		Returns once all workers have stopped.
+		"""
+		sockets = dict((address, bind_socket(address)) for address in self.listen)
+		self.manager = octo.manager.Manager(plugin_dirs=self.plugin_dirs, sockets=sockets, **self._kwargs)
+		# Workers read from this pipe, which reaches end of file when the
+		# supervisor dies, so they can stop as well
+		self._alive_fds = os.pipe()
+		signal.signal(signal.SIGTERM, self._on_stop)
+		signal.signal(signal.SIGINT, self._on_stop)
+		signal.signal(signal.SIGHUP, self._on_restart)
+		if hasattr(signal, 'SIGUSR1'):
+			signal.signal(signal.SIGUSR1, self._on_stats)
+		logging.info("Starting {} workers".format(self.workers))
+		try:
+			for number in range(self.workers):
+				self._workers[number] = self._spawn(number)
+			while not self._stopping:
+				self._supervise()
+				if self._restart_requested:
+					self._restart_requested = False
+					self.rolling_restart()
+				time.sleep(POLL_INTERVAL)
+		finally:
+			logging.info("Stopping workers")
+			workers = list(self._workers.values())
+			self._workers.clear()
+			self._restarts.clear()
+			self._terminate(workers)
+			for fd in self._alive_fds:
+				os.close(fd)
+			for sock in sockets.values():
+				sock.close()
+		return self
+
+	def stop(self):
+		"""Make `run` stop the workers and return"""
+		self._stopping = True
+
+	def restart(self):
+		"""Make `run` restart the workers one at a time, see `rolling_restart`"""
+		self._restart_requested = True
+
+	def _on_stop(self, signum, frame):
+		logging.info("Signal {} received, shutting down".format(signum))
+		self.stop()
+
+	def _on_restart(self, signum, frame):
+		logging.info("Signal {} received, restarting workers".format(signum))
+		self.restart()
+
+	def _on_stats(self, signum, frame):
+		for worker in list(self._workers.values()):
+			self._kill(worker.pid, signum)
+
+	def _kill(self, pid, signum):
+		try:
+			os.kill(pid, signum)
+		except OSError as e:
+			if e.errno != errno.ESRCH:
+				raise
+
+	def _spawn(self, number):
+		"""Fork worker number and return its `Worker`"""
+		ready_read, ready_write = os.pipe()
+		# Signals sent to the new worker stay pending until it handles them
+		signal.pthread_sigmask(signal.SIG_BLOCK, WORKER_SIGNALS)
+		try:
+			pid = os.fork()
+			if pid == 0:
+				status = 1
+				try:
+					os.close(ready_read)
+					self._run_worker(number, ready_write)
+					status = 0
+				except Exception:
+					logging.exception("Worker {} failed".format(number))
+				finally:
+					os._exit(status)
+		finally:
+			signal.pthread_sigmask(signal.SIG_UNBLOCK, WORKER_SIGNALS)
+		os.close(ready_write)
+		logging.info("Started worker {} (pid {})".format(number, pid))
+		return Worker(number, pid, ready_read)
+
+	def _run_worker(self, number, ready_fd):
+		"""Body of worker number, in the forked process"""
+		for worker in self._workers.values():
+			worker.close()
+		alive_read, alive_write = self._alive_fds
+		os.close(alive_write)
+		# The supervisor decides when workers stop
+		signal.signal(signal.SIGINT, signal.SIG_IGN)
+		signal.signal(signal.SIGHUP, signal.SIG_IGN)
+		for signum in WORKER_SIGNALS:
+			signal.signal(signum, signal.SIG_DFL)
+
+		def watch_supervisor():
+			os.read(alive_read, 1)
+			logging.warning("Supervisor died, stopping worker {}".format(number))
+			os.kill(os.getpid(), signal.SIGTERM)
+		thread = threading.Thread(target=watch_supervisor, name="octo-supervisor-watch")
+		thread.daemon = True
+		thread.start()
+
+		loop = None
+		if self.event_loop:
+			loop = asyncio.new_event_loop()
+			asyncio.set_event_loop(loop)
+			octo.plugin.set_hook_loop(loop)
+		octo.instance = self.manager
+		# Activate on this thread when running an event loop, so coroutine
+		# hooks all run on it
+		self.manager.start(parallel=loop is None, worker=number)
+		if self.watch:
+			self.manager.watch()
+		os.write(ready_fd, b'1')
+		os.close(ready_fd)
+
+		if loop is not None:
+			loop.add_signal_handler(signal.SIGTERM, loop.stop)
+			if hasattr(signal, 'SIGUSR1'):
+				loop.add_signal_handler(signal.SIGUSR1, octo.manager.stats_handler, signal.SIGUSR1, None)
+			signal.pthread_sigmask(signal.SIG_UNBLOCK, WORKER_SIGNALS)
+			loop.run_forever()
+			octo.manager.stop()
+			loop.close()
+		else:
+			# The signals are still blocked, so none can be missed
+			while signal.sigwait(WORKER_SIGNALS) != signal.SIGTERM:
+				octo.manager.stats_handler(signal.SIGUSR1, None)
+			octo.manager.stop()
+
+	def _supervise(self):
+		"""Reap exited workers and restart crashed ones whose backoff has passed"""
+		self._reap()
+		now = time.time()
+		for number, due in sorted(self._restarts.items()):
+			if due <= now and not self._stopping:
+				del self._restarts[number]
+				self._workers[number] = self._spawn(number)
+
+	def _reap(self):
+		"""Collect the exit status of exited workers, scheduling restarts for crashed ones"""
+		while True:
+			try:
+				pid, status = os.waitpid(-1, os.WNOHANG)
+			except OSError as e:
+				if e.errno == errno.ECHILD:
+					return
+				raise
+			if pid == 0:
+				return
+			if pid in self._stopping_pids:
+				self._exited[pid] = status
+				continue
+			for number, worker in list(self._workers.items()):
+				if worker.pid == pid:
+					del self._workers[number]
+					worker.close()
+					self._crashed(worker, status)
+
+	def _crashed(self, worker, status):
+		"""Schedule the restart of a worker which exited unexpectedly"""
+		if time.time() - worker.started < STABLE_AFTER:
+			crashes = self._crashes.get(worker.number, 0) + 1
+		else:
+			crashes = 1
+		self._crashes[worker.number] = crashes
+		delay = min(self.max_backoff, self.backoff * 2 ** (crashes - 1))
+		logging.error("Worker {} (pid {}) exited with {}, restarting it in {:.1f} seconds".format(
+			worker.number, worker.pid, describe_status(status), delay))
+		self._restarts[worker.number] = time.time() + delay
+
+	def _terminate(self, workers):
+		"""
+		Stop workers and wait for them to exit
+
+		Workers which are still running after the manager's shutdown timeout
+		plus `KILL_GRACE` seconds are killed.
+		"""
+		for worker in workers:
+			self._stopping_pids.add(worker.pid)
+			self._kill(worker.pid, signal.SIGTERM)
+		end = None if self._kill_after is None else time.time() + self._kill_after
+		remaining = list(workers)
+		while remaining:
+			self._reap()
+			for worker in list(remaining):
+				if worker.pid in self._exited:
+					status = self._exited.pop(worker.pid)
+					self._stopping_pids.discard(worker.pid)
+					worker.close()
+					remaining.remove(worker)
+					logging.info("Worker {} (pid {}) exited with {}".format(
+						worker.number, worker.pid, describe_status(status)))
+			if remaining and end is not None and time.time() >= end:
+				for worker in remaining:
+					logging.warning("Killing worker {} (pid {}), which didn't stop in time".format(
+						worker.number, worker.pid))
+					self._kill(worker.pid, signal.SIGKILL)
+				end = None
+			if remaining:
+				time.sleep(POLL_INTERVAL)
+
+	def rolling_restart(self):
+		"""
+		Replace the workers one at a time
+
+		Each replacement is started before the worker it replaces is
+		stopped, and that worker is only stopped once the replacement has
+		activated its plugins. Gives up when a replacement exits before
+		that or isn't ready within ``ready_timeout`` seconds, leaving the
+		remaining workers running. Crashed workers keep being restarted in
+		the meantime.
+		"""
+		logging.info("Restarting workers one at a time")
+		for number in sorted(self._workers):
+			if number not in self._workers or self._stopping:
+				# Crashed in the meantime, and restarted separately
+				continue
+			new = self._spawn(number)
+			# Collect its exit status if it dies before it's ready
+			self._stopping_pids.add(new.pid)
+			end = None if self.ready_timeout is None else time.time() + self.ready_timeout
+			ready = False
+			while not self._stopping:
+				ready = new.poll_ready(POLL_INTERVAL)
+				if ready is not False or (end is not None and time.time() >= end):
+					break
+				self._supervise()
+			if not ready:
+				logging.error("Replacement of worker {} didn't start, keeping the current workers".format(number))
+				self._terminate([new])
+				return
+			self._stopping_pids.discard(new.pid)
+			# The worker may have crashed, or even been restarted, while
+			# waiting; the replacement takes over either way
+			self._restarts.pop(number, None)
+			old = self._workers.get(number)
+			self._workers[number] = new
+			if old is not None:
+				self._terminate([old])
+		logging.info("Restarted all workers")
@@ -0,0 +1,107 @@
+"""
+Startup profiling support.
+
+A `StartupProfile` collects wall clock and CPU time measurements for the
+phases a `octo.manager.Manager` goes through while starting up: discovery,
+module import, object binding and plugin activation.
+"""
+
+import json
+import time
+from contextlib import contextmanager
+
+# CPU time of the current thread where available, so plugins activated
+# concurrently aren't charged for each other's work.
+try:
+	cpu_time = time.thread_time
+except AttributeError:
+	cpu_time = getattr(time, 'process_time', None) or time.clock  # Python < 3.7
+
+PHASES = ('discovery', 'import', 'bind', 'activate')
+
+
+class StartupProfile(object):
+	"""A collection of (phase, plugin, wall time, CPU time) measurements"""
+
+	def __init__(self):
+		self.entries = []
+
+	def record(self, phase, plugin, wall, cpu):
+		"""
+		Record a measurement
+
+		plugin may be None for phases which don't concern a single plugin.
+		Times are in seconds.
+		"""
+		self.entries.append((phase, plugin, wall, cpu))
+
+	@contextmanager
+	def measure(self, phase, plugin=None):
+		"""Context manager which records the time spent in its body"""
+		wall = time.time()
+		cpu = cpu_time()
+		try:
+			yield
+		finally:
+			self.record(phase, plugin, time.time() - wall, cpu_time() - cpu)
+
+	def totals(self):
+		"""Return a dictionary of {phase: (wall time, CPU time)} totals"""
+		totals = {}
+		for phase, plugin, wall, cpu in self.entries:
+			total_wall, total_cpu = totals.get(phase, (0.0, 0.0))
+			totals[phase] = (total_wall + wall, total_cpu + cpu)
+		return totals
+
+	def sorted_entries(self):
+		"""Return entries sorted by wall time, slowest first"""
+		return sorted(self.entries, key=lambda entry: (-entry[2], entry[0], entry[1] or ''))
+
+	def as_dict(self):
+		"""Return the profile as a JSON-serializable dictionary"""
+		return {
+			'entries': [{'phase': phase, 'plugin': plugin, 'wall': wall, 'cpu': cpu}
+			            for phase, plugin, wall, cpu in self.sorted_entries()],
+			'totals': dict((phase, {'wall': wall, 'cpu': cpu})
+			               for phase, (wall, cpu) in self.totals().items()),
+		}
+
+	def as_json(self):
+		"""Return the profile as a JSON string"""
+		return json.dumps(self.as_dict(), indent=2, sort_keys=True)
+
+	def write_json(self, filename):
+		"""Write the profile as JSON to filename"""
+		with open(filename, 'w') as file:
+			file.write(self.as_json())
+			file.write("\n")
+
+	def format_table(self):
+		"""Return the profile as a human-readable table, slowest entries first"""
+		rows = [("PHASE", "PLUGIN", "WALL (ms)", "CPU (ms)")]
+		for phase, plugin, wall, cpu in self.sorted_entries():
+			rows.append((phase, plugin or "-", "{:.3f}".format(wall * 1000), "{:.3f}".format(cpu * 1000)))
+		totals = self.totals()
+		for phase in PHASES:
+			if phase in totals:
+				wall, cpu = totals[phase]
+				rows.append(("total " + phase, "-", "{:.3f}".format(wall * 1000), "{:.3f}".format(cpu * 1000)))
+		widths = [max(len(row[i]) for row in rows) for i in range(4)]
+		lines = []
+		for row in rows:
+			lines.append("  ".join([row[0].ljust(widths[0]), row[1].ljust(widths[1]),
+			                        row[2].rjust(widths[2]), row[3].rjust(widths[3])]).rstrip())
+		return "\n".join(lines)
+
+
+class _NullContext(object):
+	"""Context manager which does nothing, used when profiling is disabled"""
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		return False
+
+
+null_context = _NullContext()
@@ -0,0 +1,169 @@
+"""
+Compact records of discovered plugins.
+
+yapsy keeps all information about a plugin, including its name and path,
+in a ConfigParser with the contents of its info file. A ConfigParser takes
+up several kilobytes, which adds up with thousands of plugins. The manager
+therefore stores plugins as `PluginRecord` objects, which keep the info file
+contents as tuples of interned strings (see `CompactConfig`) and only build
+the ConfigParser in ``details`` when it is accessed.
+"""
+
+import sys
+from yapsy.PluginInfo import PluginInfo
+from yapsy.compat import ConfigParser
+from octo.config import parse_bool
+try:
+	import configparser
+except ImportError:
+	import ConfigParser as configparser  # Python 2
+try:
+	intern = sys.intern
+except AttributeError:
+	pass  # Python 2, where intern is a builtin
+
+
+class CompactConfig(object):
+	"""
+	A read-only stand-in for a ConfigParser, holding its sections and items
+	as tuples of interned strings
+
+	Supports the subset of the ConfigParser interface used to read plugin
+	info files. Values are returned raw, without interpolation.
+	"""
+
+	__slots__ = ('_sections',)
+
+	def __init__(self, sections):
+		"""sections is an iterable of (section, iterable of (option, value)) tuples"""
+		self._sections = tuple((intern(str(section)), tuple((intern(str(option)), intern(str(value)))
+		                                                    for option, value in items))
+		                       for section, items in sections)
+
+	@classmethod
+	def from_configparser(cls, parser):
+		"""Return a CompactConfig with the contents of a ConfigParser"""
+		return cls((section, parser.items(section, raw=True)) for section in parser.sections())
+
+	def to_configparser(self):
+		"""Return a new ConfigParser with the contents of this config"""
+		parser = ConfigParser()
+		for section, items in self._sections:
+			parser.add_section(section)
+			for option, value in items:
+				parser.set(section, option, value)
+		return parser
+
+	def sections(self):
+		return [section for section, items in self._sections]
+
+	def has_section(self, section):
+		return section in self.sections()
+
+	def items(self, section, raw=True):
+		for name, items in self._sections:
+			if name == section:
+				return list(items)
+		raise configparser.NoSectionError(section)
+
+	def has_option(self, section, option):
+		try:
+			self.get(section, option)
+		except (configparser.NoSectionError, configparser.NoOptionError):
+			return False
+		return True
+
+	def get(self, section, option):
+		option = option.lower()
+		for name, value in self.items(section):
+			if name == option:
+				return value
+		raise configparser.NoOptionError(option, section)
+
+	def getboolean(self, section, option):
+		return parse_bool(self.get(section, option))
+
+
+class PluginRecord(PluginInfo):
+	"""
+	A yapsy PluginInfo which stores the contents of the plugin's info file
+	in a `CompactConfig`
+
+	The ConfigParser in ``details`` (which the version, author and other
+	documentation properties read from as well) is only built on first
+	access. Use ``config`` to read the info file without building it.
+	"""
+
+	__slots__ = ('_name', '_path', '_compact', '_details', 'plugin_object', 'categories', 'error', 'settings')
+
+	def __init__(self, name, path, compact):
+		# PluginInfo.__init__ would create a ConfigParser right away
+		self._name = intern(str(name))
+		self._path = path
+		self._compact = compact
+		self._details = None
+		self.plugin_object = None
+		self.categories = []
+		self.error = None
+		self.settings = None
+
+	@classmethod
+	def from_plugin_info(cls, plugin_info):
+		"""Return a PluginRecord with the contents of a PluginInfo"""
+		return cls(plugin_info.name, plugin_info.path, CompactConfig.from_configparser(plugin_info.details))
+
+	@property
+	def config(self):
+		"""The contents of the info file, as a ConfigParser once built or a `CompactConfig` until then"""
+		if self._details is not None:
+			return self._details
+		return self._compact
+
+	def _get_details(self):
+		if self._details is None:
+			self._details = self._compact.to_configparser()
+			self._compact = None
+		return self._details
+
+	def _set_details(self, details):
+		# Like with PluginInfo, the name and path of the record take
+		# precedence over those in details
+		self._details = details
+		self._compact = None
+		self.name = self._name
+		self.path = self._path
+
+	def _get_name(self):
+		return self._name
+
+	def _set_name(self, name):
+		self._name = name
+		if self._details is not None:
+			if not self._details.has_section('Core'):
+				self._details.add_section('Core')
+			self._details.set('Core', 'Name', name)
+
+	def _get_path(self):
+		return self._path
+
+	def _set_path(self, path):
+		self._path = path
+		if self._details is not None:
+			if not self._details.has_section('Core'):
+				self._details.add_section('Core')
+			self._details.set('Core', 'Module', path)
+
+	details = property(_get_details, _set_details)
+	name = property(_get_name, _set_name)
+	path = property(_get_path, _set_path)
+
+
+def get_config(plugin):
+	"""
+	Return the info file contents of plugin (a PluginInfo) as a
+	ConfigParser, or as a `CompactConfig` for records which haven't built
+	theirs yet
+	"""
+	if isinstance(plugin, PluginRecord):
+		return plugin.config
+	return plugin.details
@@ -0,0 +1,359 @@
+"""
+Shared scheduler for periodic plugin work.
+
+Rather than running timers or threads of their own, plugins register
+periodic tasks with the `Scheduler` of the manager (see
+`octo.manager.Manager.schedule` and `octo.plugin.periodic`). A single timer
+thread keeps the tasks in a heap ordered by their next run time, and hands
+tasks which are due to a bounded pool of worker threads. All tasks of a
+plugin are cancelled when it is deactivated.
+
+Tasks run every ``interval`` seconds, or at the times matched by a ``cron``
+expression: five fields for minute (0-59), hour (0-23), day of month
+(1-31), month (1-12) and day of week (0-6, Sunday is 0 or 7), each ``*``,
+a number, a range ``a-b`` or a comma-separated list of these, optionally
+followed by a step ``/n``. ``@hourly``, ``@daily``, ``@weekly``,
+``@monthly`` and ``@yearly`` are accepted as well. Cron expressions are
+evaluated in local time.
+"""
+
+import datetime
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from octo.metrics import clock
+
+# What to do when a task is due while its previous run is still going
+OVERRUN_POLICIES = ('skip', 'delay', 'concurrent')
+
+CRON_ALIASES = {
+	'@yearly': '0 0 1 1 *',
+	'@annually': '0 0 1 1 *',
+	'@monthly': '0 0 1 * *',
+	'@weekly': '0 0 * * 0',
+	'@daily': '0 0 * * *',
+	'@midnight': '0 0 * * *',
+	'@hourly': '0 * * * *',
+}
+
+# (lowest, highest) value of each cron field
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _parse_cron_field(field, lowest, highest):
+	"""Return the frozenset of values matched by a single cron field"""
+	values = set()
+	for part in field.split(','):
+		step = 1
+		if '/' in part:
+			part, step = part.split('/', 1)
+			step = int(step)
+			if step < 1:
+				raise ValueError("Invalid step in cron field '{}'".format(field))
+		if part == '*':
+			start, end = lowest, highest
+		elif '-' in part:
+			start, end = (int(value) for value in part.split('-', 1))
+		else:
+			start = int(part)
+			end = highest if step > 1 else start
+		if start < lowest or end > highest or start > end:
+			raise ValueError("Cron field '{}' is out of range {}-{}".format(field, lowest, highest))
+		values.update(range(start, end + 1, step))
+	return frozenset(values)
+
+
+class CronSchedule(object):
+	"""A parsed cron expression"""
+
+	def __init__(self, expression):
+		self.expression = expression
+		fields = CRON_ALIASES.get(expression.strip(), expression).split()
+		if len(fields) != 5:
+			raise ValueError("Cron expression '{}' doesn't have five fields".format(expression))
+		self.minutes, self.hours, self.days, self.months, weekdays = (
+			_parse_cron_field(field, lowest, highest) for field, (lowest, highest) in zip(fields, CRON_FIELDS))
+		# Both 0 and 7 mean Sunday
+		self.weekdays = frozenset(day % 7 for day in weekdays)
+		# Like cron, match either field when both days and weekdays are restricted
+		self._any_day = fields[2] != '*' and fields[4] != '*'
+
+	def _day_matches(self, moment):
+		day = moment.day in self.days
+		weekday = (moment.weekday() + 1) % 7 in self.weekdays
+		return (day or weekday) if self._any_day else (day and weekday)
+
+	def next_after(self, moment):
+		"""Return the first datetime matching the expression after moment"""
+		moment = moment.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+		limit = moment + datetime.timedelta(days=366 * 8)
+		while moment < limit:
+			if moment.month not in self.months:
+				moment = (moment.replace(day=1, hour=0, minute=0) + datetime.timedelta(days=32)).replace(day=1)
+			elif not self._day_matches(moment):
+				moment = moment.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+			elif moment.hour not in self.hours:
+				moment = moment.replace(minute=0) + datetime.timedelta(hours=1)
+			elif moment.minute not in self.minutes:
+				moment += datetime.timedelta(minutes=1)
+			else:
+				return moment
+		raise ValueError("Cron expression '{}' never matches".format(self.expression))
+
+
+class ScheduledTask(object):
+	"""
+	A task registered with a `Scheduler`
+
+	Keeps counters of the runs, skipped runs and errors of the task. Call
+	`cancel` to stop further runs; a run in progress is not interrupted.
+	"""
+
+	def __init__(self, scheduler, plugin_name, func, args, kwargs, interval, cron, jitter, overrun, name):
+		self.scheduler = scheduler
+		self.plugin_name = plugin_name
+		self.func = func
+		self.args = args
+		self.kwargs = kwargs
+		self.interval = interval
+		self.cron = cron
+		self.jitter = jitter
+		self.overrun = overrun
+		self.name = name
+		self.cancelled = False
+		self.runs = 0
+		self.skipped = 0
+		self.errors = 0
+		self.last_error = None
+		self.running = 0
+		# Clock time of the next run, before jitter is added
+		self._base = None
+		self._pending = False
+		self._lock = threading.Lock()
+
+	def __repr__(self):
+		return "<ScheduledTask {!r} of plugin {!r}>".format(self.name, self.plugin_name)
+
+	def cancel(self):
+		"""Cancel all further runs of this task"""
+		self.scheduler.cancel(self)
+
+	def stats(self):
+		"""Return the counters of this task as a dictionary"""
+		return {
+			'runs': self.runs,
+			'skipped': self.skipped,
+			'errors': self.errors,
+			'running': self.running,
+		}
+
+	def _first_run(self, now, delay):
+		if self.cron is not None and delay is None:
+			self._base = self._next_cron(now)
+		else:
+			self._base = now + (self.interval if delay is None else delay)
+		return self._jittered()
+
+	def _next_run(self, now):
+		"""Return the clock time of the run after the current one"""
+		if self.cron is not None:
+			self._base = self._next_cron(now)
+		else:
+			self._base += self.interval
+			if self._base <= now:
+				# Fell behind, for example because the process was suspended
+				missed = int((now - self._base) // self.interval) + 1
+				self.skipped += missed
+				self._base += missed * self.interval
+		return self._jittered()
+
+	def _next_cron(self, now):
+		wall = time.time()
+		due = time.mktime(self.cron.next_after(datetime.datetime.fromtimestamp(wall)).timetuple())
+		return now + max(0.0, due - wall)
+
+	def _jittered(self):
+		if self.jitter:
+			return self._base + random.uniform(0, self.jitter)
+		return self._base
+
+	def _run(self):
+		"""Run the task on a worker thread"""
+		while True:
+			try:
+				self.func(*self.args, **self.kwargs)
+			except Exception as e:
+				logging.exception("Exception in scheduled task {!r} of plugin {}".format(self.name, self.plugin_name))
+				with self._lock:
+					self.errors += 1
+					self.last_error = e
+			with self._lock:
+				self.runs += 1
+				if not self._pending or self.cancelled:
+					self._pending = False
+					self.running -= 1
+					return
+				# Run again right away for the delayed run
+				self._pending = False
+
+
+class Scheduler(object):
+	"""
+	Runs `ScheduledTask` objects on a pool of at most ``max_workers`` threads
+
+	The timer and worker threads are started when the first task is added,
+	and stopped by `close`.
+	"""
+
+	def __init__(self, max_workers=4):
+		self.max_workers = max_workers
+		# Heap of (clock time, sequence number, task)
+		self._heap = []
+		self._counter = itertools.count()
+		# plugin name -> set of tasks
+		self._plugin_tasks = {}
+		# Number of cancelled tasks still in the heap
+		self._cancelled = 0
+		self._condition = threading.Condition()
+		self._executor = None
+		self._thread = None
+
+	def add(self, plugin_name, func, args=(), kwargs={}, interval=None, cron=None, jitter=0,
+	        overrun='skip', delay=None, name=None):
+		"""
+		Schedule func to be called with args and kwargs on behalf of plugin_name
+
+		Exactly one of ``interval`` (in seconds) and ``cron`` (a cron
+		expression) must be given. The first run takes place after ``delay``
+		seconds, which defaults to one interval or the first time matched
+		by cron. Every run is postponed by a random number of seconds up to
+		``jitter``, to spread tasks which share an interval.
+
+		``overrun`` determines what happens when a run is due while the
+		previous one hasn't finished: 'skip' skips it, 'delay' starts it as
+		soon as the previous run finishes and 'concurrent' starts it anyway.
+
+		Returns the `ScheduledTask`.
+		"""
+		if (interval is None) == (cron is None):
+			raise ValueError("Exactly one of interval and cron must be given")
+		if interval is not None and interval <= 0:
+			raise ValueError("The interval must be positive")
+		if overrun not in OVERRUN_POLICIES:
+			raise ValueError("Unknown overrun policy '{}', must be one of {}".format(
+				overrun, ", ".join(OVERRUN_POLICIES)))
+		if cron is not None:
+			cron = CronSchedule(cron)
+		task = ScheduledTask(self, plugin_name, func, tuple(args), dict(kwargs), interval, cron,
+		                     jitter or 0, overrun, name or getattr(func, '__name__', repr(func)))
+		with self._condition:
+			self._plugin_tasks.setdefault(plugin_name, set()).add(task)
+			self._push(task, task._first_run(clock(), delay))
+			if self._thread is None:
+				self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+				                                    thread_name_prefix="octo-scheduler-worker")
+				self._thread = threading.Thread(target=self._timer, name="octo-scheduler")
+				self._thread.daemon = True
+				self._thread.start()
+			self._condition.notify()
+		return task
+
+	def _push(self, task, due):
+		heapq.heappush(self._heap, (due, next(self._counter), task))
+
+	def cancel(self, task):
+		"""Cancel further runs of task"""
+		with self._condition:
+			tasks = self._plugin_tasks.get(task.plugin_name)
+			if tasks is not None and task in tasks:
+				tasks.discard(task)
+				if not tasks:
+					del self._plugin_tasks[task.plugin_name]
+				self._cancel([task])
+
+	def cancel_plugin(self, plugin_name):
+		"""Cancel all tasks of plugin_name"""
+		with self._condition:
+			self._cancel(self._plugin_tasks.pop(plugin_name, ()))
+
+	def _cancel(self, tasks):
+		for task in tasks:
+			task.cancelled = True
+			self._cancelled += 1
+		# Cancelled tasks are normally dropped from the heap when they come
+		# up, but those far in the future shouldn't pile up meanwhile
+		if self._cancelled > len(self._heap) // 2:
+			self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+			heapq.heapify(self._heap)
+			self._cancelled = 0
+
+	def tasks(self, plugin_name=None):
+		"""Return a list of the scheduled tasks, of plugin_name or of all plugins"""
+		with self._condition:
+			if plugin_name is not None:
+				return list(self._plugin_tasks.get(plugin_name, ()))
+			return [task for tasks in self._plugin_tasks.values() for task in tasks]
+
+	def _timer(self):
+		"""Body of the timer thread"""
+		while True:
+			with self._condition:
+				while True:
+					if threading.current_thread() is not self._thread:
+						# Closed
+						return
+					if self._heap and self._heap[0][2].cancelled:
+						heapq.heappop(self._heap)
+						self._cancelled = max(0, self._cancelled - 1)
+						continue
+					now = clock()
+					if self._heap and self._heap[0][0] <= now:
+						task = heapq.heappop(self._heap)[2]
+						self._push(task, task._next_run(now))
+						executor = self._executor
+						break
+					self._condition.wait(self._heap[0][0] - now if self._heap else None)
+			self._fire(task, executor)
+
+	def _fire(self, task, executor):
+		"""Start a run of task which is due, according to its overrun policy"""
+		with task._lock:
+			if task.cancelled:
+				return
+			if task.running and task.overrun != 'concurrent':
+				if task.overrun == 'delay' and not task._pending:
+					task._pending = True
+				else:
+					task.skipped += 1
+				return
+			task.running += 1
+		try:
+			executor.submit(task._run)
+		except RuntimeError:
+			# Closed in the meantime
+			with task._lock:
+				task.running -= 1
+
+	def close(self, wait=False):
+		"""
+		Cancel all tasks and stop the timer and worker threads
+
+		Runs in progress are waited for when wait is True.
+		"""
+		with self._condition:
+			for tasks in self._plugin_tasks.values():
+				for task in tasks:
+					task.cancelled = True
+			self._plugin_tasks.clear()
+			del self._heap[:]
+			self._cancelled = 0
+			thread, executor = self._thread, self._executor
+			self._thread = self._executor = None
+			self._condition.notify_all()
+		if thread is not None:
+			thread.join()
+			executor.shutdown(wait=wait)
@@ -0,0 +1,51 @@
+"""
+Change detection for plugin directories.
+
+`PluginWatcher` polls the plugin directories for created, modified and
+deleted plugin files. Only the modification time and size of each file are
+compared, so a poll amounts to a directory walk and a stat call per file.
+"""
+
+import os
+
+WATCHED_EXTENSIONS = ('.py', '.octoplugin')
+
+
+class PluginWatcher(object):
+	"""
+	Detects changes to plugin files (.py and .octoplugin) in a set of directories
+
+	A snapshot of the directories is taken on creation. Each call to
+	`changes` compares the directories to the previous snapshot and takes a
+	new one.
+	"""
+
+	def __init__(self, directories):
+		self.directories = [os.path.abspath(directory) for directory in directories]
+		self._snapshot = self.scan()
+
+	def scan(self):
+		"""Return a dictionary of {path: (mtime, size)} for all plugin files"""
+		snapshot = {}
+		for directory in self.directories:
+			for dirpath, dirnames, filenames in os.walk(directory, followlinks=True):
+				for filename in filenames:
+					if not filename.endswith(WATCHED_EXTENSIONS):
+						continue
+					path = os.path.join(dirpath, filename)
+					try:
+						stat = os.stat(path)
+					except OSError:
+						# Removed while walking
+						continue
+					snapshot[path] = (stat.st_mtime, stat.st_size)
+		return snapshot
+
+	def changes(self):
+		"""Return a sorted list of paths created, modified or deleted since the last call"""
+		snapshot = self.scan()
+		previous = self._snapshot
+		self._snapshot = snapshot
+		changed = set(path for path, stat in snapshot.items() if previous.get(path) != stat)
+		changed.update(path for path in previous if path not in snapshot)
+		return sorted(changed)
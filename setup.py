@@ -2,14 +2,35 @@
 
 import os
 from setuptools import setup, find_packages
+from setuptools.command.build_py import build_py
 
 root = os.path.dirname(os.path.realpath(__file__))
 
+VERSION_MODULE = """# Generated from octo/version by setup.py, do not edit
+version = "{}"
+"""
+
+
+def read_version():
+	with open(os.sep.join([root, 'octo', 'version'])) as file:
+		return file.read().strip()
+
+
+class build_py_with_version(build_py):
+	"""build_py which embeds the contents of octo/version in octo/_version.py"""
+
+	def run(self):
+		build_py.run(self)
+		if not self.dry_run:
+			target = os.path.join(self.build_lib, 'octo', '_version.py')
+			self.mkpath(os.path.dirname(target))
+			with open(target, 'w') as file:
+				file.write(VERSION_MODULE.format(read_version()))
+
 if __name__ == "__main__":
 	with open(os.sep.join([root, 'README.rst'])) as file:
 		long_description = file.read()
-	with open(os.sep.join([root, 'octo', 'version'])) as file:
-		version = file.read().strip()
+	version = read_version()
 
 	setup(name='octo',
 	      version=version,
@@ -32,6 +53,7 @@ if __name__ == "__main__":
 	      license="License :: OSI Approved :: BSD License",
 	      packages=find_packages(),
 	      include_package_data=True,
+	      cmdclass={'build_py': build_py_with_version},
 	      entry_points={
 	          'console_scripts': ['octo = octo.cli:main']
 	      },
@@ -0,0 +1,152 @@
+"""
+Tests of the coroutine API of the manager and plugins
+
+These use async/await syntax, so they are kept apart from manager_tests.py,
+which has to remain importable on Python 2. tox skips this module on
+versions without that syntax.
+"""
+
+import unittest
+import asyncio
+import threading
+import octo
+import octo.exceptions
+import octo.plugin
+from manager_tests import PluginManagerMock
+from nose.tools import raises
+from mock import patch, AsyncMock
+
+
+class LoopRecorder(octo.plugin.OctoPlugin):
+	"""Plugin which records the loop and thread its coroutine hooks run on"""
+
+	def __init__(self, loops):
+		super(LoopRecorder, self).__init__()
+		self.loops = loops
+
+	async def on_activation(self):
+		self.loops.append((asyncio.get_running_loop(), threading.current_thread()))
+
+	async def on_deactivation(self):
+		self.loops.append((asyncio.get_running_loop(), threading.current_thread()))
+
+
+@patch('octo.manager.PluginManager', new_callable=PluginManagerMock)
+class ManagerCoroutineTests(unittest.TestCase):
+	def test_manager_acall_awaits_coroutine_results(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		manager.get_plugins()['Plugin 1'].plugin_object.callback = lambda: asyncio.sleep(0, result="Awaited")
+		self.assertEqual(asyncio.run(manager.acall('Plugin 1', 'callback')), "Awaited")
+		self.assertEqual(asyncio.run(manager.acall('Plugin 5', 'callback')), "Called")
+
+	@raises(octo.exceptions.PluginTimeoutError)
+	def test_manager_acall_raises_timeout_error(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		manager.get_plugins()['Plugin 1'].plugin_object.callback = lambda: asyncio.sleep(1)
+		asyncio.run(manager.acall('Plugin 1', 'callback', timeout=0.05))
+
+	def test_manager_acall_many_returns_dict_with_results(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		manager.get_plugins()['Plugin 1'].plugin_object.callback = lambda: asyncio.sleep(0, result="Awaited")
+		manager.get_plugins()['Plugin 4'].plugin_object.callback = lambda: asyncio.sleep(1)
+		result = asyncio.run(manager.acall_many('callback', timeout=0.05))
+		self.assertEqual(len(result), 4)
+		self.assertEqual(result['Plugin 1'], "Awaited")
+		self.assertEqual(result['Plugin 5'], "Called")
+		self.assertTrue(isinstance(result['Plugin 3'], Exception))
+		self.assertTrue(isinstance(result['Plugin 4'], octo.exceptions.PluginTimeoutError))
+
+	def test_manager_aiter_call_many_yields_as_completed(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		manager.get_plugins()['Plugin 1'].plugin_object.callback = lambda: asyncio.sleep(0.1, result="Slow")
+
+		async def collect():
+			return [item async for item in manager.aiter_call_many('callback')]
+
+		results = asyncio.run(collect())
+		self.assertEqual(len(results), 4)
+		self.assertEqual(results[-1], ('Plugin 1', "Slow"))
+
+	def test_manager_aiter_call_many_cancels_pending_calls(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		cancelled = []
+
+		async def slow():
+			try:
+				await asyncio.sleep(1)
+			except asyncio.CancelledError:
+				cancelled.append(True)
+				raise
+		manager.get_plugins()['Plugin 1'].plugin_object.callback = slow
+
+		async def first():
+			results = manager.aiter_call_many('callback')
+			item = await results.__anext__()
+			await results.aclose()
+			await asyncio.sleep(0)
+			return item
+
+		self.assertNotEqual(asyncio.run(first())[0], 'Plugin 1')
+		self.assertEqual(cancelled, [True])
+
+	def test_manager_get_stats_counts_async_calls(self, plugin_manager_mock):
+		manager = octo.Manager(metrics=True)
+		manager.start()
+		asyncio.run(manager.acall_many('callback'))
+		self.assertEqual(manager.get_stats()['Plugin 5']['callback']['calls'], 1)
+
+	def test_manager_stop_runs_coroutine_hooks_on_hook_loop(self, plugin_manager_mock):
+		loop = asyncio.new_event_loop()
+		octo.plugin.set_hook_loop(loop)
+		try:
+			manager = octo.Manager(plugin_shutdown_timeout=5)
+			loops = []
+			for name in ('Plugin 0', 'Plugin 1'):
+				plugin = manager.get_plugins(include_inactive=True)[name]
+				plugin.plugin_object = LoopRecorder(loops)
+			manager.start(parallel=False)
+			manager.stop()
+		finally:
+			octo.plugin.set_hook_loop(None)
+			loop.close()
+		self.assertEqual(loops, [(loop, threading.current_thread())] * 4)
+
+	def test_manager_stop_from_hook_loop_schedules_coroutine_hooks(self, plugin_manager_mock):
+		loop = asyncio.new_event_loop()
+		octo.plugin.set_hook_loop(loop)
+		try:
+			manager = octo.Manager(plugin_shutdown_timeout=2)
+			loops = []
+			for name in ('Plugin 0', 'Plugin 1'):
+				plugin = manager.get_plugins(include_inactive=True)[name]
+				plugin.plugin_object = LoopRecorder(loops)
+			manager.start(parallel=False)
+
+			async def stop():
+				manager.stop()
+				# Let the scheduled deactivation hooks run
+				await asyncio.sleep(0)
+			loop.run_until_complete(stop())
+		finally:
+			octo.plugin.set_hook_loop(None)
+			loop.close()
+		self.assertEqual(loops, [(loop, threading.current_thread())] * 4)
+		self.assertEqual(manager.get_plugins(), {})
+		self.assertEqual(manager.get_shutdown_report(), {'abandoned': [], 'errors': {}})
+
+
+class PluginCoroutineTests(unittest.TestCase):
+	def test_activate_awaits_coroutine_on_activation(self):
+		with patch.object(octo.plugin.OctoPlugin, 'on_activation', new_callable=AsyncMock) as mock_method:
+			octo.plugin.OctoPlugin().activate()
+		mock_method.assert_awaited_once_with()
+
+	def test_deactivate_awaits_coroutine_on_deactivation(self):
+		with patch.object(octo.plugin.OctoPlugin, 'on_deactivation', new_callable=AsyncMock) as mock_method:
+			octo.plugin.OctoPlugin().deactivate()
+		mock_method.assert_awaited_once_with()
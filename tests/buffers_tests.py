@@ -0,0 +1,74 @@
+import unittest
+import octo.exceptions
+from octo.buffers import BufferRegistry
+from nose.tools import raises
+
+
+class BufferRegistryTests(unittest.TestCase):
+	def setUp(self):
+		self.registry = BufferRegistry()
+
+	def tearDown(self):
+		self.registry.close()
+
+	def test_acquire_returns_view_of_same_memory(self):
+		view = self.registry.create('Owner', 'buffer', 5)
+		view[:] = b'hello'
+		acquired = self.registry.acquire('Reader', 'buffer')
+		self.assertEqual(bytes(acquired), b'hello')
+		view[0:1] = b'j'
+		self.assertEqual(bytes(acquired), b'jello')
+
+	def test_acquired_view_is_read_only_by_default(self):
+		self.registry.publish('Owner', 'buffer', b'data')
+		self.assertTrue(self.registry.acquire('Reader', 'buffer').readonly)
+		self.assertFalse(self.registry.acquire('Reader', 'buffer', writable=True).readonly)
+
+	@raises(octo.exceptions.BufferExistsError)
+	def test_create_raises_exception_for_existing_name(self):
+		self.registry.create('Owner', 'buffer', 1)
+		self.registry.create('Other', 'buffer', 1)
+
+	@raises(octo.exceptions.NoSuchBufferError)
+	def test_acquire_raises_exception_for_unknown_buffer(self):
+		self.registry.acquire('Reader', 'buffer')
+
+	@raises(octo.exceptions.NoSuchBufferError)
+	def test_remove_raises_exception_when_not_owner(self):
+		self.registry.create('Owner', 'buffer', 1)
+		self.registry.remove('Reader', 'buffer')
+
+	def test_removed_buffer_stays_valid_until_released(self):
+		self.registry.publish('Owner', 'buffer', b'data')
+		acquired = self.registry.acquire('Reader', 'buffer')
+		self.registry.remove('Owner', 'buffer')
+		self.assertEqual(self.registry.names(), [])
+		self.assertEqual(bytes(acquired), b'data')
+		self.registry.release('Reader', 'buffer')
+		self.assertRaises(ValueError, bytes, acquired)
+
+	def test_release_plugin_removes_owned_buffers_and_releases_views(self):
+		owned = self.registry.publish('Owner', 'owned', b'data')
+		self.registry.publish('Other', 'other', b'data')
+		acquired = self.registry.acquire('Owner', 'other')
+		self.registry.release_plugin('Owner')
+		self.assertEqual(self.registry.names(), ['other'])
+		self.assertRaises(ValueError, bytes, owned)
+		self.assertRaises(ValueError, bytes, acquired)
+
+	def test_close_invalidates_all_views(self):
+		view = self.registry.publish('Owner', 'buffer', b'data')
+		self.registry.close()
+		self.assertEqual(self.registry.names(), [])
+		self.assertRaises(ValueError, bytes, view)
+
+	def test_exported_buffer_stays_orphaned_until_it_can_be_freed(self):
+		self.registry.publish('Owner', 'buffer', b'data')
+		part = self.registry.acquire('Reader', 'buffer')[:2]
+		self.registry.remove('Owner', 'buffer')
+		self.registry.release_plugin('Reader')
+		self.assertEqual(bytes(part), b'da')
+		self.assertEqual(len(self.registry._orphans), 1)
+		part.release()
+		self.registry.release('Reader', 'buffer')
+		self.assertEqual(self.registry._orphans, [])
@@ -0,0 +1,93 @@
+import unittest
+import threading
+import time
+from octo.cache import MethodCache
+from mock import MagicMock, patch
+
+
+class MethodCacheTests(unittest.TestCase):
+	def setUp(self):
+		self.method = MagicMock(side_effect=lambda *args, **kwargs: (args, kwargs))
+
+	def test_repeated_calls_are_served_from_cache(self):
+		cache = MethodCache(self.method)
+		self.assertEqual(cache(1, two=2), ((1,), {'two': 2}))
+		self.assertEqual(cache(1, two=2), ((1,), {'two': 2}))
+		cache(2)
+		self.assertEqual(self.method.call_count, 2)
+		self.assertEqual(cache.stats(), {'hits': 1, 'misses': 2, 'collapsed': 0, 'evictions': 0, 'size': 2})
+
+	def test_least_recently_used_result_is_evicted(self):
+		cache = MethodCache(self.method, maxsize=2)
+		cache(1)
+		cache(2)
+		cache(1)
+		cache(3)
+		cache(1)
+		cache(2)
+		self.assertEqual([c[0][0] for c in self.method.call_args_list], [1, 2, 3, 2])
+		self.assertEqual(cache.evictions, 2)
+
+	@patch('octo.cache.clock')
+	def test_results_expire_after_ttl(self, clock_mock):
+		cache = MethodCache(self.method, ttl=10)
+		clock_mock.return_value = 100
+		cache(1)
+		clock_mock.return_value = 109
+		cache(1)
+		clock_mock.return_value = 111
+		cache(1)
+		self.assertEqual(self.method.call_count, 2)
+
+	def test_positional_arguments_do_not_collide_with_keyword_arguments(self):
+		cache = MethodCache(self.method)
+		self.assertEqual(cache(1, a=2), ((1,), {'a': 2}))
+		self.assertEqual(cache(1, None, ('a', 2)), ((1, None, ('a', 2)), {}))
+		self.assertEqual(self.method.call_count, 2)
+
+	def test_key_function(self):
+		cache = MethodCache(self.method, key=lambda value, **kwargs: value)
+		cache(1, extra=1)
+		self.assertEqual(cache(1, extra=2), ((1,), {'extra': 1}))
+
+	def test_unhashable_arguments_are_not_cached(self):
+		cache = MethodCache(self.method)
+		cache([1])
+		cache([1])
+		self.assertEqual(self.method.call_count, 2)
+		self.assertEqual(cache.stats()['size'], 0)
+
+	def test_exceptions_are_not_cached(self):
+		self.method.side_effect = [ValueError("Boom!"), "Result"]
+		cache = MethodCache(self.method)
+		self.assertRaises(ValueError, cache, 1)
+		self.assertEqual(cache(1), "Result")
+
+	def test_concurrent_identical_calls_are_collapsed(self):
+		started = threading.Event()
+
+		def slow(value):
+			started.set()
+			time.sleep(0.2)
+			return value
+		method = MagicMock(side_effect=slow)
+		cache = MethodCache(method)
+		results = []
+		leader = threading.Thread(target=lambda: results.append(cache(1)))
+		leader.start()
+		started.wait()
+		followers = [threading.Thread(target=lambda: results.append(cache(1))) for i in range(3)]
+		for thread in followers:
+			thread.start()
+		for thread in [leader] + followers:
+			thread.join()
+		self.assertEqual(results, [1, 1, 1, 1])
+		self.assertEqual(method.call_count, 1)
+		self.assertEqual(cache.collapsed, 3)
+
+	def test_clear(self):
+		cache = MethodCache(self.method)
+		cache(1)
+		cache.clear()
+		cache(1)
+		self.assertEqual(self.method.call_count, 2)
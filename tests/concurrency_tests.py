@@ -0,0 +1,102 @@
+import unittest
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import octo
+import octo.exceptions
+
+PLUGIN_INFO = """[Core]
+Name = Plugin {index}
+Module = plugin{index}
+
+[Config]
+Enable = True
+"""
+
+PLUGIN_MODULE = """from octo.plugin import OctoPlugin
+
+class Plugin{index}(OctoPlugin):
+	def ping(self, value):
+		return value
+"""
+
+PLUGINS = 20
+READERS = 4
+WRITERS = 2
+DURATION = 1.0
+
+
+class ConcurrentLifecycleStressTests(unittest.TestCase):
+	"""Hammers the read paths of the manager while plugins are (de)activated"""
+
+	def setUp(self):
+		self.plugin_dir = tempfile.mkdtemp()
+		for index in range(PLUGINS):
+			with open(os.path.join(self.plugin_dir, "plugin{}.octoplugin".format(index)), 'w') as file:
+				file.write(PLUGIN_INFO.format(index=index))
+			with open(os.path.join(self.plugin_dir, "plugin{}.py".format(index)), 'w') as file:
+				file.write(PLUGIN_MODULE.format(index=index))
+		self.manager = octo.Manager(plugin_dirs=[self.plugin_dir]).start()
+		self.names = sorted(self.manager.get_plugins())
+		self.stop = threading.Event()
+		self.errors = []
+		self.reads = [0] * READERS
+
+	def tearDown(self):
+		self.manager.stop()
+		shutil.rmtree(self.plugin_dir)
+
+	def read(self, reader):
+		rng = random.Random(reader)
+		while not self.stop.is_set():
+			try:
+				name = rng.choice(self.names)
+				try:
+					self.assertEqual(self.manager.call(name, 'ping', args=[reader]), reader)
+				except octo.exceptions.NoSuchPluginError:
+					pass
+				for name, result in self.manager.call_many('ping', args=[reader]).items():
+					self.assertEqual(result, reader)
+				for result in self.manager.call_batch([(name, 'ping', [reader]) for name in self.names]):
+					if not isinstance(result, octo.exceptions.NoSuchPluginError):
+						self.assertEqual(result, reader)
+				plugins = self.manager.get_plugins()
+				self.assertEqual(len(list(plugins.items())), len(plugins))
+				self.reads[reader] += 1
+			except Exception as e:
+				self.errors.append(e)
+				return
+
+	def write(self, writer):
+		rng = random.Random(100 + writer)
+		# Writers churn the same plugins, so they race on (de)activating each
+		while not self.stop.is_set():
+			try:
+				name = rng.choice(self.names)
+				if name in self.manager.get_plugins():
+					self.manager.deactivate_plugin(name)
+				else:
+					self.manager.activate_plugin(name)
+			except Exception as e:
+				self.errors.append(e)
+				return
+
+	def test_concurrent_calls_during_activation_churn(self):
+		threads = [threading.Thread(target=self.read, args=(i,)) for i in range(READERS)]
+		threads += [threading.Thread(target=self.write, args=(i,)) for i in range(WRITERS)]
+		for thread in threads:
+			thread.start()
+		time.sleep(DURATION)
+		self.stop.set()
+		for thread in threads:
+			thread.join()
+
+		self.assertEqual(self.errors, [])
+		self.assertTrue(all(self.reads))
+		active = self.manager.get_plugins()
+		for name, plugin in self.manager.get_plugins(include_inactive=True).items():
+			self.assertEqual(name in active, plugin.is_activated)
+		self.assertEqual(sorted(self.manager.call_many('ping', args=[1])), sorted(active))
@@ -0,0 +1,90 @@
+import unittest
+import pickle
+import octo.exceptions
+from octo.config import Option, ConfigSnapshot, compile_config, get_schema, snapshot_class
+from octo.plugin import OctoPlugin
+from nose.tools import raises
+try:
+	from configparser import ConfigParser
+except ImportError:
+	from ConfigParser import SafeConfigParser as ConfigParser  # Python 2
+
+
+class SettingsPlugin(OctoPlugin):
+	config_schema = {
+		'port': Option(int, default=8080),
+		'ratio': Option(float, default=0.5),
+		'debug': Option(bool, default=False),
+		'hosts': Option(list, key='Hosts'),
+		'mode': Option(choices=('fast', 'safe'), default='safe'),
+		'name': Option(section='Core', key='Name'),
+	}
+
+
+def parser(**config):
+	"""Return a ConfigParser with a Core section naming the plugin and the given Config items"""
+	parser = ConfigParser()
+	parser.add_section('Core')
+	parser.set('Core', 'Name', 'Settings')
+	parser.add_section('Config')
+	for key, value in config.items():
+		parser.set('Config', key, value)
+	return parser
+
+
+class ConfigTests(unittest.TestCase):
+	def test_compile_config_converts_values(self):
+		config = compile_config(get_schema(SettingsPlugin), parser(
+			Enable='yes', port='80', ratio='0.25', debug='On', Hosts='a, b,,c', mode='fast'))
+		self.assertEqual(config._asdict(), {'enable': True, 'port': 80, 'ratio': 0.25, 'debug': True,
+		                                    'hosts': ['a', 'b', 'c'], 'mode': 'fast', 'name': 'Settings'})
+
+	def test_compile_config_uses_defaults(self):
+		config = compile_config(get_schema(SettingsPlugin), parser(Hosts='a'))
+		self.assertEqual((config.enable, config.port, config.ratio, config.debug, config.mode),
+		                 (False, 8080, 0.5, False, 'safe'))
+
+	def test_compile_config_reports_all_errors(self):
+		with self.assertRaises(octo.exceptions.InvalidConfigError) as context:
+			compile_config(get_schema(SettingsPlugin), parser(port='eighty', debug='maybe', mode='slow'),
+			               'Settings')
+		message = str(context.exception)
+		for error in ["'Settings'", "Config.Hosts is required", "Config.port is invalid",
+		              "Config.debug is invalid", "Config.mode is invalid"]:
+			self.assertTrue(error in message, error)
+
+	def test_compile_config_accepts_callable_types(self):
+		config = compile_config({'size': Option(lambda value: int(value, 16))}, parser(size='ff'))
+		self.assertEqual(config.size, 255)
+
+	def test_get_schema_includes_enable(self):
+		self.assertEqual(sorted(get_schema(OctoPlugin)), ['enable'])
+		self.assertEqual(len(get_schema(SettingsPlugin)), 7)
+
+	@raises(AttributeError)
+	def test_snapshot_is_read_only(self):
+		config = compile_config(get_schema(OctoPlugin), parser(Enable='True'))
+		config.enable = False
+
+	@raises(AttributeError)
+	def test_snapshot_has_no_dict(self):
+		compile_config(get_schema(OctoPlugin), parser()).__dict__
+
+	def test_snapshot_classes_are_shared_between_equal_schemas(self):
+		first = compile_config(get_schema(OctoPlugin), parser(Enable='True'))
+		second = compile_config(get_schema(OctoPlugin), parser(Enable='True'))
+		self.assertTrue(type(first) is type(second))
+		self.assertTrue(isinstance(first, ConfigSnapshot))
+		self.assertEqual(first, second)
+		self.assertTrue(snapshot_class(['b', 'a']) is snapshot_class(['a', 'b']))
+
+	def test_snapshot_repr(self):
+		self.assertEqual(repr(compile_config(get_schema(OctoPlugin), parser(Enable='True'))),
+		                 "PluginConfig(enable=True)")
+
+	def test_snapshot_can_be_pickled(self):
+		config = compile_config(get_schema(SettingsPlugin), parser(Hosts='a, b', Name='Settings'))
+		self.assertEqual(pickle.loads(pickle.dumps(config)), config)
+		plugin = SettingsPlugin()
+		plugin.plugin_settings = config
+		self.assertEqual(pickle.loads(pickle.dumps(plugin)).plugin_settings, config)
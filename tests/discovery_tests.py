@@ -0,0 +1,77 @@
+import unittest
+import octo
+import os
+import shutil
+import tempfile
+from octo.discovery import CachingPluginFileLocator
+from octo.records import PluginRecord
+from yapsy.PluginFileLocator import PluginFileAnalyzerWithInfoFile
+from mock import patch
+
+PLUGIN_DIR = os.sep.join([os.path.dirname(os.path.realpath(__file__)), 'plugins'])
+
+
+class CachingPluginFileLocatorTests(unittest.TestCase):
+	def setUp(self):
+		self.tmpdir = tempfile.mkdtemp()
+		self.plugin_dir = os.path.join(self.tmpdir, 'plugins')
+		shutil.copytree(PLUGIN_DIR, self.plugin_dir)
+		self.cache_file = os.path.join(self.tmpdir, 'cache.json')
+
+	def tearDown(self):
+		shutil.rmtree(self.tmpdir)
+
+	def locator(self, rebuild=False):
+		locator = CachingPluginFileLocator(self.cache_file,
+		                                   analyzers=[PluginFileAnalyzerWithInfoFile('info_ext', 'octoplugin')],
+		                                   rebuild=rebuild)
+		locator.setPluginPlaces([self.plugin_dir])
+		return locator
+
+	def test_locate_plugins_finds_plugins(self):
+		candidates, count = self.locator().locatePlugins()
+		self.assertEqual(count, 2)
+		self.assertEqual(sorted(info.name for _, _, info in candidates), ['Plugin 1', 'Plugin 2'])
+		self.assertTrue(os.path.exists(self.cache_file))
+
+	def test_warm_start_skips_listing_and_parsing(self):
+		cold, _ = self.locator().locatePlugins()
+		with patch.object(PluginFileAnalyzerWithInfoFile, 'getInfosDictFromPlugin') as parse_mock:
+			with patch('os.listdir', side_effect=os.listdir) as listdir_mock:
+				warm, _ = self.locator().locatePlugins()
+		self.assertFalse(parse_mock.called)
+		self.assertFalse(listdir_mock.called)
+		self.assertEqual([(infofile, filepath, info.name, info.details.get('Core', 'Module'))
+		                  for infofile, filepath, info in cold],
+		                 [(infofile, filepath, info.name, info.details.get('Core', 'Module'))
+		                  for infofile, filepath, info in warm])
+
+	def test_warm_start_returns_plugin_records(self):
+		self.locator().locatePlugins()
+		warm, _ = self.locator().locatePlugins()
+		for infofile, filepath, info in warm:
+			self.assertTrue(isinstance(info, PluginRecord))
+			self.assertEqual(info.config.get('Core', 'Module'), filepath)
+
+	def test_changed_info_file_is_parsed_again(self):
+		self.locator().locatePlugins()
+		with open(os.path.join(self.plugin_dir, 'plugin1.octoplugin'), 'a') as file:
+			file.write("\n[Extra]\nKey = Value\n")
+		candidates, _ = self.locator().locatePlugins()
+		details = dict((info.name, info.details) for _, _, info in candidates)
+		self.assertEqual(details['Plugin 1'].get('Extra', 'Key'), 'Value')
+
+	def test_rebuild_ignores_cache(self):
+		self.locator().locatePlugins()
+		with patch.object(PluginFileAnalyzerWithInfoFile, 'getInfosDictFromPlugin',
+		                  side_effect=PluginFileAnalyzerWithInfoFile.getInfosDictFromPlugin,
+		                  autospec=True) as parse_mock:
+			self.locator(rebuild=True).locatePlugins()
+		self.assertEqual(parse_mock.call_count, 2)
+
+	def test_manager_with_cache_file_loads_plugins(self):
+		for i in range(2):
+			manager = octo.Manager(plugin_dirs=[self.plugin_dir], cache_file=self.cache_file).start()
+			self.assertEqual(len(manager.get_plugins(include_inactive=True)), 2)
+			self.assertEqual(len(manager.get_plugins(include_inactive=False)), 1)
+			manager.stop()
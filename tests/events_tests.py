@@ -0,0 +1,57 @@
+import unittest
+from octo.events import EventBus
+from mock import MagicMock
+
+
+class EventBusTests(unittest.TestCase):
+	def setUp(self):
+		self.bus = EventBus()
+		self.handler1 = MagicMock(return_value=1)
+		self.handler2 = MagicMock(return_value=2)
+		self.bus.subscribe('Plugin 1', 'topic', self.handler1)
+		self.bus.subscribe('Plugin 2', 'topic', self.handler2)
+
+	def test_publish_calls_only_subscribers_of_topic(self):
+		other = MagicMock()
+		self.bus.subscribe('Plugin 3', 'other topic', other)
+		self.assertEqual(self.bus.publish('topic', args=[1], kwargs={'two': 2}), {'Plugin 1': 1, 'Plugin 2': 2})
+		self.handler1.assert_called_once_with(1, two=2)
+		self.assertFalse(other.called)
+
+	def test_publish_without_subscribers_returns_empty_dict(self):
+		self.assertEqual(self.bus.publish('no such topic'), {})
+
+	def test_publish_returns_exception_raised_by_handler(self):
+		self.handler1.side_effect = ValueError("Boom!")
+		results = self.bus.publish('topic')
+		self.assertTrue(isinstance(results['Plugin 1'], ValueError))
+		self.assertEqual(results['Plugin 2'], 2)
+
+	def test_subscribe_replaces_existing_subscription(self):
+		handler = MagicMock(return_value=3)
+		self.bus.subscribe('Plugin 1', 'topic', handler)
+		self.assertEqual(self.bus.publish('topic'), {'Plugin 1': 3, 'Plugin 2': 2})
+
+	def test_unsubscribe_topic(self):
+		self.bus.subscribe('Plugin 1', 'other topic', self.handler1)
+		self.bus.unsubscribe('Plugin 1', 'topic')
+		self.assertEqual(self.bus.subscribers('topic'), ['Plugin 2'])
+		self.assertEqual(self.bus.subscribers('other topic'), ['Plugin 1'])
+
+	def test_unsubscribe_all_topics(self):
+		self.bus.subscribe('Plugin 1', 'other topic', self.handler1)
+		self.bus.unsubscribe('Plugin 1')
+		self.assertEqual(self.bus.subscribers('topic'), ['Plugin 2'])
+		self.assertEqual(self.bus.subscribers('other topic'), [])
+
+	def test_publish_queued_delivers_in_background(self):
+		for i in range(10):
+			self.bus.publish_queued('topic', args=[i])
+		self.bus.flush()
+		self.assertEqual([c[0][0] for c in self.handler1.call_args_list], list(range(10)))
+		self.bus.close()
+
+	def test_close_delivers_outstanding_events(self):
+		self.bus.publish_queued('topic')
+		self.bus.close()
+		self.assertTrue(self.handler2.called)
@@ -0,0 +1,48 @@
+import unittest
+import os
+import subprocess
+import sys
+import octo
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def imported_modules(statement):
+	"""
+	Run statement in a new interpreter and return the names of the octo and
+	yapsy modules it imported
+
+	octo._version is left out, as it only exists in built packages.
+	"""
+	code = "{}\nimport sys\nprint(' '.join(sorted(sys.modules)))".format(statement)
+	output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT, universal_newlines=True)
+	return [name for name in output.split() if name.split('.')[0] in ('octo', 'yapsy') and name != 'octo._version']
+
+
+class InitTests(unittest.TestCase):
+	def test_version_matches_version_file(self):
+		with open(os.path.join(ROOT, 'octo', 'version')) as file:
+			self.assertEqual(octo.__version__, file.read().strip())
+
+	@unittest.skipIf(sys.version_info < (3, 7), "octo imports its manager eagerly without PEP 562")
+	def test_import_does_not_import_manager(self):
+		self.assertEqual(imported_modules("import octo"), ['octo'])
+
+	@unittest.skipIf(sys.version_info < (3, 7), "octo imports its manager eagerly without PEP 562")
+	def test_import_exceptions_does_not_import_manager(self):
+		self.assertEqual(imported_modules("import octo.exceptions"), ['octo', 'octo.exceptions'])
+
+	def test_manager_attributes_are_imported_on_access(self):
+		modules = imported_modules("import octo\nassert octo.run is octo.manager.run")
+		self.assertTrue('octo.manager' in modules)
+
+	def test_lazy_attributes(self):
+		import octo.manager
+		self.assertTrue(octo.Manager is octo.manager.Manager)
+		self.assertTrue(octo.run is octo.manager.run)
+		self.assertTrue(octo.stop is octo.manager.stop)
+		self.assertTrue('Manager' in dir(octo))
+
+	def test_unknown_attribute_raises_attribute_error(self):
+		with self.assertRaises(AttributeError):
+			octo.no_such_attribute
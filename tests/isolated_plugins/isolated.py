@@ -0,0 +1,22 @@
+import os
+from octo.plugin import OctoPlugin, subscribe
+
+class Isolated(OctoPlugin):
+	def pid(self):
+		return os.getpid()
+
+	def square(self, value):
+		return value * value
+
+	def config(self):
+		return self.plugin_config.get('Core', 'Name')
+
+	@subscribe('ping')
+	def on_ping(self):
+		return os.getpid()
+
+	def fail(self):
+		raise ValueError("Boom!")
+
+	def crash(self):
+		os._exit(1)
@@ -0,0 +1,48 @@
+import unittest
+import os
+import octo
+import octo.exceptions
+from octo.isolation import ProcessPluginProxy
+
+PLUGIN_DIR = os.sep.join([os.path.dirname(os.path.realpath(__file__)), 'isolated_plugins'])
+
+
+class ProcessIsolationTests(unittest.TestCase):
+	def setUp(self):
+		self.manager = octo.Manager(plugin_dirs=[PLUGIN_DIR]).start()
+		self.proxy = self.manager.get_plugins()['Isolated'].plugin_object
+
+	def tearDown(self):
+		self.manager.stop()
+
+	def test_plugin_object_is_proxy(self):
+		self.assertTrue(isinstance(self.proxy, ProcessPluginProxy))
+		self.assertTrue(self.proxy.is_activated)
+
+	def test_calls_run_in_worker_process(self):
+		self.assertNotEqual(self.manager.call('Isolated', 'pid'), os.getpid())
+		self.assertEqual(self.manager.call('Isolated', 'square', args=[7]), 49)
+		self.assertEqual(self.manager.call('Isolated', 'config'), 'Isolated')
+
+	def test_call_many_reaches_worker(self):
+		self.assertEqual(self.manager.call_many('square', args=[3]), {'Isolated': 9})
+		self.assertEqual(self.manager.call_many('no_such_method'), {})
+
+	def test_subscribed_methods_receive_events_in_worker(self):
+		self.assertEqual(self.manager.get_subscribers('ping'), ['Isolated'])
+		self.assertEqual(self.manager.publish('ping'), {'Isolated': self.manager.call('Isolated', 'pid')})
+
+	def test_exceptions_are_raised_in_caller(self):
+		self.assertRaises(ValueError, self.manager.call, 'Isolated', 'fail')
+		self.assertEqual(self.manager.call('Isolated', 'square', args=[2]), 4)
+
+	def test_crashed_worker_is_restarted(self):
+		pid = self.manager.call('Isolated', 'pid')
+		self.assertRaises(octo.exceptions.WorkerCrashedError, self.manager.call, 'Isolated', 'crash')
+		self.assertTrue(self.proxy.is_alive())
+		self.assertNotEqual(self.manager.call('Isolated', 'pid'), pid)
+
+	def test_deactivation_stops_worker(self):
+		self.manager.deactivate_plugin('Isolated')
+		self.assertFalse(self.proxy.is_alive())
+		self.assertFalse(self.proxy.is_activated)
@@ -0,0 +1,142 @@
+import unittest
+import threading
+import time
+import octo.exceptions
+from octo.mailbox import Mailbox
+from nose.tools import raises
+
+
+def wait_for(condition, timeout=2):
+	"""Wait until condition() is true, for at most timeout seconds"""
+	end = time.time() + timeout
+	while not condition() and time.time() < end:
+		time.sleep(0.005)
+	return condition()
+
+
+class MailboxTests(unittest.TestCase):
+	def setUp(self):
+		self.batches = []
+		self.mailboxes = []
+
+	def tearDown(self):
+		for mailbox in self.mailboxes:
+			mailbox.close(drain=False)
+
+	def mailbox(self, handler=None, **options):
+		mailbox = Mailbox('Plugin 1', handler or self.batches.append, **options)
+		self.mailboxes.append(mailbox)
+		return mailbox
+
+	def blocked_mailbox(self, **options):
+		"""Return a mailbox whose handler blocks on the returned event, with one message being delivered"""
+		release = threading.Event()
+
+		def handler(batch):
+			release.wait()
+			self.batches.append(batch)
+		mailbox = self.mailbox(handler, batch_size=1, max_latency=0, **options)
+		mailbox.put('first')
+		self.assertTrue(wait_for(lambda: mailbox.depth() == 0))
+		return mailbox, release
+
+	def test_full_batches_are_delivered_in_order(self):
+		mailbox = self.mailbox(batch_size=3, max_latency=60)
+		self.assertEqual(mailbox.put_many(range(7)), 7)
+		self.assertTrue(wait_for(lambda: len(self.batches) == 2))
+		self.assertEqual(self.batches, [[0, 1, 2], [3, 4, 5]])
+		self.assertEqual(mailbox.depth(), 1)
+
+	def test_partial_batch_is_delivered_after_max_latency(self):
+		mailbox = self.mailbox(batch_size=100, max_latency=0.02)
+		mailbox.put('message')
+		self.assertTrue(wait_for(lambda: self.batches == [['message']]))
+
+	def test_flush_waits_for_delivery(self):
+		mailbox = self.mailbox(batch_size=10, max_latency=0.01)
+		mailbox.put_many(range(25))
+		self.assertTrue(mailbox.flush(timeout=2))
+		self.assertEqual(sum(self.batches, []), list(range(25)))
+		stats = mailbox.stats()
+		self.assertEqual(stats['received'], 25)
+		self.assertEqual(stats['delivered'], 25)
+		self.assertEqual(stats['batches'], len(self.batches))
+
+	def test_drop_policy_discards_new_messages(self):
+		mailbox, release = self.blocked_mailbox(maxsize=2, policy='drop')
+		self.assertEqual(mailbox.put_many(['a', 'b', 'c', 'd']), 2)
+		self.assertFalse(mailbox.put('e'))
+		release.set()
+		mailbox.flush(timeout=2)
+		self.assertEqual(self.batches, [['first'], ['a'], ['b']])
+		self.assertEqual(mailbox.stats()['dropped'], 3)
+
+	def test_shed_policy_discards_oldest_messages(self):
+		mailbox, release = self.blocked_mailbox(maxsize=2, policy='shed')
+		self.assertEqual(mailbox.put_many(['a', 'b', 'c', 'd']), 4)
+		release.set()
+		mailbox.flush(timeout=2)
+		self.assertEqual(self.batches, [['first'], ['c'], ['d']])
+		self.assertEqual(mailbox.stats()['shed'], 2)
+
+	def test_block_policy_waits_for_room(self):
+		mailbox, release = self.blocked_mailbox(maxsize=1)
+		mailbox.put('a')
+		sent = []
+		sender = threading.Thread(target=lambda: sent.append(mailbox.put('b')))
+		sender.start()
+		time.sleep(0.02)
+		self.assertEqual(sent, [])
+		release.set()
+		sender.join(2)
+		self.assertEqual(sent, [True])
+		mailbox.flush(timeout=2)
+		self.assertEqual(self.batches, [['first'], ['a'], ['b']])
+		self.assertEqual(mailbox.stats()['blocked'], 1)
+
+	@raises(octo.exceptions.MailboxFullError)
+	def test_block_policy_raises_exception_after_timeout(self):
+		mailbox, release = self.blocked_mailbox(maxsize=1)
+		mailbox.put('a')
+		try:
+			mailbox.put('b', timeout=0.01)
+		finally:
+			release.set()
+
+	def test_handler_errors_are_counted(self):
+		def fail(batch):
+			raise ValueError("Boom!")
+		mailbox = self.mailbox(fail, max_latency=0)
+		mailbox.put('message')
+		self.assertTrue(wait_for(lambda: mailbox.stats()['errors'] == 1))
+
+	def test_close_delivers_outstanding_messages(self):
+		mailbox = self.mailbox(batch_size=100, max_latency=60)
+		mailbox.put_many(range(3))
+		mailbox.close()
+		self.assertEqual(self.batches, [[0, 1, 2]])
+		self.assertFalse(mailbox.put(3))
+
+	def test_close_without_drain_drops_outstanding_messages(self):
+		mailbox, release = self.blocked_mailbox()
+		mailbox.put_many(range(3))
+		mailbox.close(drain=False)
+		release.set()
+		self.assertEqual(mailbox.stats()['dropped'], 3)
+		self.assertEqual(mailbox.depth(), 0)
+
+	def test_close_wakes_blocked_senders(self):
+		mailbox, release = self.blocked_mailbox(maxsize=1)
+		mailbox.put('a')
+		sent = []
+		sender = threading.Thread(target=lambda: sent.append(mailbox.put('b')))
+		sender.start()
+		time.sleep(0.02)
+		mailbox.close(drain=False)
+		sender.join(2)
+		release.set()
+		self.assertEqual(sent, [False])
+
+	@raises(ValueError)
+	def test_unknown_policy_raises_value_error(self):
+		Mailbox('Plugin 1', self.batches.append, policy='ignore')
@@ -2,8 +2,11 @@ import unittest
 import octo
 import octo.plugin
 import octo.exceptions
+import octo.config
+import octo.records
 import os
 import signal
+import time
 import yapsy
 from nose.tools import raises
 from mock import patch, Mock, MagicMock, create_autospec, call
@@ -12,6 +15,66 @@ try:
 except ImportError:
 	from ConfigParser import SafeConfigParser as ConfigParser  # Python 2
 
+
+
+class SubscriberPlugin(octo.plugin.OctoPlugin):
+	@octo.plugin.subscribe('topic', 'other topic')
+	def on_topic(self, value):
+		return value * 2
+
+
+class CachingPlugin(octo.plugin.OctoPlugin):
+	def __init__(self):
+		super(CachingPlugin, self).__init__()
+		self.calls = 0
+
+	@octo.plugin.cached(maxsize=10)
+	def lookup(self, value):
+		self.calls += 1
+		return value * 2
+
+
+class BatchPlugin(octo.plugin.OctoPlugin):
+	def __init__(self):
+		super(BatchPlugin, self).__init__()
+		self.batches = []
+
+	def double(self, value):
+		return value * 2
+
+	def double_batch(self, calls):
+		self.batches.append(calls)
+		return [args[0] * 2 if args[0] is not None else ValueError("None") for args, kwargs in calls]
+
+	def triple(self, value, offset=0):
+		return value * 3 + offset
+
+
+class PeriodicPlugin(octo.plugin.OctoPlugin):
+	def __init__(self):
+		super(PeriodicPlugin, self).__init__()
+		self.ticks = 0
+
+	@octo.plugin.periodic(interval=0.01)
+	def tick(self):
+		self.ticks += 1
+
+
+class ReceiverPlugin(octo.plugin.OctoPlugin):
+	mailbox_options = {'batch_size': 2, 'max_latency': 60}
+
+	def __init__(self):
+		super(ReceiverPlugin, self).__init__()
+		self.batches = []
+
+	def on_messages(self, batch):
+		self.batches.append(batch)
+
+
+class SettingsPlugin(octo.plugin.OctoPlugin):
+	config_schema = {'port': octo.config.Option(int, default=8080)}
+
+
 PLUGIN_DIR = os.sep.join([os.path.dirname(os.path.realpath(__file__)), 'plugins'])
 
 
@@ -25,6 +88,18 @@ def mockplugin(name="Mock plugin", enable=True, callback=None):
 	plugin.details.set('Config', 'Enable', str(enable))
 	plugin.plugin_object = MagicMock()
 	plugin.plugin_object.plugin_object = None
+	plugin.plugin_object.is_activated = False
+
+	# Activating the plugin object calls the mocked hooks of the plugin
+	def activate():
+		plugin.activate()
+		plugin.is_activated = plugin.plugin_object.is_activated = True
+
+	def deactivate():
+		plugin.deactivate()
+		plugin.is_activated = plugin.plugin_object.is_activated = False
+	plugin.plugin_object.activate = activate
+	plugin.plugin_object.deactivate = deactivate
 	if callback is None:
 		del plugin.plugin_object.callback
 	else:
@@ -32,13 +107,27 @@ def mockplugin(name="Mock plugin", enable=True, callback=None):
 	return plugin
 
 
+def set_requires(plugin, requires):
+	"""Set the Core.Requires config item of a (mock) plugin"""
+	if not plugin.details.has_section('Core'):
+		plugin.details.add_section('Core')
+	plugin.details.set('Core', 'Requires', requires)
+
+
+def set_workers(plugin, workers):
+	"""Set the Core.Workers config item of a (mock) plugin"""
+	if not plugin.details.has_section('Core'):
+		plugin.details.add_section('Core')
+	plugin.details.set('Core', 'Workers', workers)
+
+
 class PluginManagerMock(Mock):
 	"""Fake PluginManager class which returns predefined mock plugin objects"""
 
 	def raise_exception(self):
 		raise Exception("Boom!")
 
-	def collectPlugins(self):
+	def locatePlugins(self):
 		self.plugin_list = [mockplugin('Plugin 0'),
 		                    mockplugin('Plugin 1', callback=MagicMock(return_value="Called")),
 		                    mockplugin('Plugin 2', enable=False),
@@ -46,28 +135,21 @@ class PluginManagerMock(Mock):
 		                    mockplugin('Plugin 4', callback=lambda *args, **kwargs: "{!r}\t{!r}".format(args, kwargs)),
 		                    mockplugin('Plugin 5', callback=lambda: "Called")]
 
-	def getAllPlugins(self):
-		return self.plugin_list
+	def getPluginCandidates(self):
+		return [(os.path.join(os.sep, 'plugins', 'plugin{}.octoplugin'.format(i)),
+		         os.path.join(os.sep, 'plugins', 'plugin{}'.format(i)), plugin)
+		        for i, plugin in enumerate(self.plugin_list)]
 
-	def activatePluginByName(self, name, category=None):
-		if category is not None:
-			raise NotImplementedError()
+	def loadPlugins(self, callback=None, callback_after=None):
 		for plugin in self.plugin_list:
-			if plugin.name == name:
-				plugin.activate()
-				plugin.is_activated = True
-				return plugin
-		return None
+			if callback is not None:
+				callback(plugin)
+			if callback_after is not None:
+				callback_after(plugin)
+		return self.plugin_list
 
-	def deactivatePluginByName(self, name, category=None):
-		if category is not None:
-			raise NotImplementedError()
-		for plugin in self.plugin_list:
-			if plugin.name == name:
-				plugin.deactivate()
-				plugin.is_activated = False
-				return plugin
-		return None
+	def getAllPlugins(self):
+		return self.plugin_list
 
 	def getPluginByName(self, name, category=None):
 		if category is not None:
@@ -106,6 +188,149 @@ class ManagerTests(unittest.TestCase):
 		manager.start()
 		self.assertTrue(isinstance(plugin1.plugin_object.plugin_config, ConfigParser))
 
+	def test_manager_compiles_plugin_settings_on_bind(self, plugin_manager_mock):
+		manager = octo.Manager()
+		plugin = manager.get_plugins(include_inactive=True)['Plugin 0']
+		plugin.plugin_object = SettingsPlugin()
+		plugin.details.set('Config', 'port', '80')
+		manager._bind_plugin(plugin)
+		self.assertEqual(plugin.settings, plugin.plugin_object.plugin_settings)
+		self.assertEqual(plugin.plugin_object.plugin_settings._asdict(), {'enable': True, 'port': 80})
+
+	@raises(octo.exceptions.InvalidConfigError)
+	def test_manager_bind_raises_exception_on_invalid_config(self, plugin_manager_mock):
+		manager = octo.Manager()
+		plugin = manager.get_plugins(include_inactive=True)['Plugin 0']
+		plugin.plugin_object = SettingsPlugin()
+		plugin.details.set('Config', 'port', 'eighty')
+		manager._bind_plugin(plugin)
+
+	def test_manager_start_uses_compiled_enable(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.get_plugins(include_inactive=True)['Plugin 0'].details.set('Config', 'Enable', 'False')
+		manager.start()
+		self.assertTrue('Plugin 0' in manager.get_plugins())
+
+	def test_manager_schedules_periodic_methods_while_active(self, plugin_manager_mock):
+		manager = octo.Manager()
+		plugin_object = PeriodicPlugin()
+		manager.get_plugins(include_inactive=True)['Plugin 0'].plugin_object = plugin_object
+		manager.start()
+		self.assertEqual([task.name for task in manager.get_tasks('Plugin 0')], ['tick'])
+		end = time.time() + 2
+		while plugin_object.ticks < 2 and time.time() < end:
+			time.sleep(0.01)
+		self.assertTrue(plugin_object.ticks >= 2)
+		manager.deactivate_plugin('Plugin 0')
+		self.assertEqual(manager.get_tasks(), [])
+		time.sleep(0.02)
+		ticks = plugin_object.ticks
+		time.sleep(0.05)
+		self.assertEqual(plugin_object.ticks, ticks)
+		manager.stop()
+
+	def test_manager_activate_plugin_ignores_active_plugin(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.get_plugins(include_inactive=True)['Plugin 0'].plugin_object = PeriodicPlugin()
+		manager.start()
+		plugin_object = manager.get_plugins()['Plugin 0'].plugin_object
+		with patch.object(plugin_object, 'activate') as mock_method:
+			manager.activate_plugin('Plugin 0')
+		self.assertEqual(mock_method.call_count, 0)
+		self.assertEqual(len(manager.get_tasks('Plugin 0')), 1)
+		manager.stop()
+
+	def test_manager_schedule_accepts_plugin_during_activation(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.get_plugins(include_inactive=True)['Plugin 0'].activate.side_effect = \
+			lambda: manager.schedule('Plugin 0', lambda: None, interval=60)
+		manager.start()
+		self.assertEqual(len(manager.get_tasks('Plugin 0')), 1)
+		manager.stop()
+
+	def test_manager_cancels_tasks_of_failed_activation(self, plugin_manager_mock):
+		manager = octo.Manager()
+
+		def activate():
+			manager.schedule('Plugin 0', lambda: None, interval=60)
+			raise ValueError("Boom!")
+		manager.get_plugins(include_inactive=True)['Plugin 0'].activate.side_effect = activate
+		self.assertRaises(ValueError, manager.activate_plugin, 'Plugin 0')
+		self.assertEqual(manager.get_tasks(), [])
+		self.assertEqual(manager.get_plugins(), {})
+
+	def test_manager_schedule_runs_task_until_plugin_deactivated(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		task = manager.schedule('Plugin 1', lambda: None, interval=60)
+		self.assertEqual(manager.get_tasks('Plugin 1'), [task])
+		manager.deactivate_plugin('Plugin 1')
+		self.assertTrue(task.cancelled)
+		manager.stop()
+
+	def test_manager_cancel_tasks(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		task = manager.schedule('Plugin 1', lambda: None, cron='@hourly')
+		manager.cancel_tasks('Plugin 1')
+		self.assertTrue(task.cancelled)
+		self.assertEqual(manager.get_tasks(), [])
+		manager.stop()
+
+	@raises(octo.exceptions.NoSuchPluginError)
+	def test_manager_schedule_raises_exception_for_inactive_plugin(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.schedule('Plugin 2', lambda: None, interval=60)
+
+	def test_manager_delivers_messages_in_batches(self, plugin_manager_mock):
+		manager = octo.Manager(mailbox_options={'batch_size': 100, 'max_latency': 0})
+		plugin_object = ReceiverPlugin()
+		manager.get_plugins(include_inactive=True)['Plugin 0'].plugin_object = plugin_object
+		manager.start()
+		self.assertTrue(manager.send('Plugin 0', 'a'))
+		self.assertEqual(manager.send_many('Plugin 0', ['b', 'c', 'd']), 3)
+		manager.flush_mailbox('Plugin 0', timeout=2)
+		self.assertEqual(plugin_object.batches, [['a', 'b'], ['c', 'd']])
+		stats = manager.get_mailbox_stats()['Plugin 0']
+		self.assertEqual((stats['received'], stats['delivered'], stats['depth']), (4, 4, 0))
+		manager.stop()
+
+	def test_manager_delivers_outstanding_messages_on_deactivate(self, plugin_manager_mock):
+		manager = octo.Manager()
+		plugin_object = ReceiverPlugin()
+		manager.get_plugins(include_inactive=True)['Plugin 0'].plugin_object = plugin_object
+		manager.start()
+		manager.send('Plugin 0', 'a')
+		manager.deactivate_plugin('Plugin 0')
+		self.assertEqual(plugin_object.batches, [['a']])
+		self.assertEqual(manager.get_mailbox_stats(), {})
+		manager.stop()
+
+	def test_manager_open_mailbox_closes_previous_mailbox(self, plugin_manager_mock):
+		manager = octo.Manager()
+		plugin_object = ReceiverPlugin()
+		plugin = manager.get_plugins(include_inactive=True)['Plugin 0']
+		plugin.plugin_object = plugin_object
+		manager.start()
+		manager.send('Plugin 0', 'a')
+		previous = manager._mailboxes['Plugin 0']
+		manager._open_mailbox(plugin)
+		self.assertFalse(previous.put('b'))
+		self.assertEqual(plugin_object.batches, [['a']])
+		self.assertFalse(manager._mailboxes['Plugin 0'] is previous)
+		manager.stop()
+
+	@raises(octo.exceptions.NoSuchMailboxError)
+	def test_manager_send_raises_exception_without_on_messages(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		manager.send('Plugin 1', 'message')
+
+	@raises(octo.exceptions.NoSuchPluginError)
+	def test_manager_send_raises_exception_for_inactive_plugin(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.send('Plugin 2', 'message')
+
 	def test_manager_get_plugins_returns_five_active(self, plugin_manager_mock):
 		manager = octo.Manager()
 		manager.start()
@@ -123,26 +348,171 @@ class ManagerTests(unittest.TestCase):
 		self.assertTrue('Plugin 1' in plugins.keys())
 		self.assertTrue('Plugin 2' in plugins.keys())
 
+	def test_manager_get_plugins_returns_read_only_snapshot(self, plugin_manager_mock):
+		manager = octo.Manager()
+		plugins = manager.get_plugins()
+		with self.assertRaises(TypeError):
+			plugins['Plugin 9'] = mockplugin('Plugin 9')
+		manager.start()
+		self.assertEqual(len(plugins), 0)
+		self.assertEqual(len(manager.get_plugins()), 5)
+
+	def test_manager_start_publishes_one_snapshot_per_wave(self, plugin_manager_mock):
+		manager = octo.Manager()
+		with patch('octo.manager._Snapshot', wraps=octo.manager._Snapshot) as mock_snapshot:
+			manager.start(parallel=False)
+		self.assertEqual(mock_snapshot.call_count, 1)
+		self.assertEqual(len(manager.get_plugins()), 5)
+
+	def test_manager_stop_publishes_one_snapshot_per_wave(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		with patch('octo.manager._Snapshot', wraps=octo.manager._Snapshot) as mock_snapshot:
+			manager.stop()
+		self.assertEqual(mock_snapshot.call_count, 1)
+		self.assertEqual(len(manager.get_plugins()), 0)
+		self.assertEqual(manager.get_shutdown_report(), {'abandoned': [], 'errors': {}})
+
+	def test_manager_deactivate_plugin_removes_it_from_active_plugins(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		manager.deactivate_plugin('Plugin 1')
+		self.assertFalse('Plugin 1' in manager.get_plugins())
+		self.assertTrue('Plugin 1' in manager.get_plugins(include_inactive=True))
+		manager.activate_plugin('Plugin 1')
+		self.assertTrue('Plugin 1' in manager.get_plugins())
+
 	def test_manager_start_calls_activate(self, plugin_manager_mock):
 		manager = octo.Manager()
-		with patch.object(manager.plugin_manager, 'activatePluginByName') as mock_method:
+		manager.start()
+		activated = [name for name, plugin in manager.get_plugins(include_inactive=True).items()
+		             if plugin.activate.called]
+		self.assertEqual(sorted(activated), ['Plugin 0', 'Plugin 1', 'Plugin 3', 'Plugin 4', 'Plugin 5'])
+
+	def test_manager_start_activates_requirements_first(self, plugin_manager_mock):
+		manager = octo.Manager()
+		plugins = manager.get_plugins(include_inactive=True)
+		set_requires(plugins['Plugin 0'], 'Plugin 1, Plugin 3')
+		set_requires(plugins['Plugin 1'], 'Plugin 4')
+		self.assertEqual(manager._activation_waves(['Plugin 0', 'Plugin 1', 'Plugin 3', 'Plugin 4', 'Plugin 5']),
+		                 [['Plugin 3', 'Plugin 4', 'Plugin 5'], ['Plugin 1'], ['Plugin 0']])
+		order = []
+		for name, plugin in plugins.items():
+			plugin.activate.side_effect = lambda name=name: order.append(name)
+		manager.start()
+		self.assertTrue(order.index('Plugin 4') < order.index('Plugin 1') < order.index('Plugin 0'))
+		self.assertEqual(len(manager.get_plugins()), 5)
+
+	def test_manager_start_does_not_activate_on_application_executor(self, plugin_manager_mock):
+		executor = Mock()
+		manager = octo.Manager(executor=executor)
+		manager.start()
+		self.assertEqual(executor.submit.call_count, 0)
+		self.assertEqual(len(manager.get_plugins()), 5)
+
+	@raises(octo.exceptions.DependencyError)
+	def test_manager_start_raises_exception_on_missing_requirement(self, plugin_manager_mock):
+		manager = octo.Manager()
+		set_requires(manager.get_plugins(include_inactive=True)['Plugin 0'], 'Plugin 2')
+		try:
 			manager.start()
-		self.assertEqual(sorted(mock_method.mock_calls), sorted([call('Plugin 0'),
-		                                                         call('Plugin 1'),
-		                                                         call('Plugin 3'),
-		                                                         call('Plugin 4'),
-		                                                         call('Plugin 5')]))
+		finally:
+			self.assertEqual(len(manager.get_plugins()), 0)
+
+	@raises(octo.exceptions.DependencyError)
+	def test_manager_start_raises_exception_on_requirement_cycle(self, plugin_manager_mock):
+		manager = octo.Manager()
+		plugins = manager.get_plugins(include_inactive=True)
+		set_requires(plugins['Plugin 0'], 'Plugin 1')
+		set_requires(plugins['Plugin 1'], 'Plugin 0')
+		manager.start()
+
+	def test_manager_start_only_activates_plugins_of_worker(self, plugin_manager_mock):
+		manager = octo.Manager()
+		plugins = manager.get_plugins(include_inactive=True)
+		set_workers(plugins['Plugin 0'], '0')
+		set_workers(plugins['Plugin 1'], '1, 2')
+		manager.start(worker=1)
+		self.assertEqual(sorted(manager.get_plugins()), ['Plugin 1', 'Plugin 3', 'Plugin 4', 'Plugin 5'])
+		self.assertEqual(manager.get_worker(), 1)
+
+	def test_manager_start_ignores_workers_without_worker(self, plugin_manager_mock):
+		manager = octo.Manager()
+		set_workers(manager.get_plugins(include_inactive=True)['Plugin 0'], '3')
+		manager.start()
+		self.assertTrue('Plugin 0' in manager.get_plugins())
+		self.assertEqual(manager.get_worker(), None)
+
+	@raises(octo.exceptions.InvalidConfigError)
+	def test_manager_start_raises_exception_on_invalid_workers(self, plugin_manager_mock):
+		manager = octo.Manager()
+		set_workers(manager.get_plugins(include_inactive=True)['Plugin 0'], 'first')
+		manager.start(worker=0)
+
+	def test_manager_get_sockets_returns_copy_of_sockets(self, plugin_manager_mock):
+		sock = Mock()
+		manager = octo.Manager(sockets={'127.0.0.1:8080': sock})
+		sockets = manager.get_sockets()
+		self.assertEqual(sockets, {'127.0.0.1:8080': sock})
+		sockets.clear()
+		self.assertEqual(manager.get_sockets(), {'127.0.0.1:8080': sock})
 
 	def test_manager_stop_calls_deactivate(self, plugin_manager_mock):
 		manager = octo.Manager()
 		manager.start()
-		with patch.object(manager.plugin_manager, 'deactivatePluginByName') as mock_method:
-			manager.stop()
-		self.assertEqual(sorted(mock_method.mock_calls), sorted([call('Plugin 0'),
-		                                                         call('Plugin 1'),
-		                                                         call('Plugin 3'),
-		                                                         call('Plugin 4'),
-		                                                         call('Plugin 5')]))
+		manager.stop()
+		deactivated = [name for name, plugin in manager.get_plugins(include_inactive=True).items()
+		               if plugin.deactivate.called]
+		self.assertEqual(sorted(deactivated), ['Plugin 0', 'Plugin 1', 'Plugin 3', 'Plugin 4', 'Plugin 5'])
+
+	def test_manager_stop_deactivates_in_reverse_requirement_order(self, plugin_manager_mock):
+		manager = octo.Manager()
+		plugins = manager.get_plugins(include_inactive=True)
+		set_requires(plugins['Plugin 0'], 'Plugin 1, Plugin 3')
+		set_requires(plugins['Plugin 1'], 'Plugin 4')
+		manager.start()
+		self.assertEqual(manager._deactivation_waves(list(manager.get_plugins())),
+		                 [['Plugin 0', 'Plugin 5'], ['Plugin 1', 'Plugin 3'], ['Plugin 4']])
+		order = []
+		for name, plugin in plugins.items():
+			plugin.deactivate.side_effect = lambda name=name: order.append(name)
+		manager.stop()
+		self.assertTrue(order.index('Plugin 0') < order.index('Plugin 1') < order.index('Plugin 4'))
+		self.assertTrue(order.index('Plugin 0') < order.index('Plugin 3'))
+		self.assertEqual(len(manager.get_plugins()), 0)
+		self.assertEqual(manager.get_shutdown_report(), {'abandoned': [], 'errors': {}})
+
+	def test_manager_stop_abandons_plugins_exceeding_plugin_timeout(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		manager.get_plugins()['Plugin 1'].deactivate.side_effect = lambda: time.sleep(5)
+		started = time.time()
+		manager.stop(plugin_timeout=0.2)
+		self.assertTrue(time.time() - started < 2)
+		self.assertEqual(manager.get_shutdown_report()['abandoned'], ['Plugin 1'])
+		self.assertEqual(len(manager.get_plugins()), 0)
+
+	def test_manager_stop_abandons_plugins_after_timeout(self, plugin_manager_mock):
+		manager = octo.Manager(shutdown_timeout=0.2)
+		plugins = manager.get_plugins(include_inactive=True)
+		set_requires(plugins['Plugin 0'], 'Plugin 1')
+		manager.start()
+		manager.get_plugins()['Plugin 0'].deactivate.side_effect = lambda: time.sleep(5)
+		started = time.time()
+		manager.stop()
+		self.assertTrue(time.time() - started < 2)
+		self.assertEqual(sorted(manager.get_shutdown_report()['abandoned']), ['Plugin 0', 'Plugin 1'])
+		self.assertEqual(len(manager.get_plugins()), 0)
+
+	def test_manager_stop_reports_deactivation_errors(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		manager.get_plugins()['Plugin 3'].deactivate.side_effect = ValueError("Boom!")
+		manager.stop(parallel=False)
+		errors = manager.get_shutdown_report()['errors']
+		self.assertEqual(list(errors), ['Plugin 3'])
+		self.assertTrue(isinstance(errors['Plugin 3'], ValueError))
+		self.assertEqual(len(manager.get_plugins()), 0)
 
 	def test_start_initializes_manager_stop_resets_instance(self, plugin_manager_mock):
 		self.assertEqual(octo.instance, None)
@@ -156,6 +526,11 @@ class ManagerTests(unittest.TestCase):
 			octo.run(plugin_dirs=[])
 		self.assertEqual(mock_method.mock_calls, [call(plugin_dirs=[]), call().start()])
 
+	def test_start_with_watch_calls_instance_watch(self, plugin_manager_mock):
+		with patch.object(octo.manager, 'Manager') as mock_method:
+			octo.run(plugin_dirs=[], watch=True)
+		self.assertEqual(mock_method.mock_calls, [call(plugin_dirs=[]), call().start(), call().watch()])
+
 	def test_stop_calls_instance_stop(self, plugin_manager_mock):
 		octo.run(plugin_dirs=[])
 		with patch.object(octo, 'instance') as mock_method:
@@ -172,6 +547,7 @@ class ManagerTests(unittest.TestCase):
 	def test_start_can_block_until_sigint_received(self, pause_mock, signal_mock, plugin_manager_mock):
 		octo.run(plugin_dirs=[], block=True)
 		signal_mock.assert_called_with(signal.SIGINT, octo.manager.exit_handler)
+		signal_mock.assert_any_call(signal.SIGTERM, octo.manager.exit_handler)
 		self.assertTrue(pause_mock.called)
 
 	def test_stop_deletes_manager(self, plugin_manager_mock):
@@ -244,6 +620,12 @@ class ManagerTests(unittest.TestCase):
 		manager.start()
 		manager.call('Plugin 0', 'callback', args=[], kwargs={})
 
+	@raises(octo.exceptions.NoSuchPluginError)
+	def test_manager_call_raises_exception_if_plugin_is_inactive(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		manager.call('Plugin 2', 'callback', args=[], kwargs={})
+
 	@raises(octo.exceptions.NoSuchPluginError)
 	def test_manager_call_raises_exception_if_plugin_cannot_be_found(self, plugin_manager_mock):
 		manager = octo.Manager()
@@ -272,6 +654,22 @@ class ManagerTests(unittest.TestCase):
 		result = manager.call_many('callback', kwargs={'one': 1, 'two': 2})
 		self.assertTrue(isinstance(result['Plugin 5'], TypeError))
 
+	def test_manager_call_many_returns_attributeerror_raised_inside_handler(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		manager.get_plugins()['Plugin 1'].plugin_object.callback.side_effect = AttributeError("Boom!")
+		result = manager.call_many('callback')
+		self.assertTrue(isinstance(result['Plugin 1'], AttributeError))
+
+	def test_manager_call_many_dispatch_table_tracks_activation_changes(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		self.assertTrue('Plugin 1' in manager.call_many('callback'))
+		manager.deactivate_plugin('Plugin 1')
+		self.assertFalse('Plugin 1' in manager.call_many('callback'))
+		manager.activate_plugin('Plugin 1')
+		self.assertTrue('Plugin 1' in manager.call_many('callback'))
+
 	def test_manager_call_many_passes_args_kwargs_correctly(self, plugin_manager_mock):
 		manager = octo.Manager()
 		manager.start()
@@ -288,6 +686,293 @@ class ManagerTests(unittest.TestCase):
 		self.assertTrue(result['Plugin 4'] in ("(1, 2, 3)\t{'one': 1, 'two': 2}", "(1, 2, 3)\t{'two': 2, 'one': 1}"))
 
 
+	def test_manager_call_many_concurrent_returns_same_results(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		result = manager.call_many('callback', args=[1, 2, 3], concurrent=True)
+		self.assertEqual(len(result), 4)
+		self.assertEqual(result['Plugin 1'], "Called")
+		self.assertEqual(result['Plugin 4'], "(1, 2, 3)\t{}")
+		self.assertTrue(isinstance(result['Plugin 3'], Exception))
+		self.assertTrue(isinstance(result['Plugin 5'], TypeError))
+		manager.stop()
+
+	def test_manager_call_many_concurrent_marks_slow_plugins_as_timed_out(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		manager.get_plugins()['Plugin 1'].plugin_object.callback.side_effect = lambda: time.sleep(1)
+		result = manager.call_many('callback', concurrent=True, timeout=0.1)
+		self.assertTrue(isinstance(result['Plugin 1'], octo.exceptions.PluginTimeoutError))
+		self.assertEqual(result['Plugin 5'], "Called")
+		manager.stop()
+
+	def test_manager_call_many_concurrent_honours_deadline(self, plugin_manager_mock):
+		manager = octo.Manager(max_workers=1)
+		manager.start()
+		manager.get_plugins()['Plugin 1'].plugin_object.callback.side_effect = lambda: time.sleep(1)
+		begin = time.time()
+		result = manager.call_many('callback', concurrent=True, deadline=0.2)
+		self.assertTrue(time.time() - begin < 0.9)
+		self.assertTrue(isinstance(result['Plugin 1'], octo.exceptions.PluginTimeoutError))
+		manager.stop()
+
+	def test_manager_iter_call_many_yields_all_results(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		results = dict(manager.iter_call_many('callback', args=[1, 2, 3]))
+		self.assertEqual(sorted(results), ['Plugin 1', 'Plugin 3', 'Plugin 4', 'Plugin 5'])
+		self.assertEqual(results['Plugin 4'], "(1, 2, 3)\t{}")
+		self.assertTrue(isinstance(results['Plugin 3'], Exception))
+
+	def test_manager_iter_call_many_concurrent_yields_fastest_first(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		manager.get_plugins()['Plugin 1'].plugin_object.callback.side_effect = lambda: time.sleep(0.3) or "Slow"
+		results = list(manager.iter_call_many('callback', concurrent=True))
+		self.assertEqual(len(results), 4)
+		self.assertEqual(results[-1], ('Plugin 1', "Slow"))
+		manager.stop()
+
+	def test_manager_iter_call_many_concurrent_cancels_on_close(self, plugin_manager_mock):
+		manager = octo.Manager(max_workers=1)
+		manager.start()
+		callbacks = []
+		for name in ('Plugin 1', 'Plugin 3', 'Plugin 4', 'Plugin 5'):
+			callback = MagicMock(side_effect=lambda: time.sleep(0.1))
+			manager.get_plugins()[name].plugin_object.callback = callback
+			callbacks.append(callback)
+		results = manager.iter_call_many('callback', concurrent=True)
+		next(results)
+		results.close()
+		manager.stop()
+		self.assertTrue(len([c for c in callbacks if c.called]) < 4)
+
+	def test_manager_call_batch_returns_results_in_order(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		results = manager.call_batch([('Plugin 1', 'callback'),
+		                              ('Plugin 4', 'callback', [1], {'one': 1}),
+		                              ('Plugin 2', 'callback'),
+		                              ('Plugin 3', 'callback', []),
+		                              ('Plugin 0', 'callback'),
+		                              ('Plugin 1', 'callback')])
+		self.assertEqual(results[0], "Called")
+		self.assertEqual(results[1], "(1,)\t{'one': 1}")
+		self.assertTrue(isinstance(results[2], octo.exceptions.NoSuchPluginError))
+		self.assertTrue(isinstance(results[3], Exception))
+		self.assertTrue(isinstance(results[4], AttributeError))
+		self.assertEqual(results[5], "Called")
+
+	def test_manager_call_batch_groups_calls_for_batch_handlers(self, plugin_manager_mock):
+		manager = octo.Manager()
+		plugin_object = BatchPlugin()
+		manager.get_plugins(include_inactive=True)['Plugin 0'].plugin_object = plugin_object
+		manager.start()
+		results = manager.call_batch([('Plugin 0', 'double', [1]),
+		                              ('Plugin 0', 'triple', [1], {'offset': 1}),
+		                              ('Plugin 0', 'double', [None]),
+		                              ('Plugin 2', 'double', [1]),
+		                              ('Plugin 0', 'double', [3])], batched=True)
+		self.assertEqual(results[0], 2)
+		self.assertEqual(results[1], 4)
+		self.assertTrue(isinstance(results[2], ValueError))
+		self.assertTrue(isinstance(results[3], octo.exceptions.NoSuchPluginError))
+		self.assertEqual(results[4], 6)
+		self.assertEqual(plugin_object.batches, [[([1], {}), ([None], {}), ([3], {})]])
+
+	def test_manager_call_batch_fails_group_on_batch_handler_error(self, plugin_manager_mock):
+		manager = octo.Manager()
+		plugin_object = BatchPlugin()
+		plugin_object.double_batch = lambda calls: [1]
+		manager.get_plugins(include_inactive=True)['Plugin 0'].plugin_object = plugin_object
+		manager.start()
+		results = manager.call_batch([('Plugin 0', 'double', [1]), ('Plugin 0', 'double', [2])], batched=True)
+		self.assertTrue(all(isinstance(result, octo.exceptions.OctoException) for result in results))
+
+	def test_manager_call_batch_fails_group_when_batch_handler_returns_none(self, plugin_manager_mock):
+		manager = octo.Manager()
+		plugin_object = BatchPlugin()
+		plugin_object.double_batch = lambda calls: None
+		manager.get_plugins(include_inactive=True)['Plugin 0'].plugin_object = plugin_object
+		manager.start()
+		results = manager.call_batch([('Plugin 0', 'double', [1]), ('Plugin 0', 'double', [2])], batched=True)
+		self.assertEqual(len(results), 2)
+		self.assertTrue(all(isinstance(result, octo.exceptions.OctoException) for result in results))
+
+	def test_manager_call_batch_accepts_generator_from_batch_handler(self, plugin_manager_mock):
+		manager = octo.Manager()
+		plugin_object = BatchPlugin()
+		plugin_object.double_batch = lambda calls: (args[0] * 2 for args, kwargs in calls)
+		manager.get_plugins(include_inactive=True)['Plugin 0'].plugin_object = plugin_object
+		manager.start()
+		results = manager.call_batch([('Plugin 0', 'double', [1]), ('Plugin 0', 'double', [2])], batched=True)
+		self.assertEqual(results, [2, 4])
+
+	def test_manager_get_stats_returns_none_when_metrics_disabled(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		manager.call('Plugin 1', 'callback')
+		self.assertEqual(manager.get_stats(), None)
+
+	def test_manager_get_stats_counts_calls_and_errors(self, plugin_manager_mock):
+		manager = octo.Manager(metrics=True)
+		manager.start()
+		manager.call('Plugin 1', 'callback')
+		self.assertRaises(Exception, manager.call, 'Plugin 3', 'callback')
+		manager.call_many('callback')
+		manager.call_many('callback', concurrent=True)
+		stats = manager.get_stats()
+		self.assertEqual(stats['Plugin 1']['callback']['calls'], 3)
+		self.assertEqual(stats['Plugin 1']['callback']['errors'], 0)
+		self.assertEqual(stats['Plugin 3']['callback']['calls'], 3)
+		self.assertEqual(stats['Plugin 3']['callback']['errors'], 3)
+		self.assertFalse('Plugin 0' in stats)
+		manager.stop()
+
+	def test_manager_get_stats_counts_batched_calls(self, plugin_manager_mock):
+		manager = octo.Manager(metrics=True)
+		manager.start()
+		for name in ('Plugin 1', 'Plugin 3'):
+			del manager.get_plugins()[name].plugin_object.callback_batch
+		manager.call_batch([('Plugin 1', 'callback'), ('Plugin 3', 'callback')])
+		manager.call_batch([('Plugin 1', 'callback'), ('Plugin 3', 'callback')], batched=True)
+		stats = manager.get_stats()
+		self.assertEqual(stats['Plugin 1']['callback']['calls'], 2)
+		self.assertEqual(stats['Plugin 3']['callback']['errors'], 2)
+
+	@patch('logging.info')
+	def test_stats_handler_logs_metrics(self, info_mock, plugin_manager_mock):
+		octo.run(plugin_dirs=[], metrics=True)
+		octo.instance.call('Plugin 1', 'callback')
+		octo.manager.stats_handler(signal.SIGUSR1, None)
+		self.assertTrue('Plugin 1' in info_mock.call_args[0][0])
+		octo.stop()
+
+	def test_manager_publish_delivers_to_subscribed_plugins(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		handler = MagicMock(return_value="Handled")
+		manager.subscribe('Plugin 1', 'topic', handler)
+		self.assertEqual(manager.publish('topic', args=[1]), {'Plugin 1': "Handled"})
+		handler.assert_called_once_with(1)
+
+	@raises(octo.exceptions.NoSuchPluginError)
+	def test_manager_subscribe_raises_exception_if_plugin_is_inactive(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		manager.subscribe('Plugin 2', 'topic', MagicMock())
+
+	def test_manager_deactivate_plugin_removes_subscriptions(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		manager.subscribe('Plugin 1', 'topic', MagicMock())
+		manager.deactivate_plugin('Plugin 1')
+		self.assertEqual(manager.get_subscribers('topic'), [])
+		self.assertEqual(manager.publish('topic'), {})
+
+	def test_manager_subscribe_accepts_plugin_during_activation(self, plugin_manager_mock):
+		manager = octo.Manager()
+		handler = MagicMock(return_value="Handled")
+		manager.get_plugins(include_inactive=True)['Plugin 0'].activate.side_effect = \
+			lambda: manager.subscribe('Plugin 0', 'topic', handler)
+		manager.start()
+		self.assertEqual(manager.publish('topic'), {'Plugin 0': "Handled"})
+		manager.stop()
+
+	def test_manager_unsubscribes_failed_activation(self, plugin_manager_mock):
+		manager = octo.Manager()
+
+		def activate():
+			manager.subscribe('Plugin 0', 'topic', MagicMock())
+			raise ValueError("Boom!")
+		manager.get_plugins(include_inactive=True)['Plugin 0'].activate.side_effect = activate
+		self.assertRaises(ValueError, manager.activate_plugin, 'Plugin 0')
+		self.assertEqual(manager.get_subscribers('topic'), [])
+
+	def test_manager_subscribes_decorated_methods_on_activation(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.get_plugins(include_inactive=True)['Plugin 0'].plugin_object = SubscriberPlugin()
+		self.assertEqual(manager.get_subscribers('topic'), [])
+		manager.start()
+		self.assertEqual(manager.publish('topic', args=[21]), {'Plugin 0': 42})
+		self.assertEqual(manager.get_subscribers('other topic'), ['Plugin 0'])
+		manager.deactivate_plugin('Plugin 0')
+		self.assertEqual(manager.get_subscribers('topic'), [])
+
+	def test_manager_shares_buffers_between_plugins(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		manager.publish_buffer('Plugin 1', 'payload', b'payload')
+		acquired = manager.acquire_buffer('Plugin 4', 'payload')
+		self.assertEqual(bytes(acquired), b'payload')
+		self.assertEqual(manager.get_buffers(), ['payload'])
+		manager.deactivate_plugin('Plugin 1')
+		self.assertEqual(manager.get_buffers(), [])
+		self.assertEqual(bytes(acquired), b'payload')
+		manager.stop()
+		self.assertRaises(ValueError, bytes, acquired)
+
+	def test_manager_publish_buffer_accepts_plugin_during_activation(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.get_plugins(include_inactive=True)['Plugin 0'].activate.side_effect = \
+			lambda: manager.publish_buffer('Plugin 0', 'payload', b'payload')
+		manager.start()
+		self.assertEqual(bytes(manager.acquire_buffer('Plugin 1', 'payload')), b'payload')
+		manager.stop()
+
+	def test_manager_removes_buffers_of_failed_activation(self, plugin_manager_mock):
+		manager = octo.Manager()
+
+		def activate():
+			manager.create_buffer('Plugin 0', 'payload', 10)
+			raise ValueError("Boom!")
+		manager.get_plugins(include_inactive=True)['Plugin 0'].activate.side_effect = activate
+		self.assertRaises(ValueError, manager.activate_plugin, 'Plugin 0')
+		self.assertEqual(manager.get_buffers(), [])
+
+	@raises(octo.exceptions.NoSuchPluginError)
+	def test_manager_create_buffer_raises_exception_if_plugin_is_inactive(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		manager.create_buffer('Plugin 2', 'payload', 10)
+
+	def test_manager_memoizes_cached_methods_while_active(self, plugin_manager_mock):
+		manager = octo.Manager()
+		plugin_object = CachingPlugin()
+		manager.get_plugins(include_inactive=True)['Plugin 0'].plugin_object = plugin_object
+		manager.start()
+		self.assertEqual(manager.call('Plugin 0', 'lookup', args=[21]), 42)
+		self.assertEqual(manager.call_many('lookup', args=[21])['Plugin 0'], 42)
+		self.assertEqual(plugin_object.calls, 1)
+		self.assertEqual(manager.get_cache_stats(), {'Plugin 0': {'lookup': {
+			'hits': 1, 'misses': 1, 'collapsed': 0, 'evictions': 0, 'size': 1}}})
+		manager.clear_cache('Plugin 0')
+		manager.call('Plugin 0', 'lookup', args=[21])
+		self.assertEqual(plugin_object.calls, 2)
+		manager.deactivate_plugin('Plugin 0')
+		self.assertEqual(manager.get_cache_stats(), {})
+		self.assertFalse('lookup' in plugin_object.__dict__)
+
+	def test_manager_publish_queued_delivers_before_stop(self, plugin_manager_mock):
+		manager = octo.Manager()
+		manager.start()
+		handler = MagicMock()
+		manager.subscribe('Plugin 1', 'topic', handler)
+		self.assertEqual(manager.publish('topic', queued=True), None)
+		manager.stop()
+		self.assertTrue(handler.called)
+
+	@patch('signal.pause')
+	@patch('octo.manager.asyncio')
+	def test_start_can_block_on_event_loop(self, asyncio_mock, pause_mock, plugin_manager_mock):
+		octo.run(plugin_dirs=[], block=True, event_loop=True)
+		loop = asyncio_mock.new_event_loop.return_value
+		loop.add_signal_handler.assert_called_with(signal.SIGINT, loop.stop)
+		loop.add_signal_handler.assert_any_call(signal.SIGTERM, loop.stop)
+		self.assertTrue(loop.run_forever.called)
+		self.assertFalse(pause_mock.called)
+		self.assertEqual(octo.instance, None)
+
 class ManagerIntegrationTests(unittest.TestCase):
 	def test_manager_has_no_plugins_when_pluginlist_empty(self):
 		manager = octo.Manager().start()
@@ -300,3 +985,50 @@ class ManagerIntegrationTests(unittest.TestCase):
 	def test_manager_get_plugins_returns_two_total(self):
 		manager = octo.Manager(plugin_dirs=[PLUGIN_DIR]).start()
 		self.assertEqual(len(manager.get_plugins(include_inactive=True)), 2)
+
+	def test_manager_records_import_times(self):
+		manager = octo.Manager(plugin_dirs=[PLUGIN_DIR])
+		self.assertEqual(sorted(manager.get_import_times().keys()), ['Plugin 1', 'Plugin 2'])
+
+	def test_manager_profiles_startup_phases(self):
+		manager = octo.Manager(plugin_dirs=[PLUGIN_DIR], profile_startup=True).start()
+		entries = [(phase, plugin) for phase, plugin, wall, cpu in manager.get_startup_profile().entries]
+		self.assertTrue(('discovery', None) in entries)
+		self.assertTrue(('import', 'Plugin 2') in entries)
+		self.assertTrue(('bind', 'Plugin 2') in entries)
+		self.assertTrue(('activate', 'Plugin 1') in entries)
+		self.assertFalse(('activate', 'Plugin 2') in entries)
+		manager.stop()
+
+	def test_manager_without_profiling_has_no_startup_profile(self):
+		manager = octo.Manager(plugin_dirs=[PLUGIN_DIR]).start()
+		self.assertEqual(manager.get_startup_profile(), None)
+
+	def test_manager_stores_plugin_records_without_building_details(self):
+		manager = octo.Manager(plugin_dirs=[PLUGIN_DIR]).start()
+		for plugin in manager.get_plugins(include_inactive=True).values():
+			self.assertTrue(isinstance(plugin, octo.records.PluginRecord))
+			self.assertTrue(isinstance(octo.records.get_config(plugin), octo.records.CompactConfig))
+		plugin = manager.get_plugins()['Plugin 1']
+		self.assertEqual(plugin.plugin_object.plugin_config.get('Core', 'Name'), 'Plugin 1')
+		self.assertTrue(plugin.plugin_object.plugin_config is plugin.details)
+		manager.stop()
+
+	def test_lazy_manager_treats_missing_enable_item_as_disabled(self):
+		manager = octo.Manager(plugin_dirs=[PLUGIN_DIR], lazy=True)
+		compact = octo.records.CompactConfig([('Core', [('name', 'Plugin 3')]), ('Config', [])])
+		self.assertFalse(manager._is_enabled(octo.records.PluginRecord('Plugin 3', PLUGIN_DIR, compact)))
+		self.assertFalse(manager._is_enabled(manager.get_plugins(include_inactive=True)['Plugin 2']))
+
+	def test_lazy_manager_imports_plugins_on_activation(self):
+		manager = octo.Manager(plugin_dirs=[PLUGIN_DIR], lazy=True)
+		plugins = manager.get_plugins(include_inactive=True)
+		self.assertEqual(len(plugins), 2)
+		self.assertEqual(plugins['Plugin 1'].plugin_object, None)
+		self.assertEqual(len(manager.get_import_times()), 0)
+		manager.start()
+		self.assertEqual(plugins['Plugin 1'].plugin_object.plugin_object, plugins['Plugin 1'])
+		self.assertEqual(plugins['Plugin 2'].plugin_object, None)
+		self.assertEqual(list(manager.get_import_times().keys()), ['Plugin 1'])
+		self.assertEqual(len(manager.get_plugins(include_inactive=False)), 1)
+		manager.stop()
@@ -0,0 +1,47 @@
+import unittest
+from octo.metrics import Metrics, CallStats, BUCKET_BOUNDS
+
+
+class CallStatsTests(unittest.TestCase):
+	def test_percentile_of_empty_stats_is_none(self):
+		self.assertEqual(CallStats().percentile(0.5), None)
+
+	def test_percentile_returns_bucket_upper_bound(self):
+		metrics = Metrics()
+		for i in range(99):
+			metrics.record('Plugin 1', 'callback', 0.0000015)
+		metrics.record('Plugin 1', 'callback', 0.003)
+		stats = metrics.as_dict()['Plugin 1']['callback']
+		self.assertEqual(stats['p50'], BUCKET_BOUNDS[1])
+		self.assertEqual(stats['p99'], BUCKET_BOUNDS[1])
+		self.assertTrue(stats['max_time'] == 0.003)
+
+	def test_slow_calls_go_into_overflow_bucket(self):
+		metrics = Metrics()
+		metrics.record('Plugin 1', 'callback', 1000.0)
+		stats = metrics.as_dict()['Plugin 1']['callback']
+		self.assertEqual(stats['buckets'], [[None, 1]])
+		self.assertEqual(stats['p99'], 1000.0)
+
+
+class MetricsTests(unittest.TestCase):
+	def test_record_counts_calls_and_errors_per_plugin_and_method(self):
+		metrics = Metrics()
+		metrics.record('Plugin 1', 'callback', 0.001)
+		metrics.record('Plugin 1', 'callback', 0.002, error=True)
+		metrics.record('Plugin 1', 'other', 0.001)
+		metrics.record('Plugin 2', 'callback', 0.001)
+		stats = metrics.as_dict()
+		self.assertEqual(stats['Plugin 1']['callback']['calls'], 2)
+		self.assertEqual(stats['Plugin 1']['callback']['errors'], 1)
+		self.assertAlmostEqual(stats['Plugin 1']['callback']['mean_time'], 0.0015)
+		self.assertEqual(stats['Plugin 1']['other']['calls'], 1)
+		self.assertEqual(stats['Plugin 2']['callback']['errors'], 0)
+
+	def test_format_table_lists_each_pair(self):
+		metrics = Metrics()
+		metrics.record('Plugin 1', 'callback', 0.001)
+		metrics.record('Plugin 2', 'callback', 0.001)
+		lines = metrics.format_table().splitlines()
+		self.assertEqual(len(lines), 3)
+		self.assertTrue(lines[1].startswith("Plugin 1"))
@@ -1,7 +1,7 @@
 import unittest
 from yapsy.IPlugin import IPlugin
-from octo.plugin import OctoPlugin
-from mock import patch
+from octo.plugin import OctoPlugin, handles_messages
+from mock import patch, Mock
 
 
 class OctoPluginTests(unittest.TestCase):
@@ -31,6 +31,13 @@ class OctoPluginTests(unittest.TestCase):
 		p = OctoPlugin()
 		self.assertEqual(p.plugin_config, None)
 
+	def test_plugin_config_defaults_to_details_of_plugin_object(self):
+		p = OctoPlugin()
+		p.plugin_object = Mock()
+		self.assertTrue(p.plugin_config is p.plugin_object.details)
+		p.plugin_config = "config"
+		self.assertEqual(p.plugin_config, "config")
+
 	def test_activate_calls_on_activation(self):
 		with patch.object(OctoPlugin, 'on_activation', return_value=None) as mock_method:
 			OctoPlugin().activate()
@@ -40,3 +47,10 @@ class OctoPluginTests(unittest.TestCase):
 		with patch.object(OctoPlugin, 'on_deactivation', return_value=None) as mock_method:
 			OctoPlugin().deactivate()
 		mock_method.assert_called_once_with()
+
+	def test_handles_messages_only_when_on_messages_is_overridden(self):
+		class Receiver(OctoPlugin):
+			def on_messages(self, batch):
+				pass
+		self.assertTrue(handles_messages(Receiver))
+		self.assertFalse(handles_messages(OctoPlugin))
@@ -0,0 +1,200 @@
+import unittest
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import octo.prefork
+from octo.prefork import Supervisor, Worker, bind_socket, describe_status
+from nose.tools import raises
+from mock import patch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# Logs the pid of the worker it's activated and deactivated in
+PLUGIN_INFO = """[Core]
+Name = Recorder
+Module = recorder
+
+[Config]
+Enable = True
+File = {}
+"""
+
+PLUGIN_MODULE = """import os
+from octo.plugin import OctoPlugin
+
+class Recorder(OctoPlugin):
+	def record(self, event):
+		with open(self.plugin_config.get('Config', 'File'), 'a') as file:
+			file.write("{} {}\\n".format(event, os.getpid()))
+
+	def on_activation(self):
+		self.record('start')
+
+	def on_deactivation(self):
+		self.record('stop')
+"""
+
+
+def wait_for(condition, timeout=10):
+	"""Wait until condition() is true, for at most timeout seconds"""
+	end = time.time() + timeout
+	while not condition() and time.time() < end:
+		time.sleep(0.05)
+	return condition()
+
+
+class PreforkTests(unittest.TestCase):
+	def test_bind_socket_listens_on_tcp_address(self):
+		sock = bind_socket('127.0.0.1:0')
+		try:
+			client = socket.create_connection(sock.getsockname()[:2])
+			connection = sock.accept()[0]
+			client.close()
+			connection.close()
+		finally:
+			sock.close()
+
+	def test_bind_socket_replaces_stale_unix_socket(self):
+		directory = tempfile.mkdtemp()
+		try:
+			path = os.path.join(directory, 'octo.sock')
+			bind_socket(path).close()
+			sock = bind_socket(path)
+			self.assertEqual(sock.family, socket.AF_UNIX)
+			sock.close()
+		finally:
+			shutil.rmtree(directory)
+
+	@raises(ValueError)
+	def test_bind_socket_raises_value_error_without_port(self):
+		bind_socket('localhost')
+
+	def test_describe_status(self):
+		self.assertEqual(describe_status(3 << 8), "status 3")
+		self.assertEqual(describe_status(signal.SIGKILL), "signal {}".format(signal.SIGKILL))
+
+	def test_worker_poll_ready(self):
+		read_fd, write_fd = os.pipe()
+		worker = Worker(0, 1, read_fd)
+		self.assertEqual(worker.poll_ready(0), False)
+		os.write(write_fd, b'1')
+		self.assertEqual(worker.poll_ready(0), True)
+		self.assertEqual(worker.ready_fd, None)
+		os.close(write_fd)
+
+	def test_worker_poll_ready_returns_none_when_worker_exited(self):
+		read_fd, write_fd = os.pipe()
+		os.close(write_fd)
+		self.assertEqual(Worker(0, 1, read_fd).poll_ready(0), None)
+
+	def test_crash_backoff_doubles_up_to_maximum(self):
+		supervisor = Supervisor(workers=1, backoff=1.0, max_backoff=3.0)
+		worker = Worker(0, 1, None)
+		delays = []
+		for i in range(4):
+			supervisor._crashed(worker, 1 << 8)
+			delays.append(supervisor._restarts[0] - time.time())
+		self.assertEqual([round(delay) for delay in delays], [1, 2, 3, 3])
+
+	def test_crash_of_stable_worker_resets_backoff(self):
+		supervisor = Supervisor(workers=1, backoff=1.0)
+		supervisor._crashes[0] = 5
+		worker = Worker(0, 1, None)
+		worker.started -= octo.prefork.STABLE_AFTER
+		supervisor._crashed(worker, 1 << 8)
+		self.assertEqual(supervisor._crashes[0], 1)
+
+	def test_rolling_restart_gives_up_on_replacement_which_isnt_ready_in_time(self):
+		supervisor = Supervisor(workers=1, ready_timeout=0.2)
+		old = Worker(0, 1, None)
+		supervisor._workers[0] = old
+		read_fd, write_fd = os.pipe()
+		new = Worker(0, 2, read_fd)
+		try:
+			with patch.object(supervisor, '_spawn', return_value=new), \
+			     patch.object(supervisor, '_supervise') as supervise, \
+			     patch.object(supervisor, '_terminate') as terminate:
+				supervisor.rolling_restart()
+			self.assertTrue(supervise.call_count > 0)
+			terminate.assert_called_once_with([new])
+			self.assertTrue(supervisor._workers[0] is old)
+		finally:
+			new.close()
+			os.close(write_fd)
+
+	def test_rolling_restart_replaces_worker_which_crashed_while_waiting(self):
+		supervisor = Supervisor(workers=1)
+		supervisor._workers[0] = Worker(0, 1, None)
+		new = Worker(0, 2, None)
+
+		def crash():
+			supervisor._workers.pop(0, None)
+			supervisor._restarts[0] = time.time() + 60
+		# The old worker crashes before the replacement reports it's ready
+		with patch.object(supervisor, '_spawn', return_value=new), \
+		     patch.object(supervisor, '_supervise', side_effect=crash), \
+		     patch.object(supervisor, '_terminate') as terminate, \
+		     patch.object(new, 'poll_ready', side_effect=[False, True]):
+			supervisor.rolling_restart()
+		self.assertEqual(terminate.call_count, 0)
+		self.assertTrue(supervisor._workers[0] is new)
+		self.assertEqual(supervisor._restarts, {})
+
+	@raises(ValueError)
+	def test_supervisor_raises_value_error_without_workers(self):
+		Supervisor(workers=0)
+
+
+class SupervisorTests(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.log = os.path.join(self.directory, 'log')
+		with open(os.path.join(self.directory, 'recorder.octoplugin'), 'w') as file:
+			file.write(PLUGIN_INFO.format(self.log))
+		with open(os.path.join(self.directory, 'recorder.py'), 'w') as file:
+			file.write(PLUGIN_MODULE)
+		code = ("import octo.prefork\n"
+		        "octo.prefork.Supervisor(plugin_dirs=[{!r}], workers=2, backoff=0.1).run()").format(self.directory)
+		self.process = subprocess.Popen([sys.executable, '-c', code], cwd=ROOT)
+
+	def tearDown(self):
+		if self.process.poll() is None:
+			self.process.kill()
+			self.process.wait()
+		shutil.rmtree(self.directory)
+
+	def events(self):
+		"""Return the (event, pid) tuples logged by the plugin"""
+		if not os.path.exists(self.log):
+			return []
+		with open(self.log) as file:
+			return [(event, int(pid)) for event, pid in (line.split() for line in file)]
+
+	def running(self):
+		"""Return the pids of the workers which activated the plugin and haven't deactivated it"""
+		pids = set()
+		for event, pid in self.events():
+			if event == 'start':
+				pids.add(pid)
+			else:
+				pids.discard(pid)
+		return pids
+
+	def test_workers_are_restarted_and_stopped(self):
+		self.assertTrue(wait_for(lambda: len(self.running()) == 2))
+		crashed = sorted(self.running())[0]
+		os.kill(crashed, signal.SIGKILL)
+		self.assertTrue(wait_for(lambda: len(self.running() - set([crashed])) == 2))
+
+		workers = self.running() - set([crashed])
+		self.process.send_signal(signal.SIGHUP)
+		self.assertTrue(wait_for(lambda: not self.running() & workers and len(self.running() - set([crashed])) == 2))
+
+		self.process.send_signal(signal.SIGTERM)
+		self.assertEqual(self.process.wait(10), 0)
+		self.assertEqual(self.running(), set([crashed]))
@@ -0,0 +1,44 @@
+import unittest
+import json
+from octo.profiling import StartupProfile
+
+
+class StartupProfileTests(unittest.TestCase):
+	def setUp(self):
+		self.profile = StartupProfile()
+		self.profile.record('discovery', None, 0.5, 0.25)
+		self.profile.record('import', 'Plugin 1', 0.125, 0.125)
+		self.profile.record('activate', 'Plugin 1', 1.0, 0.0)
+		self.profile.record('activate', 'Plugin 2', 0.25, 0.125)
+
+	def test_measure_records_entry(self):
+		profile = StartupProfile()
+		with profile.measure('bind', 'Plugin 1'):
+			pass
+		self.assertEqual(len(profile.entries), 1)
+		self.assertEqual(profile.entries[0][:2], ('bind', 'Plugin 1'))
+
+	def test_measure_records_entry_when_exception_raised(self):
+		profile = StartupProfile()
+		with self.assertRaises(ValueError):
+			with profile.measure('activate', 'Plugin 1'):
+				raise ValueError()
+		self.assertEqual(len(profile.entries), 1)
+
+	def test_totals_sums_per_phase(self):
+		self.assertEqual(self.profile.totals()['activate'], (1.25, 0.125))
+		self.assertEqual(self.profile.totals()['discovery'], (0.5, 0.25))
+
+	def test_sorted_entries_lists_slowest_first(self):
+		self.assertEqual([entry[2] for entry in self.profile.sorted_entries()], [1.0, 0.5, 0.25, 0.125])
+
+	def test_as_json_is_machine_readable(self):
+		data = json.loads(self.profile.as_json())
+		self.assertEqual(data['entries'][0], {'phase': 'activate', 'plugin': 'Plugin 1', 'wall': 1.0, 'cpu': 0.0})
+		self.assertEqual(data['totals']['import'], {'wall': 0.125, 'cpu': 0.125})
+
+	def test_format_table_lists_slowest_first(self):
+		lines = self.profile.format_table().splitlines()
+		self.assertTrue(lines[0].startswith("PHASE"))
+		self.assertEqual(lines[1].split()[:3], ["activate", "Plugin", "1"])
+		self.assertTrue(lines[-1].startswith("total activate"))
@@ -0,0 +1,92 @@
+import unittest
+from octo.records import CompactConfig, PluginRecord, get_config
+from yapsy.PluginInfo import PluginInfo
+from nose.tools import raises
+try:
+	import configparser
+	from configparser import ConfigParser
+except ImportError:
+	import ConfigParser as configparser  # Python 2
+	from ConfigParser import SafeConfigParser as ConfigParser
+
+
+def plugin_info():
+	"""Return a PluginInfo with a Config section"""
+	info = PluginInfo("Plugin 1", "/plugins/plugin1")
+	info.details.add_section('Config')
+	info.details.set('Config', 'Enable', 'True')
+	info.details.set('Config', 'Greeting', 'Hello')
+	return info
+
+
+class CompactConfigTests(unittest.TestCase):
+	def setUp(self):
+		self.config = CompactConfig.from_configparser(plugin_info().details)
+
+	def test_get_returns_raw_values(self):
+		self.assertEqual(self.config.get('Core', 'Name'), 'Plugin 1')
+		self.assertEqual(self.config.get('Config', 'greeting'), 'Hello')
+		self.assertEqual(self.config.getboolean('Config', 'Enable'), True)
+
+	@raises(configparser.NoSectionError)
+	def test_get_raises_no_section_error(self):
+		self.config.get('Missing', 'Name')
+
+	@raises(configparser.NoOptionError)
+	def test_get_raises_no_option_error(self):
+		self.config.get('Config', 'Missing')
+
+	def test_has_section_and_option(self):
+		self.assertTrue(self.config.has_section('Config'))
+		self.assertFalse(self.config.has_section('Missing'))
+		self.assertTrue(self.config.has_option('Config', 'Enable'))
+		self.assertFalse(self.config.has_option('Missing', 'Enable'))
+
+	def test_to_configparser_round_trips(self):
+		parser = self.config.to_configparser()
+		self.assertTrue(isinstance(parser, ConfigParser))
+		self.assertEqual(parser.sections(), self.config.sections())
+		for section in parser.sections():
+			self.assertEqual(parser.items(section), self.config.items(section))
+
+	def test_strings_are_interned(self):
+		other = CompactConfig.from_configparser(plugin_info().details)
+		self.assertTrue(self.config.get('Config', 'Greeting') is other.get('Config', 'Greeting'))
+
+
+class PluginRecordTests(unittest.TestCase):
+	def setUp(self):
+		self.record = PluginRecord.from_plugin_info(plugin_info())
+
+	def test_record_has_plugin_info_attributes(self):
+		self.assertTrue(isinstance(self.record, PluginInfo))
+		self.assertEqual(self.record.name, "Plugin 1")
+		self.assertEqual(self.record.path, "/plugins/plugin1")
+		self.assertEqual(self.record.plugin_object, None)
+		self.assertEqual(self.record.categories, [])
+		self.assertEqual(self.record.__dict__, {})
+
+	def test_details_are_built_on_demand(self):
+		self.assertTrue(isinstance(get_config(self.record), CompactConfig))
+		details = self.record.details
+		self.assertTrue(isinstance(details, ConfigParser))
+		self.assertTrue(self.record.details is details)
+		self.assertTrue(get_config(self.record) is details)
+		self.assertEqual(details.get('Config', 'Greeting'), 'Hello')
+		self.assertEqual(self.record.author, 'Unknown')
+
+	def test_setting_name_updates_built_details(self):
+		self.record.details.set('Config', 'Greeting', 'Hi')
+		self.record.name = "Plugin 2"
+		self.assertEqual(self.record.details.get('Core', 'Name'), "Plugin 2")
+		self.assertEqual(get_config(self.record).get('Config', 'Greeting'), 'Hi')
+
+	def test_setting_details_keeps_name_and_path(self):
+		details = ConfigParser()
+		self.record.details = details
+		self.assertEqual(details.get('Core', 'Name'), "Plugin 1")
+		self.assertEqual(details.get('Core', 'Module'), "/plugins/plugin1")
+
+	def test_get_config_returns_details_of_plugin_info(self):
+		info = plugin_info()
+		self.assertTrue(get_config(info) is info.details)
@@ -0,0 +1,148 @@
+import unittest
+import datetime
+import threading
+import time
+from octo.scheduler import Scheduler, CronSchedule
+from nose.tools import raises
+
+
+def wait_for(condition, timeout=2):
+	"""Wait until condition() is true, for at most timeout seconds"""
+	end = time.time() + timeout
+	while not condition() and time.time() < end:
+		time.sleep(0.005)
+	return condition()
+
+
+class CronScheduleTests(unittest.TestCase):
+	def next_after(self, expression, moment):
+		return CronSchedule(expression).next_after(moment)
+
+	def test_every_minute(self):
+		self.assertEqual(self.next_after('* * * * *', datetime.datetime(2024, 1, 1, 10, 30, 15)),
+		                 datetime.datetime(2024, 1, 1, 10, 31))
+
+	def test_steps_and_ranges(self):
+		self.assertEqual(self.next_after('*/15 9-17 * * *', datetime.datetime(2024, 1, 1, 10, 31)),
+		                 datetime.datetime(2024, 1, 1, 10, 45))
+		self.assertEqual(self.next_after('*/15 9-17 * * *', datetime.datetime(2024, 1, 1, 17, 45)),
+		                 datetime.datetime(2024, 1, 2, 9, 0))
+
+	def test_lists_and_months(self):
+		self.assertEqual(self.next_after('0 0 1 3,6 *', datetime.datetime(2024, 3, 1, 0, 0)),
+		                 datetime.datetime(2024, 6, 1, 0, 0))
+		self.assertEqual(self.next_after('@yearly', datetime.datetime(2024, 3, 1)), datetime.datetime(2025, 1, 1))
+
+	def test_weekdays(self):
+		# 2024-01-01 is a Monday
+		self.assertEqual(self.next_after('30 8 * * 0', datetime.datetime(2024, 1, 1)),
+		                 datetime.datetime(2024, 1, 7, 8, 30))
+		self.assertEqual(self.next_after('30 8 * * 7', datetime.datetime(2024, 1, 1)),
+		                 datetime.datetime(2024, 1, 7, 8, 30))
+
+	def test_day_or_weekday_when_both_restricted(self):
+		self.assertEqual(self.next_after('0 0 15 * 5', datetime.datetime(2024, 1, 1)),
+		                 datetime.datetime(2024, 1, 5))
+
+	@raises(ValueError)
+	def test_out_of_range_raises_value_error(self):
+		CronSchedule('60 * * * *')
+
+	@raises(ValueError)
+	def test_wrong_number_of_fields_raises_value_error(self):
+		CronSchedule('* * *')
+
+	@raises(ValueError)
+	def test_impossible_date_raises_value_error(self):
+		self.next_after('0 0 31 2 *', datetime.datetime(2024, 1, 1))
+
+
+class SchedulerTests(unittest.TestCase):
+	def setUp(self):
+		self.scheduler = Scheduler(max_workers=2)
+
+	def tearDown(self):
+		self.scheduler.close(wait=True)
+
+	def test_interval_task_runs_repeatedly(self):
+		calls = []
+		task = self.scheduler.add('Plugin 1', calls.append, args=[1], interval=0.01)
+		self.assertTrue(wait_for(lambda: len(calls) >= 3))
+		self.assertEqual(calls[:3], [1, 1, 1])
+		self.assertTrue(task.stats()['runs'] >= 3)
+
+	def test_delay_sets_first_run(self):
+		calls = []
+		self.scheduler.add('Plugin 1', lambda: calls.append(time.time()), interval=60, delay=0)
+		self.assertTrue(wait_for(lambda: len(calls) == 1))
+
+	def test_cancel_stops_task(self):
+		calls = []
+		task = self.scheduler.add('Plugin 1', calls.append, args=[1], interval=0.01)
+		self.assertTrue(wait_for(lambda: len(calls) >= 1))
+		task.cancel()
+		time.sleep(0.02)
+		count = len(calls)
+		time.sleep(0.05)
+		self.assertEqual(len(calls), count)
+		self.assertEqual(self.scheduler.tasks(), [])
+
+	def test_cancel_plugin_cancels_only_its_tasks(self):
+		one = self.scheduler.add('Plugin 1', lambda: None, interval=60)
+		two = self.scheduler.add('Plugin 2', lambda: None, interval=60)
+		self.scheduler.cancel_plugin('Plugin 1')
+		self.assertTrue(one.cancelled)
+		self.assertFalse(two.cancelled)
+		self.assertEqual(self.scheduler.tasks(), [two])
+		self.assertEqual(self.scheduler.tasks('Plugin 1'), [])
+
+	def test_skip_policy_skips_runs_while_running(self):
+		release = threading.Event()
+		task = self.scheduler.add('Plugin 1', release.wait, interval=0.01, delay=0)
+		self.assertTrue(wait_for(lambda: task.skipped >= 3))
+		self.assertEqual(task.running, 1)
+		release.set()
+		self.assertTrue(wait_for(lambda: task.runs >= 1))
+
+	def test_delay_policy_runs_once_more_after_overrun(self):
+		release = threading.Event()
+		task = self.scheduler.add('Plugin 1', release.wait, interval=0.01, delay=0, overrun='delay')
+		self.assertTrue(wait_for(lambda: task.skipped >= 2))
+		task.cancel()
+		release.set()
+		self.assertTrue(wait_for(lambda: task.running == 0))
+		self.assertEqual(task.runs, 1)
+
+	def test_concurrent_policy_runs_overlapping(self):
+		release = threading.Event()
+		task = self.scheduler.add('Plugin 1', release.wait, interval=0.01, delay=0, overrun='concurrent')
+		self.assertTrue(wait_for(lambda: task.running == 2))
+		release.set()
+
+	def test_errors_are_counted(self):
+		def fail():
+			raise ValueError("Boom!")
+		task = self.scheduler.add('Plugin 1', fail, interval=0.01, delay=0)
+		self.assertTrue(wait_for(lambda: task.errors >= 2))
+		self.assertTrue(isinstance(task.last_error, ValueError))
+
+	def test_jitter_postpones_runs(self):
+		task = self.scheduler.add('Plugin 1', lambda: None, interval=10, jitter=5)
+		due = [entry[0] for entry in self.scheduler._heap if entry[2] is task][0]
+		self.assertTrue(task._base <= due <= task._base + 5)
+
+	def test_scheduler_can_be_used_after_close(self):
+		calls = []
+		self.scheduler.add('Plugin 1', calls.append, args=[1], interval=60)
+		self.scheduler.close()
+		self.assertEqual(self.scheduler.tasks(), [])
+		self.scheduler.add('Plugin 1', calls.append, args=[2], interval=60, delay=0)
+		self.assertTrue(wait_for(lambda: calls == [2]))
+
+	@raises(ValueError)
+	def test_interval_or_cron_is_required(self):
+		self.scheduler.add('Plugin 1', lambda: None)
+
+	@raises(ValueError)
+	def test_unknown_overrun_policy_raises_value_error(self):
+		self.scheduler.add('Plugin 1', lambda: None, interval=1, overrun='queue')
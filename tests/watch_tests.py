@@ -0,0 +1,151 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+import octo
+from octo.watch import PluginWatcher
+
+PLUGIN_INFO = """[Core]
+Name = {name}
+Module = {module}
+
+[Config]
+Enable = True
+"""
+
+PLUGIN_MODULE = """from octo.plugin import OctoPlugin
+
+class Plugin(OctoPlugin):
+	def ping(self):
+		return {result!r}
+"""
+
+
+def write_file(path, content):
+	"""Write content to path and push its mtime forward so the change is seen"""
+	mtime = os.stat(path).st_mtime + 1 if os.path.exists(path) else None
+	with open(path, 'w') as file:
+		file.write(content)
+	if mtime is not None:
+		os.utime(path, (mtime, mtime))
+
+
+class PluginWatcherTests(unittest.TestCase):
+	def setUp(self):
+		self.plugin_dir = tempfile.mkdtemp()
+		write_file(os.path.join(self.plugin_dir, 'one.py'), "")
+		write_file(os.path.join(self.plugin_dir, 'README'), "")
+
+	def tearDown(self):
+		shutil.rmtree(self.plugin_dir)
+
+	def test_no_changes(self):
+		watcher = PluginWatcher([self.plugin_dir])
+		self.assertEqual(watcher.changes(), [])
+
+	def test_detects_created_modified_and_deleted_files(self):
+		watcher = PluginWatcher([self.plugin_dir])
+		write_file(os.path.join(self.plugin_dir, 'one.py'), "x = 1")
+		write_file(os.path.join(self.plugin_dir, 'two.octoplugin'), "")
+		self.assertEqual(watcher.changes(), [os.path.join(self.plugin_dir, 'one.py'),
+		                                     os.path.join(self.plugin_dir, 'two.octoplugin')])
+		os.remove(os.path.join(self.plugin_dir, 'one.py'))
+		self.assertEqual(watcher.changes(), [os.path.join(self.plugin_dir, 'one.py')])
+		self.assertEqual(watcher.changes(), [])
+
+	def test_ignores_other_files(self):
+		watcher = PluginWatcher([self.plugin_dir])
+		write_file(os.path.join(self.plugin_dir, 'README'), "changed")
+		self.assertEqual(watcher.changes(), [])
+
+
+class ManagerReloadTests(unittest.TestCase):
+	def setUp(self):
+		self.plugin_dir = tempfile.mkdtemp()
+		self.write_plugin('one', "Plugin One", "one")
+		self.write_plugin('two', "Plugin Two", "two")
+		self.manager = octo.Manager(plugin_dirs=[self.plugin_dir]).start()
+		self.manager.reload_changed()
+
+	def tearDown(self):
+		self.manager.stop()
+		shutil.rmtree(self.plugin_dir)
+
+	def write_plugin(self, module, name, result):
+		write_file(os.path.join(self.plugin_dir, module + '.octoplugin'), PLUGIN_INFO.format(name=name, module=module))
+		write_file(os.path.join(self.plugin_dir, module + '.py'), PLUGIN_MODULE.format(result=result))
+
+	def test_reload_changed_reimports_only_changed_plugins(self):
+		two = self.manager.get_plugins()['Plugin Two'].plugin_object
+		write_file(os.path.join(self.plugin_dir, 'one.py'), PLUGIN_MODULE.format(result="new"))
+		self.assertEqual(self.manager.reload_changed(), ["Plugin One"])
+		self.assertEqual(self.manager.call("Plugin One", 'ping'), "new")
+		self.assertTrue(self.manager.get_plugins()['Plugin Two'].plugin_object is two)
+		self.assertEqual(self.manager.call_many('ping'), {"Plugin One": "new", "Plugin Two": "two"})
+
+	def test_reload_changed_loads_new_and_drops_deleted_plugins(self):
+		self.write_plugin('three', "Plugin Three", "three")
+		os.remove(os.path.join(self.plugin_dir, 'two.octoplugin'))
+		self.assertEqual(self.manager.reload_changed(), ["Plugin Three"])
+		self.assertEqual(sorted(self.manager.get_plugins(include_inactive=True)), ["Plugin One", "Plugin Three"])
+		self.assertEqual(self.manager.call_many('ping'), {"Plugin One": "one", "Plugin Three": "three"})
+
+	def test_reload_changed_keeps_old_version_when_new_one_fails_to_load(self):
+		write_file(os.path.join(self.plugin_dir, 'one.py'), "syntax error")
+		self.assertEqual(self.manager.reload_changed(), [])
+		self.assertEqual(self.manager.call("Plugin One", 'ping'), "one")
+		write_file(os.path.join(self.plugin_dir, 'one.py'), PLUGIN_MODULE.format(result="fixed"))
+		self.assertEqual(self.manager.reload_changed(), ["Plugin One"])
+		self.assertEqual(self.manager.call("Plugin One", 'ping'), "fixed")
+
+	def test_reload_changed_keeps_old_version_when_new_config_is_invalid(self):
+		write_file(os.path.join(self.plugin_dir, 'one.octoplugin'),
+		           PLUGIN_INFO.format(name="Plugin One", module="one").replace("True", "Maybe"))
+		self.assertEqual(self.manager.reload_changed(), [])
+		self.assertEqual(self.manager.call("Plugin One", 'ping'), "one")
+		self.write_plugin('one', "Plugin One", "fixed")
+		self.assertEqual(self.manager.reload_changed(), ["Plugin One"])
+		self.assertEqual(self.manager.call("Plugin One", 'ping'), "fixed")
+
+	def test_reload_changed_loads_plugin_once_fixed(self):
+		write_file(os.path.join(self.plugin_dir, 'three.py'), "syntax error")
+		write_file(os.path.join(self.plugin_dir, 'three.octoplugin'),
+		           PLUGIN_INFO.format(name="Plugin Three", module="three"))
+		self.assertEqual(self.manager.reload_changed(), [])
+		write_file(os.path.join(self.plugin_dir, 'three.py'), PLUGIN_MODULE.format(result="three"))
+		self.assertEqual(self.manager.reload_changed(), ["Plugin Three"])
+		self.assertEqual(self.manager.call("Plugin Three", 'ping'), "three")
+
+	def test_reload_changed_only_activates_new_plugins_of_worker(self):
+		self.manager.stop()
+		self.manager = octo.Manager(plugin_dirs=[self.plugin_dir]).start(worker=1)
+		self.manager.reload_changed()
+		for module, workers in (('three', '0'), ('four', '1, 2')):
+			info = PLUGIN_INFO.format(name="Plugin " + module.title(), module=module)
+			write_file(os.path.join(self.plugin_dir, module + '.octoplugin'),
+			           info.replace("[Config]", "Workers = {}\n\n[Config]".format(workers)))
+			write_file(os.path.join(self.plugin_dir, module + '.py'), PLUGIN_MODULE.format(result=module))
+		self.assertEqual(self.manager.reload_changed(), ["Plugin Four", "Plugin Three"])
+		self.assertEqual(sorted(self.manager.get_plugins()), ["Plugin Four", "Plugin One", "Plugin Two"])
+
+	def test_reload_plugin_keeps_inactive_plugin_inactive(self):
+		self.manager.deactivate_plugin("Plugin One")
+		self.assertEqual(self.manager.reload_plugin("Plugin One"), "Plugin One")
+		self.assertEqual(list(self.manager.get_plugins()), ["Plugin Two"])
+
+	def test_reload_plugin_raises_exception_for_unknown_plugin(self):
+		self.assertRaises(octo.exceptions.NoSuchPluginError, self.manager.reload_plugin, "Plugin Three")
+
+	def test_watch_reloads_changed_plugins_in_background(self):
+		self.manager.watch(interval=0.01)
+		write_file(os.path.join(self.plugin_dir, 'one.py'), PLUGIN_MODULE.format(result="new"))
+		for i in range(200):
+			try:
+				if self.manager.call("Plugin One", 'ping') == "new":
+					break
+			except octo.exceptions.NoSuchPluginError:
+				# Briefly inactive while being swapped
+				pass
+			time.sleep(0.01)
+		self.assertEqual(self.manager.call("Plugin One", 'ping'), "new")